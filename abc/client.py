@@ -1,40 +1,213 @@
+#
+# ABC client. Sends a window of packets, then two more for
+# every echo still marked accelerate ("888"), none for a
+# brake, and one after TIMEOUT seconds without any echo.
+#
+# The socket is non-blocking and driven by select(): every
+# wakeup drains all echoes that are ready before sending the
+# packets they credit, so a busy host handles packets in
+# batches instead of paying a system call round trip each.
+#
+# Every packet carries a sequence number and the time it
+# was sent (see payload.py), so each echo gives the packet's
+# round trip time and one-way delay. With --records, these
+# are recorded per packet along with its mark and the
+# packets lost before it (see records.py).
+#
+
+import argparse
+import errno
+import os
+import select
 import socket
 import sys
 import time
-import os
-from socket import error as socket_error
-
-host = os.environ['MAHIMAHI_BASE'] 
-port = 12345
-credit = 0                   # The same port as used by the server
-s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-MESSAGE=""
-t =[]
-for i in range(1462):
-	MESSAGE=MESSAGE+"a"
-MESSAGE=MESSAGE+ "0123456888"
-
-for i in range(30):
-	s.sendto(MESSAGE, (host, port))
-	time.sleep(0.001)
-
-start = time.time()
-
-for i in range(1000000):
-	now=time.time()
-	if now>start+140:
-			break
-	s.settimeout(0.1)
-	data = ''
+
+from payload import MARK, make_payload, read_header, stamp_sent
+from records import ACCELERATE, BRAKE, REORDERED, RingLog
+
+# Most echoes handled per wakeup before sending again.
+BATCH = 64
+
+class Counters:
+
+	def __init__(self):
+		"""Packets and bytes seen in the current interval."""
+		self.reset()
+
+	def reset(self):
+		self.sent = 0
+		self.sent_bytes = 0
+		self.received = 0
+		self.accelerates = 0
+		self.brakes = 0
+		self.timeouts = 0
+		self.lost = 0
+		self.rtt_total = 0.0
+		self.timed = 0
+
+	def report(self, elapsed, interval):
+		rate = self.sent_bytes * 8 / (interval * 1000000.0)
+		ratio = self.sent / float(self.received) if self.received else 0.0
+		rtt = self.rtt_total * 1000.0 / self.timed if self.timed else 0.0
+		sys.stderr.write("%6.1f s sent %5d pkts %7.2f Mbit/s acks %5d "
+			"(accel %d brake %d) timeouts %d credit/ack %.2f rtt %.1f ms lost %d\n" % (
+			elapsed, self.sent, rate, self.received, self.accelerates,
+			self.brakes, self.timeouts, ratio, rtt, self.lost))
+
+class Client:
+
+	def __init__(self, host, port, payload_size, timeout, records=None):
+		"""Client sending PAYLOAD_SIZE byte packets to HOST:PORT,
+		recording each echo in the RingLog RECORDS if given.
+		"""
+		self.addr = (host, port)
+		self.payload = make_payload(payload_size)
+		self.buf = bytearray(max(payload_size, 1500))
+		self.timeout = timeout
+		self.pending = 0
+		self.counters = Counters()
+		self.records = records
+		self.seq = 0
+		# Highest sequence number echoed so far.
+		self.highest = -1
+
+		self.s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.s.setblocking(0)
+
+	def send(self, n):
+		"""Queues N packets and sends as many as the socket takes."""
+		self.pending += n
+		while self.pending:
+			stamp_sent(self.payload, self.seq, time.time())
+			try:
+				self.s.sendto(self.payload, self.addr)
+			except socket.error as e:
+				if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+					return
+				raise
+			self.seq += 1
+			self.pending -= 1
+			self.counters.sent += 1
+			self.counters.sent_bytes += len(self.payload)
+
+	def receive(self):
+		"""Reads up to BATCH ready echoes.
+
+		Returns:
+			the number of packets they credit.
+		"""
+		credit = 0
+		for _ in range(BATCH):
+			try:
+				n = self.s.recv_into(self.buf)
+			except socket.error as e:
+				if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+					break
+				raise
+			self.counters.received += 1
+			if self.buf[n - len(MARK):n] == MARK:
+				self.counters.accelerates += 1
+				mark = ACCELERATE
+				credit += 2
+			else:
+				self.counters.brakes += 1
+				mark = BRAKE
+			self.record(n, mark)
+		return credit
+
+	def record(self, n, mark):
+		"""Accounts for the timing and loss of the N byte echo in
+		the buffer, which was marked MARK.
+		"""
+		header = read_header(self.buf, n)
+		if header is None:
+			return
+		now = time.time()
+		low, sent, echoed = header
+		# Sequence numbers wrap at 32 bits: the echo is of the
+		# latest packet sent with these low bits.
+		seq = self.seq - 1 - ((self.seq - 1 - low) & 0xffffffff)
+		flags = 0
+		lost = 0
+		if seq > self.highest:
+			lost = seq - self.highest - 1
+			self.highest = seq
+		else:
+			flags = REORDERED
+		rtt = now - sent
+		self.counters.rtt_total += rtt
+		self.counters.timed += 1
+		self.counters.lost += lost
+		if self.records is not None:
+			delay = echoed - sent if echoed else float('nan')
+			self.records.add(low, sent, rtt, delay, mark, flags, lost)
+
+	def run(self, duration, window, stats_interval=None):
+		"""Runs for DURATION seconds, starting with WINDOW packets."""
+		for _ in range(window):
+			self.send(1)
+			time.sleep(0.001)
+
+		start = time.time()
+		deadline = start + duration
+		last_echo = start
+		next_report = start + stats_interval if stats_interval else None
+
+		now = start
+		while now < deadline:
+			wake = min(deadline, last_echo + self.timeout)
+			if next_report:
+				wake = min(wake, next_report)
+			writers = [self.s] if self.pending else []
+			readable, writable, _ = select.select(
+				[self.s], writers, [], max(wake - now, 0))
+			now = time.time()
+
+			if writable:
+				self.send(0)
+			if readable:
+				credit = self.receive()
+				last_echo = now
+				if credit:
+					self.send(credit)
+			elif now >= last_echo + self.timeout:
+				self.counters.timeouts += 1
+				self.send(1)
+				last_echo = now
+
+			if next_report and now >= next_report:
+				self.counters.report(now - start, stats_interval)
+				self.counters.reset()
+				next_report += stats_interval
+
+		self.s.close()
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument(dest='port', nargs='?', type=int, default=12345,
+		help='the same port as used by the server')
+	parser.add_argument('--duration', type=float, default=140,
+		help='(s) how long to send for')
+	parser.add_argument('--window', type=int, default=30,
+		help='number of packets sent before the first echo')
+	parser.add_argument('--payload-size', type=int, default=1472,
+		help='(bytes) UDP payload of each packet')
+	parser.add_argument('--timeout', type=float, default=0.1,
+		help='(s) silence after which one packet is sent')
+	parser.add_argument('--stats', type=float, default=None,
+		help='(s) print sending rate and credit/ack counters at this interval')
+	parser.add_argument('--records', type=str, default=None,
+		help='file to record the RTT, delay, mark and loss of every packet in')
+	parser.add_argument('--records-capacity', type=int, default=1 << 20,
+		help='most packets kept in the records file; older ones are overwritten')
+	args = parser.parse_args()
+
+	records = RingLog(args.records, args.records_capacity) if args.records else None
+	client = Client(os.environ['MAHIMAHI_BASE'], args.port, args.payload_size, args.timeout,
+		records)
 	try:
-		data = s.recv(1500)
-	except socket_error:
-		s.sendto(MESSAGE, (host, port))
-		s.settimeout(None)
-		continue
-	s.settimeout(None)
-	if (data.endswith('888')):
-		s.sendto(MESSAGE, (host, port))
-		#time.sleep(0.001)
-		s.sendto(MESSAGE, (host, port))		
-s.close()
+		client.run(args.duration, args.window, args.stats)
+	finally:
+		if records:
+			records.close()
@@ -0,0 +1,66 @@
+#
+# Layout of ABC packets.
+#
+# The queue (mahimahi/src/packet/cellular_packet_queue.cc)
+# marks a packet by rewriting its last and third to last
+# bytes: "888" is accelerate, anything else brake. The rest
+# of the packet is echoed as it was sent, so the client puts
+# a header at the front: a magic number, the sequence number
+# of the packet and the time it was sent. The server stamps
+# the time it received the packet into the header before
+# echoing it. Under mahimahi the client and the server share
+# a clock, so the echo gives both the round trip time and
+# the one-way delay through the emulated uplink.
+#
+
+import struct
+
+MARK = b'888'
+TRAILER = b'0123456' + MARK
+
+MAGIC = b'ABCt'
+# Magic, sequence number, (s) time sent, (s) time echoed.
+HEADER = struct.Struct('!4sIdd')
+ECHOED = struct.Struct('!d')
+ECHOED_OFFSET = 16
+
+# Sequence numbers wrap at 32 bits.
+SEQ_MODULO = 1 << 32
+
+def make_payload(size):
+	"""Returns a SIZE byte payload: a header, filler and the
+	trailer the queue marks.
+	"""
+	if size < HEADER.size + len(TRAILER):
+		raise ValueError("Payload must hold at least %d bytes" % (HEADER.size + len(TRAILER)))
+	payload = bytearray(b'a' * size)
+	payload[-len(TRAILER):] = TRAILER
+	return payload
+
+def stamp_sent(payload, seq, now):
+	"""Writes the header of packet SEQ, sent at NOW, into PAYLOAD."""
+	HEADER.pack_into(payload, 0, MAGIC, seq % SEQ_MODULO, now, 0.0)
+
+def stamp_echoed(buf, n, now):
+	"""Writes NOW as the time the N byte packet in BUF was echoed,
+	if it has a header.
+
+	Returns:
+		True if the packet was stamped.
+	"""
+	if n < HEADER.size or buf[:len(MAGIC)] != MAGIC:
+		return False
+	ECHOED.pack_into(buf, ECHOED_OFFSET, now)
+	return True
+
+def read_header(buf, n):
+	"""Returns (sequence number, time sent, time echoed) of the N
+	byte packet in BUF, or None if it has no header. The time
+	echoed is 0 if the server did not stamp it.
+	"""
+	if n < HEADER.size:
+		return None
+	magic, seq, sent, echoed = HEADER.unpack_from(buf, 0)
+	if magic != MAGIC:
+		return None
+	return seq, sent, echoed
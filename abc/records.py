@@ -0,0 +1,139 @@
+#!/usr/bin/python
+
+#
+# Per-packet records of the ABC client.
+#
+# For every echo, the client records the packet's sequence
+# number, when it was sent, its round trip time, its one-way
+# delay to the server, its mark (accelerate or brake) and how
+# many packets before it never came back. Records are packed
+# into a ring of fixed-size slots in a memory-mapped file, so
+# recording costs a struct.pack_into() per packet instead of
+# a formatted line, and what was recorded survives the client
+# being killed at the end of a run. Once the ring is full, the
+# oldest records are overwritten.
+#
+# Run as a script, prints a summary of a records file.
+#
+
+from collections import namedtuple
+
+import mmap
+import struct
+
+MAGIC = b'ABCr'
+# Magic, record size, capacity (records), records written.
+FILE_HEADER = struct.Struct('<4sIIQ')
+COUNT = struct.Struct('<Q')
+COUNT_OFFSET = 12
+
+# Sequence number, (s) time sent, (s) round trip time, (s)
+# one-way delay, mark, flags, packets lost before this one.
+RECORD = struct.Struct('<IdffBBH')
+
+BRAKE = 0
+ACCELERATE = 1
+
+# The echo came after one with a higher sequence number, so
+# it was counted lost before.
+REORDERED = 1
+
+MAX_LOST = 0xffff
+
+Record = namedtuple('Record', ['seq', 'sent', 'rtt', 'delay', 'mark', 'flags', 'lost'])
+
+class RingLog:
+
+	def __init__(self, path, capacity):
+		"""Ring of CAPACITY records in a new file at PATH."""
+		if capacity < 1:
+			raise ValueError("A ring holds at least one record")
+		size = FILE_HEADER.size + capacity * RECORD.size
+		self.f = open(path, 'w+b')
+		self.f.truncate(size)
+		self.map = mmap.mmap(self.f.fileno(), size)
+		FILE_HEADER.pack_into(self.map, 0, MAGIC, RECORD.size, capacity, 0)
+		self.capacity = capacity
+		self.count = 0
+
+	def add(self, seq, sent, rtt, delay, mark, flags=0, lost=0):
+		"""Records the echo of packet SEQ."""
+		offset = FILE_HEADER.size + (self.count % self.capacity) * RECORD.size
+		RECORD.pack_into(self.map, offset, seq, sent, rtt, delay, mark, flags,
+			min(lost, MAX_LOST))
+		self.count += 1
+		COUNT.pack_into(self.map, COUNT_OFFSET, self.count)
+
+	def close(self):
+		self.map.flush()
+		self.map.close()
+		self.f.close()
+
+def load_records(path):
+	"""Reads the records file at PATH.
+
+	Returns:
+		(records written, list of the Records still in the ring,
+		oldest first).
+	"""
+	with open(path, 'rb') as f:
+		data = f.read()
+	if len(data) < FILE_HEADER.size:
+		raise ValueError("%s is not an ABC records file" % path)
+	magic, record_size, capacity, count = FILE_HEADER.unpack_from(data, 0)
+	if magic != MAGIC or record_size != RECORD.size:
+		raise ValueError("%s is not an ABC records file" % path)
+	if len(data) < FILE_HEADER.size + capacity * RECORD.size:
+		raise ValueError("%s is truncated" % path)
+
+	kept = min(count, capacity)
+	first = count - kept
+	records = []
+	for i in range(first, count):
+		offset = FILE_HEADER.size + (i % capacity) * RECORD.size
+		records.append(Record(*RECORD.unpack_from(data, offset)))
+	return count, records
+
+def percentile(values, p):
+	"""Returns the nearest-rank P-th percentile of VALUES."""
+	ordered = sorted(values)
+	if not ordered:
+		return None
+	rank = int(round(p / 100.0 * len(ordered) + 0.5)) - 1
+	return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+def summarize(records):
+	"""Returns a dict of the RTT, one-way delay (ms), loss and
+	marks of RECORDS.
+	"""
+	rtts = [r.rtt * 1000.0 for r in records]
+	# Echoes the server did not stamp have no one-way delay.
+	delays = [r.delay * 1000.0 for r in records if r.delay == r.delay]
+	reordered = sum(1 for r in records if r.flags & REORDERED)
+	lost = max(sum(r.lost for r in records) - reordered, 0)
+	summary = {'echoes': len(records), 'lost': lost, 'reordered': reordered,
+		'accelerates': sum(1 for r in records if r.mark == ACCELERATE)}
+	for p in (50, 95, 99):
+		summary['rtt_p%d' % p] = percentile(rtts, p)
+		summary['delay_p%d' % p] = percentile(delays, p)
+	return summary
+
+if __name__ == '__main__':
+	import argparse
+	parser = argparse.ArgumentParser()
+	parser.add_argument(dest='records', help='records file written by client.py --records', type=str)
+	args = parser.parse_args()
+
+	count, records = load_records(args.records)
+	s = summarize(records)
+	print("%d echoes recorded, last %d kept" % (count, len(records)))
+	if not records:
+		raise SystemExit(0)
+	print("lost %d (%.2f%%), reordered %d, accelerate %.1f%%" % (
+		s['lost'], 100.0 * s['lost'] / (s['echoes'] + s['lost']), s['reordered'],
+		100.0 * s['accelerates'] / s['echoes']))
+	for name in ('rtt', 'delay'):
+		if s[name + '_p50'] is None:
+			continue
+		print("%-5s p50 %.2f ms p95 %.2f ms p99 %.2f ms" % (name, s[name + '_p50'],
+			s[name + '_p95'], s[name + '_p99']))
@@ -1,11 +1,197 @@
+#
+# ABC echo server. Sends every packet back to where it came
+# from, keeping per-flow packet and byte counters.
+#
+# Many flows can share one server: the socket is drained in
+# batches into a single reused buffer, and with --workers N
+# the port is sharded over N processes with SO_REUSEPORT,
+# which keeps each flow (source address) on one worker.
+# Workers die with the process that started them, so killing
+# the server never leaves the port bound. Flows idle for a
+# while are forgotten.
+#
+# Packets with a header (see payload.py) are stamped with
+# the time they were received before they are echoed.
+#
+
+import argparse
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import signal
 import socket
+import sys
+import time
+
+from payload import stamp_echoed
+
+# Most packets echoed per wakeup before checking the clock.
+BATCH = 64
+
+# Linux value, for Pythons whose socket module lacks the name.
+SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', 15)
+
+# prctl() option to be sent a signal when the parent exits.
+PR_SET_PDEATHSIG = 1
+
+# Flows idle for this many report intervals, or this many
+# seconds without reports, are forgotten.
+IDLE_INTERVALS = 3
+IDLE_TIMEOUT = 10.0
+
+class Flow:
+
+	def __init__(self, now):
+		"""Counters of one client address."""
+		self.first_seen = now
+		self.last_seen = now
+		self.packets = 0
+		self.bytes = 0
+		self.interval_packets = 0
+		self.interval_bytes = 0
+
+class EchoServer:
+
+	def __init__(self, port, reuse_port=False):
+		"""Echo server bound to PORT on all interfaces."""
+		self.s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		if reuse_port:
+			self.s.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+		self.s.bind(('', port))
+		self.s.setblocking(0)
+
+		self.buf = bytearray(65536)
+		self.view = memoryview(self.buf)
+		self.flows = {}
+
+	def echo(self, now):
+		"""Echoes up to BATCH ready packets."""
+		for _ in range(BATCH):
+			try:
+				n, addr = self.s.recvfrom_into(self.buf)
+			except socket.error as e:
+				if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+					return
+				raise
+			stamp_echoed(self.buf, n, time.time())
+			try:
+				self.s.sendto(self.view[:n], addr)
+			except socket.error as e:
+				# A full send buffer drops the echo, as a
+				# full queue would.
+				if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS):
+					raise
+
+			flow = self.flows.get(addr)
+			if flow is None:
+				flow = self.flows[addr] = Flow(now)
+			flow.last_seen = now
+			flow.interval_packets += 1
+			flow.interval_bytes += n
+
+	def expire(self, now, idle):
+		"""Forgets the flows that sent nothing for IDLE seconds."""
+		for addr in [a for a, f in self.flows.items() if now - f.last_seen > idle]:
+			del self.flows[addr]
+
+	def report(self, now, interval, out):
+		"""Writes each active flow's counters for the last INTERVAL."""
+		for addr in sorted(self.flows):
+			flow = self.flows[addr]
+			if not flow.interval_packets:
+				continue
+			flow.packets += flow.interval_packets
+			flow.bytes += flow.interval_bytes
+			out.write("%.3f pid %d flow %s:%d %d pkts %d bytes %.2f Mbit/s "
+				"total %d pkts %d bytes\n" % (
+				now, os.getpid(), addr[0], addr[1], flow.interval_packets,
+				flow.interval_bytes, flow.interval_bytes * 8 / (interval * 1000000.0),
+				flow.packets, flow.bytes))
+			flow.interval_packets = 0
+			flow.interval_bytes = 0
+		out.flush()
+
+	def serve(self, interval=None, out=sys.stderr):
+		"""Echoes forever, reporting flows every INTERVAL seconds."""
+		idle = IDLE_INTERVALS * interval if interval else IDLE_TIMEOUT
+		next_report = time.time() + interval if interval else None
+		next_expiry = time.time() + idle
+		while True:
+			wake = min(next_report, next_expiry) if next_report else next_expiry
+			readable, _, _ = select.select([self.s], [], [], max(wake - time.time(), 0))
+			now = time.time()
+			if readable:
+				self.echo(now)
+			if next_report and now >= next_report:
+				self.report(now, interval, out)
+				next_report += interval
+			if now >= next_expiry:
+				self.expire(now, idle)
+				next_expiry = now + idle
+
+def die_with_parent(parent):
+	"""Has the kernel kill this process once PARENT exits."""
+	libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+	libc.prctl(PR_SET_PDEATHSIG, signal.SIGKILL)
+	# The parent may have exited before prctl().
+	if os.getppid() != parent:
+		os._exit(1)
+
+def serve_workers(port, workers, interval, out):
+	"""Serves PORT from WORKERS processes sharing it with SO_REUSEPORT.
+
+	The workers are killed when the server is terminated or
+	interrupted, and die with it if it is killed.
+	"""
+	parent = os.getpid()
+	children = []
+
+	def stop(signum, frame):
+		for pid in children:
+			try:
+				os.kill(pid, signal.SIGKILL)
+			except OSError:
+				pass
+		for pid in children:
+			try:
+				os.waitpid(pid, 0)
+			except OSError:
+				pass
+		os._exit(0)
+
+	signal.signal(signal.SIGTERM, stop)
+	signal.signal(signal.SIGINT, stop)
+	for _ in range(workers):
+		pid = os.fork()
+		if pid == 0:
+			try:
+				signal.signal(signal.SIGTERM, signal.SIG_DFL)
+				signal.signal(signal.SIGINT, signal.SIG_DFL)
+				die_with_parent(parent)
+				EchoServer(port, reuse_port=True).serve(interval, out)
+			finally:
+				os._exit(1)
+		children.append(pid)
+	for pid in children:
+		os.waitpid(pid, 0)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument(dest='port', nargs='?', type=int, default=12345,
+		help='port to listen on')
+	parser.add_argument('--workers', type=int, default=1,
+		help='number of processes sharing the port')
+	parser.add_argument('--log-interval', type=float, default=None,
+		help='(s) log per-flow packets and bytes at this interval')
+	parser.add_argument('--log-file', type=str, default=None,
+		help='file to log flows to (default: standard error)')
+	args = parser.parse_args()
 
-host = ''        # Symbolic name meaning all available interfaces
-port = 12345     # Arbitrary non-privileged port
-#s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-s.bind((host, port))
-while True:
-	data, addr = s.recvfrom(1500)
-	s.sendto(data, addr)
+	out = open(args.log_file, 'a') if args.log_file else sys.stderr
+	if args.workers > 1:
+		serve_workers(args.port, args.workers, args.log_interval, out)
+	else:
+		EchoServer(args.port).serve(args.log_interval, out)
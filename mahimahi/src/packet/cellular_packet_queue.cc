@@ -10,6 +10,8 @@ CELLULARPacketQueue::CELLULARPacketQueue( const string & args )
   : DroppingPacketQueue(args),
     qdelay_ref_ ( get_arg( args, "qdelay_ref" ) ),
     beta_ ( get_arg( args,  "beta" ) / 100.0),
+    window_ ( get_arg( args, "window" ) ),
+    delta_ ( get_arg( args, "delta" ) ),
     observed_dq_queue ( {0} ),
     real_dq_queue ( {0} ),
     credits (5)
@@ -17,6 +19,12 @@ CELLULARPacketQueue::CELLULARPacketQueue( const string & args )
   if ( qdelay_ref_ == 0 || beta_==0) {
     throw runtime_error( "CELLULAR AQM queue must have qdelay_ref, beta" );
   }
+  if ( window_ == 0 ) {
+    window_ = 20;
+  }
+  if ( delta_ == 0 ) {
+    delta_ = 100.0;
+  }
 }
 
 void CELLULARPacketQueue::enqueue( QueuedPacket && p )
@@ -38,7 +46,7 @@ void CELLULARPacketQueue::enqueue( QueuedPacket && p )
 QueuedPacket CELLULARPacketQueue::dequeue( void )
 {
   uint32_t now = timestamp();
-  while(now-real_dq_queue[0]>20 && real_dq_queue.size()>1 && now>real_dq_queue[1]) {
+  while(now-real_dq_queue[0]>window_ && real_dq_queue.size()>1 && now>real_dq_queue[1]) {
     real_dq_queue.pop_front();
   }
   real_dq_queue.push_back(now);
@@ -48,19 +56,17 @@ QueuedPacket CELLULARPacketQueue::dequeue( void )
   }
 
   QueuedPacket ret = std::move( DroppingPacketQueue::dequeue () );
-  while(now-observed_dq_queue[0]>20 && observed_dq_queue.size()>1 && now>observed_dq_queue[1]) {
+  while(now-observed_dq_queue[0]>window_ && observed_dq_queue.size()>1 && now>observed_dq_queue[1]) {
     observed_dq_queue.pop_front();
    }
   observed_dq_queue.push_back(now);
    
-  double delta = 100.0;   //For stabilitilt delta should be greater than max RTT
-  
   double real_dq_rate_, observed_dq_rate_, target_rate;
-  real_dq_rate_ = (real_dq_queue.size()-1)/20.0;
-  observed_dq_rate_ = (observed_dq_queue.size()-1)/20.0;
+  real_dq_rate_ = (real_dq_queue.size()-1)/double(window_);
+  observed_dq_rate_ = (observed_dq_queue.size()-1)/double(window_);
 
   double current_qdelay = (size_packets() + 1) / real_dq_rate_;
-  target_rate = 0.98*real_dq_rate_ + beta_ * (real_dq_rate_ / delta) * min(0.0, (qdelay_ref_ - current_qdelay));  
+  target_rate = 0.98*real_dq_rate_ + beta_ * (real_dq_rate_ / delta_) * min(0.0, (qdelay_ref_ - current_qdelay));  
   double credit_prob_ = (target_rate /  observed_dq_rate_) * 0.5;
 
   credit_prob_ = max(0.0,credit_prob_);
@@ -22,6 +22,10 @@ private:
 
     //Internal parameters
     double beta_;
+    //Window (ms) over which dequeue rates are measured
+    uint32_t window_;
+    //For stability delta should be greater than max RTT
+    double delta_;
 
     //Status variables
     std::deque<uint32_t> observed_dq_queue;
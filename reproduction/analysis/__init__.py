@@ -0,0 +1,4 @@
+#
+# Post-processing of mahimahi logs for our
+# reproduction of the ABC paper.
+#
@@ -0,0 +1,125 @@
+#
+# Live analysis of an mm-link log.
+#
+# Instead of writing its log to disk and having it analyzed
+# once the run is over, mm-link logs into a named pipe that
+# a thread of the experiment process reads, feeding the
+# events to a LogAnalyzer as they arrive. When mm-link
+# exits, the analyzer has seen the whole log, so the
+# results are ready as soon as the run ends. The raw log is
+# only written, by the same thread, if a path is given.
+#
+# The analyzer has to keep up with mm-link: once the pipe's
+# buffer is full, mm-link blocks on writing its log.
+#
+# Given a SteadyState (analysis/steady.py), the analysis also
+# tells when the run can end, and trims the startup transient
+# from the results.
+#
+
+import os
+import threading
+import time
+
+from analysis.logfiles import create_log
+from analysis.mm_log import LogAnalyzer, analyze_stream, run_stats, save_results
+
+# Small reads, so that a steady state is noticed soon.
+LIVE_CHUNK_BYTES = 1 << 16
+# (s) how long finish() waits for the end of the log.
+FINISH_TIMEOUT = 30
+POLL_INTERVAL = 0.05
+
+class LiveAnalysis:
+
+    def __init__(self, fifo_path, log_path=None, steady=None, analysis_start=None):
+        """Analyzes the mm-link log written to the named pipe at
+        FIFO_PATH, also saving it to LOG_PATH if given, and
+        watching for the SteadyState STEADY if given. The first
+        ANALYSIS_START ms of the run, if given, are left out of the results.
+        """
+        self.fifo_path = fifo_path
+        self.log_path = log_path
+        self.steady = steady
+        self.analysis_start = analysis_start
+        self.analyzer = None
+        self.error = None
+        self.thread = None
+
+    def start(self):
+        """Creates the pipe and starts reading from it. mm-link
+        must be started after this.
+        """
+        if os.path.exists(self.fifo_path):
+            os.remove(self.fifo_path)
+        os.mkfifo(self.fifo_path)
+        self.analyzer = None
+        self.error = None
+        self.thread = threading.Thread(target=self._read)
+        # Never keep the experiment alive for a run that broke off.
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _read(self):
+        if self.steady:
+            analyzer = self.steady.analyzer()
+        else:
+            analyzer = LogAnalyzer(bin_ms=self.analysis_start)
+        on_chunk = self.steady.update if self.steady else None
+        try:
+            with open(self.fifo_path) as f:
+                if self.log_path:
+                    with create_log(self.log_path) as log:
+                        self.analyzer = analyze_stream(f, LIVE_CHUNK_BYTES, log,
+                                analyzer, on_chunk)
+                else:
+                    self.analyzer = analyze_stream(f, LIVE_CHUNK_BYTES, None,
+                            analyzer, on_chunk)
+        except Exception as e:
+            self.error = e
+
+    def should_stop(self):
+        """Returns True once the run can end early."""
+        return self.steady is not None and self.steady.done
+
+    def _unblock(self):
+        # Opening the pipe for writing, and closing it, ends the
+        # reader's wait if mm-link never opened it. Fails if the
+        # reader has not opened it yet.
+        try:
+            os.close(os.open(self.fifo_path, os.O_WRONLY | os.O_NONBLOCK))
+        except OSError:
+            pass
+
+    def finish(self, timeout=FINISH_TIMEOUT):
+        """Waits for the end of the log, once mm-link has exited.
+
+        Returns:
+            the LogAnalyzer that read the log.
+        """
+        if self.thread is None:
+            raise IOError("Live analysis of %s was never started" % self.fifo_path)
+        deadline = time.time() + timeout
+        while self.thread.is_alive() and time.time() < deadline:
+            self._unblock()
+            self.thread.join(POLL_INTERVAL)
+        if os.path.exists(self.fifo_path):
+            os.remove(self.fifo_path)
+
+        if self.thread.is_alive():
+            raise IOError("No end of the log in %s after %d s" % (self.fifo_path, timeout))
+        if self.error is not None:
+            raise self.error
+        return self.analyzer
+
+    def write_results(self, results_file_path, trace_path=None):
+        """Saves the results of the log, as mm_log.write_results()
+        would from the log file, without the startup transient if
+        the run reached a steady state.
+        """
+        analyzer = self.finish()
+        if not self.steady:
+            save_results(run_stats(analyzer, trace_path, self.analysis_start), results_file_path)
+            return
+        link_stats = run_stats(analyzer, trace_path, self.steady.cutoff)
+        save_results(link_stats._replace(steady=self.steady.steady), results_file_path)
@@ -0,0 +1,160 @@
+#
+# Compressed mm-link logs.
+#
+# mm-link writes its log uncompressed, so a compressed log
+# is produced by pointing mm-link at a named pipe that a
+# compressor drains into the log file as the run goes on;
+# the uncompressed log never touches the disk. The suffix
+# of a log's path says how it is compressed, and open_log()
+# reads any of them back as text, decompressing as it goes.
+# create_log() writes one from Python.
+#
+
+from collections import namedtuple
+from contextlib import contextmanager
+
+import gzip
+import os
+import subprocess
+import sys
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+Compressor = namedtuple('Compressor', [
+        'suffix',       # appended to the log's path
+        'compress',     # command compressing stdin to stdout
+        'decompress'    # command decompressing a file to stdout
+])
+
+COMPRESSORS = {
+    'gzip': Compressor('.gz', 'gzip -c', 'gzip -dc'),
+    'xz': Compressor('.xz', 'xz -c -1 -T1', 'xz -dc'),
+    'zstd': Compressor('.zst', 'zstd -q -c', 'zstd -q -dc'),
+}
+
+def compression_of(path):
+    """Returns the name of the compressor of the log at PATH,
+    or None if it is not compressed.
+    """
+    for name, c in COMPRESSORS.items():
+        if path.endswith(c.suffix):
+            return name
+    return None
+
+def strip_compression(path):
+    """Returns PATH without its compression suffix, if any."""
+    compression = compression_of(path)
+    if compression:
+        return path[:-len(COMPRESSORS[compression].suffix)]
+    return path
+
+def compressed_path(path, compression):
+    """Returns the path of the log PATH compressed with
+    COMPRESSION, which may be None.
+    """
+    if not compression:
+        return path
+    return path + COMPRESSORS[compression].suffix
+
+def compressing_command(command, log_path, compression):
+    """Returns a shell command running COMMAND, which writes an
+    mm-link log to LOG_PATH + '.fifo', while COMPRESSION
+    compresses that log into LOG_PATH.
+
+    The wrapper opens both ends of the pipe before starting the
+    compressor and holds the writing end until COMMAND exits, so
+    the compressor sees the end of the log then, even if mm-link
+    never opened the pipe. It exits with COMMAND's status, or the
+    compressor's if COMMAND succeeded.
+    """
+    fifo = log_path + '.fifo'
+    return ("rm -f {fifo}; mkfifo {fifo} || exit 1; "
+            "exec 3<>{fifo} 4<{fifo}; "
+            "{compress} <&4 3>&- 4<&- > {log} & z=$!; "
+            "exec 4<&-; "
+            "{command} 3>&-; s=$?; "
+            "exec 3>&-; wait $z || [ $s -ne 0 ] || s=1; "
+            "rm -f {fifo}; exit $s").format(
+                    fifo=fifo, log=log_path, command=command,
+                    compress=COMPRESSORS[compression].compress)
+
+def decompress_command(log_path):
+    """Returns a shell command writing the log at LOG_PATH,
+    decompressed, to stdout.
+    """
+    compression = compression_of(log_path)
+    if compression:
+        return '%s %s' % (COMPRESSORS[compression].decompress, log_path)
+    return 'cat %s' % log_path
+
+@contextmanager
+def _decompressing_pipe(log_path):
+    args = decompress_command(log_path).split()
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, universal_newlines=True)
+    try:
+        yield proc.stdout
+    finally:
+        proc.stdout.close()
+        status = proc.wait()
+    if status != 0:
+        raise subprocess.CalledProcessError(status, args)
+
+@contextmanager
+def open_log(log_path):
+    """Opens the log at LOG_PATH, compressed or not, for
+    reading as text.
+    """
+    compression = compression_of(log_path)
+    if compression == 'gzip':
+        # Python 2's gzip only reads bytes, which are its str.
+        f = gzip.open(log_path, 'rt' if sys.version_info[0] >= 3 else 'rb')
+    elif compression == 'xz' and lzma is not None:
+        f = lzma.open(log_path, 'rt')
+    elif compression:
+        # zstd, or xz without the lzma module.
+        with _decompressing_pipe(log_path) as f:
+            yield f
+        return
+    else:
+        f = open(log_path)
+    try:
+        yield f
+    finally:
+        f.close()
+
+@contextmanager
+def create_log(log_path):
+    """Opens a new log at LOG_PATH for writing text, compressed
+    as the suffix of LOG_PATH says.
+    """
+    compression = compression_of(log_path)
+    if not compression:
+        with open(log_path, 'w') as f:
+            yield f
+        return
+
+    args = COMPRESSORS[compression].compress.split()
+    with open(log_path, 'wb') as out:
+        proc = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=out,
+                universal_newlines=True)
+        try:
+            yield proc.stdin
+        finally:
+            proc.stdin.close()
+            status = proc.wait()
+    if status != 0:
+        raise subprocess.CalledProcessError(status, args)
+
+def log_paths(root):
+    """Returns the paths of the logs under ROOT, compressed or
+    not, in no particular order.
+    """
+    paths = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if strip_compression(name).endswith('.log'):
+                paths.append(os.path.join(directory, name))
+    return paths
@@ -0,0 +1,478 @@
+#!/usr/bin/python
+
+#
+# Streaming analyzer for mm-link logs.
+#
+# Computes the same summary statistics as
+# mahimahi/scripts/mm-throughput-graph, but reads the
+# log in chunks into NumPy arrays instead of keeping
+# every event in memory. Memory use is bounded by the
+# length of the run in milliseconds and by the largest
+# per-packet delay, not by the size of the log.
+#
+# Besides the 95th percentiles, the results keep a
+# DelaySketch of every per-packet queueing delay, so
+# other percentiles, CDFs and tails can be computed, and
+# runs merged, without the log.
+#
+# Logs compressed by the experiment runner (see
+# analysis/logfiles.py) are decompressed as they are read.
+#
+
+from collections import namedtuple
+
+import json
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from analysis.logfiles import open_log
+from analysis.sketch import DelaySketch
+from tracelib.index import load_index
+
+# Event codes used once a chunk has been parsed.
+ARRIVAL = -1
+DEPARTURE = -2
+OPPORTUNITY = -3
+
+_EVENT_CODES = [(' + ', ' %d ' % ARRIVAL),
+                (' - ', ' %d ' % DEPARTURE),
+                (' # ', ' %d ' % OPPORTUNITY)]
+
+CHUNK_BYTES = 1 << 22
+
+LinkStats = namedtuple('LinkStats', [
+        'duration',           # (s) first to last event
+        'avg_capacity',       # (Mbps)
+        'avg_ingress',        # (Mbps)
+        'avg_throughput',     # (Mbps)
+        'queuing_delay',      # (ms) 95th percentile per-packet queueing delay
+        'signal_delay',       # (ms) 95th percentile signal delay
+        'departures',         # number of delivered packets
+        'delay_sketch',       # DelaySketch.to_dict() of queueing delays
+        'cutoff',             # (s) startup transient left out, after the first event
+        'steady',             # whether the run reached a steady state, if watched
+        'signal_sketch'       # DelaySketch.to_dict() of the per-ms signal delays
+])
+# Results saved by older versions lack the later fields, and
+# runs that were not watched for a steady state have none.
+LinkStats.__new__.__defaults__ = (None, None, None, None)
+
+def _grow(array, size, fill):
+    """Returns ARRAY extended with FILL to at least SIZE entries."""
+    if size <= len(array):
+        return array
+    new_size = max(size, 2 * len(array))
+    grown = np.empty(new_size, dtype=array.dtype)
+    grown[:len(array)] = array
+    grown[len(array):] = fill
+    return grown
+
+def _grow_2d(array, rows, columns):
+    """Returns the 2-D ARRAY extended with zeros to at least ROWS
+    rows and COLUMNS columns.
+    """
+    if rows <= array.shape[0] and columns <= array.shape[1]:
+        return array
+    shape = [n if n >= need else max(need, 2 * n)
+            for n, need in zip(array.shape, (rows, columns))]
+    grown = np.zeros(shape, dtype=array.dtype)
+    grown[:array.shape[0], :array.shape[1]] = array
+    return grown
+
+def delay_percentile(delay_counts, p):
+    """Returns the P-th percentile of the delays (ms) counted in
+    DELAY_COUNTS, the number of packets with each delay.
+    """
+    counts = np.cumsum(delay_counts)
+    k = int(p / 100.0 * counts[-1])
+    return float(np.searchsorted(counts, k, side='right'))
+
+def parse_events(chunk):
+    """Parses a chunk of complete mm-link log event lines.
+
+    Returns:
+        (timestamps, codes, num_bytes, delays) as NumPy arrays,
+        where delays is only defined for departures (and 0 for
+        other events).
+    """
+    for event, code in _EVENT_CODES:
+        chunk = chunk.replace(event, code)
+    values = np.fromstring(chunk, dtype=np.int64, sep=' ')
+
+    positions = np.flatnonzero(values < 0)
+    num_lines = chunk.count('\n') + (not chunk.endswith('\n'))
+    if len(positions) != num_lines:
+        raise ValueError("Malformed mm-link log chunk")
+
+    codes = values[positions]
+    timestamps = values[positions - 1]
+    num_bytes = values[positions + 1]
+
+    delays = np.zeros(len(positions), dtype=np.int64)
+    departures = codes == DEPARTURE
+    delay_positions = positions[departures] + 2
+    if len(delay_positions) and delay_positions[-1] >= len(values):
+        raise ValueError("Departure format: timestamp - num_bytes delay")
+    delays[departures] = values[delay_positions]
+
+    return timestamps, codes, num_bytes, delays
+
+class LogAnalyzer:
+
+    def __init__(self, bin_ms=None):
+        """Accumulates statistics over the events of one mm-link log.
+
+        Feed it the log with feed_line() / feed_chunk(), then
+        call result().
+
+        With BIN_MS, the bits and delays of the events are also
+        kept per BIN_MS ms of the run, so that statistics can be
+        computed over a span of it (see window() and result()).
+        """
+        self.base_timestamp = None
+        self.first_timestamp = None
+        self.last_timestamp = None
+
+        self.capacity_bits = 0
+        self.arrival_bits = 0
+        self.departure_bits = 0
+        self.departures = 0
+
+        # Number of departures with each delay (ms).
+        self.delay_counts = np.zeros(1024, dtype=np.int64)
+        # Minimum delay of a packet sent at each ms.
+        self.signal_delays = np.empty(1 << 16)
+        self.signal_delays.fill(np.inf)
+
+        # Per bin: capacity, arrival and departure bits, and the
+        # number of departures with each delay.
+        self.bin_ms = bin_ms
+        if bin_ms:
+            self.bin_bits = np.zeros((64, 3))
+            self.bin_delay_counts = np.zeros((64, 1024), dtype=np.int64)
+
+    def feed_line(self, line):
+        """Feeds a single line (header or event) of the log."""
+        self.feed_chunk(line if line.endswith('\n') else line + '\n')
+
+    def feed_chunk(self, chunk):
+        """Feeds a chunk of complete lines of the log."""
+        while chunk:
+            if chunk.startswith('#'):
+                line, _, chunk = chunk.partition('\n')
+                self._feed_comment(line)
+                continue
+            end = chunk.find('\n#')
+            if end == -1:
+                events, chunk = chunk, ''
+            else:
+                events, chunk = chunk[:end + 1], chunk[end + 1:]
+            if events.strip():
+                self._feed_event_lines(events)
+
+    def _feed_comment(self, line):
+        if line.startswith('# base timestamp:'):
+            if self.base_timestamp is not None:
+                raise ValueError("base timestamp multiply defined")
+            self.base_timestamp = int(line.split(':')[1])
+
+    def _feed_event_lines(self, chunk):
+        if self.base_timestamp is None:
+            raise ValueError("logfile is missing base timestamp")
+
+        timestamps, codes, num_bytes, delays = parse_events(chunk)
+        self.feed_events(timestamps - self.base_timestamp, codes, num_bytes, delays)
+
+    def feed_events(self, timestamps, codes, num_bytes, delays):
+        """Feeds parsed events, with timestamps relative to the base."""
+        if not len(timestamps):
+            return
+
+        if self.first_timestamp is None:
+            self.first_timestamp = int(timestamps[0])
+            self.last_timestamp = self.first_timestamp
+        self.last_timestamp = max(self.last_timestamp, int(timestamps.max()))
+
+        bits = num_bytes * 8
+        self.arrival_bits += int(bits[codes == ARRIVAL].sum())
+        self.capacity_bits += int(bits[codes == OPPORTUNITY].sum())
+
+        departures = codes == DEPARTURE
+        delays = delays[departures]
+        if len(delays) and delays.min() < 0:
+            raise ValueError("Invalid delay: %d" % delays.min())
+        if self.bin_ms:
+            self._feed_bins(timestamps, codes, bits, delays)
+        if not len(delays):
+            return
+        sent = timestamps[departures] - delays
+        if sent.min() < 0:
+            raise ValueError("Invalid timestamp and delay")
+
+        self.departure_bits += int(bits[departures].sum())
+        self.departures += len(delays)
+
+        counts = np.bincount(delays)
+        self.delay_counts = _grow(self.delay_counts, len(counts), 0)
+        self.delay_counts[:len(counts)] += counts
+
+        # Signal delay: minimum delay of the packets sent in each ms.
+        order = np.argsort(sent, kind='mergesort')
+        sent = sent[order]
+        delays = delays[order]
+        starts = np.flatnonzero(np.r_[True, sent[1:] != sent[:-1]])
+        keys = sent[starts]
+        self.signal_delays = _grow(self.signal_delays, keys[-1] + 1, np.inf)
+        self.signal_delays[keys] = np.minimum(
+                self.signal_delays[keys], np.minimum.reduceat(delays, starts))
+
+    def _feed_bins(self, timestamps, codes, bits, delays):
+        bins = timestamps // self.bin_ms
+        self.bin_bits = _grow_2d(self.bin_bits, bins.max() + 1, 3)
+        for column, code in enumerate([OPPORTUNITY, ARRIVAL, DEPARTURE]):
+            events = codes == code
+            self.bin_bits[:, column] += np.bincount(bins[events], weights=bits[events],
+                    minlength=len(self.bin_bits))
+        if not len(delays):
+            return
+        bins = bins[codes == DEPARTURE]
+        self.bin_delay_counts = _grow_2d(self.bin_delay_counts,
+                len(self.bin_bits), delays.max() + 1)
+        np.add.at(self.bin_delay_counts, (bins, delays), 1)
+
+    def complete_bins(self):
+        """Returns the number of bins no later event can fall in."""
+        return self.last_timestamp // self.bin_ms if self.bin_ms else 0
+
+    def window(self, first_bin, last_bin):
+        """Returns the (utilization, 95th percentile per-packet
+        queueing delay) over bins FIRST_BIN to LAST_BIN, with None
+        for a statistic the window has no events for.
+        """
+        capacity, _, departure = self.bin_bits[first_bin:last_bin + 1].sum(axis=0)
+        delay_counts = self.bin_delay_counts[first_bin:last_bin + 1].sum(axis=0)
+        utilization = departure / capacity if capacity else None
+        delay = delay_percentile(delay_counts, 95) if delay_counts.any() else None
+        return utilization, delay
+
+    def queuing_delay_percentile(self, p):
+        """Returns the P-th percentile per-packet queueing delay (ms)."""
+        return delay_percentile(self.delay_counts, p)
+
+    def delay_sketch(self, delay_counts=None):
+        """Returns a DelaySketch of the per-packet queueing delays,
+        or of those counted in DELAY_COUNTS.
+        """
+        if delay_counts is None:
+            delay_counts = self.delay_counts
+        sketch = DelaySketch()
+        nonzero = np.flatnonzero(delay_counts)
+        sketch.add(nonzero, delay_counts[nonzero])
+        return sketch
+
+    def signal_delay_series(self, start=0):
+        """Returns signal delay (ms) for every ms from the first send
+        time (at or after START) to the last, filling gaps the way
+        mm-throughput-graph does.
+        """
+        defined = np.flatnonzero(np.isfinite(self.signal_delays[start:])) + start
+        lo, hi = defined[0], defined[-1]
+        values = self.signal_delays[lo:hi + 1]
+
+        # A ms with no packet has the delay of the next sent packet,
+        # plus the time spent waiting for it.
+        index = np.arange(len(values))
+        next_sent = np.where(np.isfinite(values), index, len(values))
+        next_sent = np.minimum.accumulate(next_sent[::-1])[::-1]
+        return values[next_sent] + (next_sent - index)
+
+    def result(self, start=None):
+        """Returns the LinkStats for everything fed so far.
+
+        With START (ms after the base timestamp, a multiple of the
+        bin size), the events before START are left out, and the
+        results record the cutoff.
+        """
+        if self.first_timestamp is None:
+            raise ValueError("Must have at least one event")
+
+        cutoff = None
+        first = self.first_timestamp
+        capacity_bits, arrival_bits, departure_bits = (
+                self.capacity_bits, self.arrival_bits, self.departure_bits)
+        delay_counts = self.delay_counts
+        if start is not None:
+            if not self.bin_ms or start % self.bin_ms:
+                raise ValueError("Cutoff %d ms is not a multiple of the bin size" % start)
+            first_bin = start // self.bin_ms
+            first = max(first, start)
+            cutoff = (first - self.first_timestamp) / 1000.0
+            capacity_bits, arrival_bits, departure_bits = self.bin_bits[first_bin:].sum(axis=0)
+            delay_counts = self.bin_delay_counts[first_bin:].sum(axis=0)
+            start = first
+
+        departures = int(delay_counts.sum())
+        if departures == 0:
+            raise ValueError("Must have at least one departure event")
+
+        duration = (self.last_timestamp - first) / 1000.0
+        signal = np.sort(self.signal_delay_series(start or 0))
+        signal_sketch = DelaySketch()
+        values, counts = np.unique(signal.astype(np.int64), return_counts=True)
+        signal_sketch.add(values, counts)
+
+        return LinkStats(
+                duration=duration,
+                avg_capacity=capacity_bits / duration / 1000000.0,
+                avg_ingress=arrival_bits / duration / 1000000.0,
+                avg_throughput=departure_bits / duration / 1000000.0,
+                queuing_delay=delay_percentile(delay_counts, 95),
+                signal_delay=float(signal[int(0.95 * len(signal))]),
+                departures=departures,
+                delay_sketch=self.delay_sketch(delay_counts).to_dict(),
+                cutoff=cutoff,
+                signal_sketch=signal_sketch.to_dict()
+        )
+
+def analyze_stream(f, chunk_bytes=CHUNK_BYTES, tee=None, analyzer=None, on_chunk=None):
+    """Analyzes an mm-link log read from the file object F, as it
+    is read. The log is also written to the file object TEE, if
+    given.
+
+    Args:
+        analyzer: LogAnalyzer to feed, instead of a new one
+        on_chunk: called with the analyzer after each chunk
+
+    Returns:
+        a LogAnalyzer that has consumed the whole log.
+    """
+    if analyzer is None:
+        analyzer = LogAnalyzer()
+    while True:
+        chunk = f.read(chunk_bytes)
+        if not chunk:
+            break
+        # Only hand complete lines to the analyzer. A log cut off
+        # by a run stopped early may end in a partial line.
+        if not chunk.endswith('\n'):
+            chunk += f.readline()
+            chunk = chunk[:chunk.rfind('\n') + 1]
+        analyzer.feed_chunk(chunk)
+        if tee:
+            tee.write(chunk)
+        if on_chunk:
+            on_chunk(analyzer)
+    return analyzer
+
+def analyze_log(log_file_path, chunk_bytes=CHUNK_BYTES):
+    """Returns the LinkStats of the mm-link log at LOG_FILE_PATH,
+    which may be compressed.
+    """
+    with open_log(log_file_path) as f:
+        return analyze_stream(f, chunk_bytes).result()
+
+def save_results(link_stats, results_file_path):
+    """Saves LINK_STATS as JSON to RESULTS_FILE_PATH."""
+    with open(results_file_path, 'w') as f:
+        json.dump(link_stats._asdict(), f, indent=2)
+
+def load_results(results_file_path):
+    """Loads LinkStats saved by save_results().
+
+    Also understands the text summary written to stderr by
+    mm-throughput-graph, for results from older runs.
+    """
+    with open(results_file_path) as f:
+        text = f.read()
+
+    if text.lstrip().startswith('{'):
+        return LinkStats(**json.loads(text))
+
+    lines = text.splitlines()
+    avg_capacity = float(lines[0].split(' ')[2])
+    avg_throughput = float(lines[1].split(' ')[2])
+    return LinkStats(
+            duration=None,
+            avg_capacity=avg_capacity,
+            avg_ingress=None,
+            avg_throughput=avg_throughput,
+            queuing_delay=float(lines[2].split(' ')[5]),
+            signal_delay=float(lines[3].split(' ')[4]),
+            departures=None
+    )
+
+def trace_capacity(analyzer, trace_path, start=None):
+    """Returns the average capacity (Mbits/s) of the trace at
+    TRACE_PATH over the span of the log fed to ANALYZER, from
+    START (ms) if given.
+    """
+    index = load_index(trace_path)
+    first = analyzer.first_timestamp
+    if start is not None:
+        first = max(first, start)
+    return index.average_capacity(first, analyzer.last_timestamp)
+
+def analyze_run(log_file_path, trace_path=None, start=None):
+    """Returns the LinkStats of the mm-link log at LOG_FILE_PATH.
+
+    If TRACE_PATH is given, the capacity comes from the index of
+    the trace the link ran, instead of the opportunities in the log.
+    The first START ms of the run, if given, are left out. The log
+    may be compressed.
+    """
+    with open_log(log_file_path) as f:
+        analyzer = analyze_stream(f, analyzer=LogAnalyzer(bin_ms=start) if start else None)
+    return run_stats(analyzer, trace_path, start)
+
+def run_stats(analyzer, trace_path=None, start=None):
+    """Returns the LinkStats of the log fed to ANALYZER, taking
+    the capacity from the trace at TRACE_PATH if given. Events
+    before START (ms) are left out, as in LogAnalyzer.result().
+    """
+    link_stats = analyzer.result(start)
+    if trace_path:
+        link_stats = link_stats._replace(
+                avg_capacity=trace_capacity(analyzer, trace_path, start))
+    return link_stats
+
+def write_results(log_file_path, results_file_path, trace_path=None, start=None):
+    """Analyzes the log at LOG_FILE_PATH and saves the results."""
+    save_results(analyze_run(log_file_path, trace_path, start), results_file_path)
+
+def print_summary(s):
+    """Prints LinkStats S in the format used by mm-throughput-graph."""
+    print("Average capacity: %.2f Mbits/s" % s.avg_capacity)
+    print("Average throughput: %.2f Mbits/s (%.1f%% utilization)"
+            % (s.avg_throughput, 100.0 * s.avg_throughput / s.avg_capacity))
+    print("95th percentile per-packet queueing delay: %.0f ms" % s.queuing_delay)
+    print("95th percentile signal delay: %.0f ms" % s.signal_delay)
+
+def print_percentiles(s, percentiles):
+    """Prints the queueing delay PERCENTILES of LinkStats S."""
+    if s.delay_sketch is None:
+        raise ValueError("Results have no delay sketch")
+    sketch = DelaySketch.from_dict(s.delay_sketch)
+    for p in percentiles:
+        print("%gth percentile per-packet queueing delay: %.0f ms"
+                % (p, sketch.percentile(p)))
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument(dest='log_file', type=str,
+        help='mm-link log to analyze, possibly compressed (.gz, .xz, .zst)')
+    parser.add_argument('--json-out', default=None, type=str,
+        help='also save the results as JSON to this file')
+    parser.add_argument('--trace', default=None, type=str,
+        help='trace the link ran, to take the capacity from its index')
+    parser.add_argument('--percentiles', default=[], nargs='+', type=float,
+        help='also print these percentiles of the queueing delay')
+    args = parser.parse_args()
+
+    link_stats = analyze_run(os.path.expanduser(args.log_file), args.trace)
+    print_summary(link_stats)
+    print_percentiles(link_stats, args.percentiles)
+    if args.json_out:
+        save_results(link_stats, args.json_out)
@@ -0,0 +1,148 @@
+#
+# Mergeable sketches of delay distributions.
+#
+# A DelaySketch is a log-linear histogram in the style of
+# HdrHistogram. Values (integer ms) below 2^SUB_BITS get a
+# bucket each; above that, every power of two is split into
+# 2^(SUB_BITS - 1) buckets, so a value is known to within
+# 1/2^(SUB_BITS - 1) of itself (under 2% by default). The
+# number of buckets is fixed, so a sketch takes constant
+# space however many packets it has seen, and two sketches
+# merge by adding their counts.
+#
+
+import numpy as np
+
+SUB_BITS = 7
+MAX_BITS = 40
+
+def bucket_of(values, sub_bits=SUB_BITS):
+    """Returns the bucket index of each of the integer VALUES."""
+    values = np.asarray(values, dtype=np.int64)
+    if len(values) and values.min() < 0:
+        raise ValueError("Delays must be non-negative")
+    exact = 1 << sub_bits
+    half = exact >> 1
+
+    index = values.copy()
+    big = values >= exact
+    if np.any(big):
+        v = values[big]
+        exponent = np.floor(np.log2(v)).astype(np.int64)
+        # Guard against rounding in log2 near powers of two.
+        exponent -= (v >> exponent) == 0
+        exponent += (v >> exponent) >= 2
+        shift = exponent - (sub_bits - 1)
+        index[big] = exact + (exponent - sub_bits) * half + ((v >> shift) - half)
+    return index
+
+def lower_bound(index, sub_bits=SUB_BITS):
+    """Returns the smallest value that falls in bucket INDEX."""
+    index = np.asarray(index, dtype=np.int64)
+    exact = 1 << sub_bits
+    half = exact >> 1
+    exponent = sub_bits + np.maximum(index - exact, 0) // half
+    mantissa = half + np.maximum(index - exact, 0) % half
+    return np.where(index < exact, index, mantissa << (exponent - (sub_bits - 1)))
+
+class DelaySketch:
+
+    def __init__(self, sub_bits=SUB_BITS):
+        """Empty sketch of a distribution of integer delays (ms)."""
+        self.sub_bits = sub_bits
+        size = (1 << sub_bits) + (MAX_BITS - sub_bits) * (1 << (sub_bits - 1))
+        self.counts = np.zeros(size, dtype=np.int64)
+
+    def add(self, values, counts=None):
+        """Adds VALUES to the sketch, each COUNTS times (default once)."""
+        index = bucket_of(values, self.sub_bits)
+        if counts is None:
+            counts = np.ones(len(index), dtype=np.int64)
+        np.add.at(self.counts, index, np.asarray(counts, dtype=np.int64))
+
+    def merge(self, other):
+        """Adds the counts of the sketch OTHER to this one."""
+        if other.sub_bits != self.sub_bits:
+            raise ValueError("Cannot merge sketches of different precision")
+        self.counts += other.counts
+        return self
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def quantile(self, q):
+        """Returns the Q-quantile (0 <= Q <= 1) of the delays.
+
+        Like mm-throughput-graph, this is the value of the
+        int(Q * count)-th smallest delay, counting from 0.
+        """
+        if not self.count:
+            raise ValueError("Empty sketch")
+        cumulative = np.cumsum(self.counts)
+        k = min(int(q * cumulative[-1]), cumulative[-1] - 1)
+        return float(lower_bound(np.searchsorted(cumulative, k, side='right'),
+                self.sub_bits))
+
+    def percentile(self, p):
+        """Returns the P-th percentile (0 <= P <= 100) of the delays."""
+        return self.quantile(p / 100.0)
+
+    def cdf(self, x):
+        """Returns the fraction of delays that are at most X.
+
+        Delays below 2^SUB_BITS are counted exactly. In the wider
+        bucket holding X, the delays are taken to be spread
+        evenly, and only the share of them up to X is counted.
+        """
+        if not self.count:
+            raise ValueError("Empty sketch")
+        if x < 0:
+            return 0.0
+        x = int(x)
+        index = int(bucket_of([x], self.sub_bits)[0])
+        if index >= len(self.counts):
+            return 1.0
+        low, high = lower_bound([index, index + 1], self.sub_bits)
+        below = self.counts[:index].sum()
+        share = self.counts[index] * (x - low + 1) / float(high - low)
+        return (below + share) / float(self.count)
+
+    def mean(self):
+        """Returns the mean delay, taking each bucket's lower bound."""
+        buckets = np.flatnonzero(self.counts)
+        values = lower_bound(buckets, self.sub_bits)
+        return float((values * self.counts[buckets]).sum()) / self.count
+
+    def tail(self, threshold):
+        """Returns the fraction of delays above THRESHOLD, within
+        buckets as cdf() counts them.
+        """
+        return 1.0 - self.cdf(threshold)
+
+    def to_dict(self):
+        """Returns the sketch as a JSON-serializable dict."""
+        buckets = np.flatnonzero(self.counts)
+        return {'sub_bits': self.sub_bits,
+                'buckets': buckets.tolist(),
+                'counts': self.counts[buckets].tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        """Returns the sketch saved by to_dict() as D."""
+        sketch = cls(d['sub_bits'])
+        sketch.counts[np.asarray(d['buckets'], dtype=np.int64)] = d['counts']
+        return sketch
+
+def merge_all(sketches):
+    """Returns a new sketch merging SKETCHES (dicts or DelaySketches)."""
+    merged = None
+    for s in sketches:
+        if s is None:
+            continue
+        if isinstance(s, dict):
+            s = DelaySketch.from_dict(s)
+        if merged is None:
+            merged = DelaySketch(s.sub_bits)
+        merged.merge(s)
+    return merged
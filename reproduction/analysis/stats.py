@@ -0,0 +1,31 @@
+#
+# Per-run experiment statistics, as reported by
+# experiment.py and consumed by the plotting scripts.
+#
+
+from collections import namedtuple
+
+Stats = namedtuple(
+        'Stats',
+        ['util', 'delay', 'throughput', 'power', \
+         'queuing_delay', 'per_packet_delay', 'uplink_trace', 'downlink_trace']
+)
+
+def experiment_stats(link_stats, rtt, uplink_trace, downlink_trace):
+    """Returns the Stats of a run from its LinkStats.
+
+    Args:
+        link_stats: (LinkStats) results of the run's mm-link log.
+        rtt: (int) base round trip time (ms), twice the mm-delay.
+        uplink_trace: (str) name of the uplink trace.
+        downlink_trace: (str) name of the downlink trace.
+    """
+    utilization = link_stats.avg_throughput / link_stats.avg_capacity
+    per_packet_delay = rtt + link_stats.queuing_delay
+    power_score = 1000 * link_stats.avg_throughput / float(link_stats.signal_delay)
+
+    return Stats(
+            utilization, link_stats.signal_delay, link_stats.avg_throughput,
+            power_score, link_stats.queuing_delay, per_packet_delay,
+            uplink_trace, downlink_trace
+    )
@@ -0,0 +1,84 @@
+#
+# Steady-state detection for runs of adaptive length.
+#
+# A run's statistics usually stop changing long before its
+# trace ends. SteadyState watches a LogAnalyzer that keeps
+# per-bin statistics while the log is read: after each bin,
+# it computes the utilization and 95th percentile queueing
+# delay over the trailing window. Once these rolling values
+# have stayed within a tolerance of their mean for a whole
+# window, the run is steady and can end. Everything before
+# the first window they were computed over is the startup
+# transient, cut off from the results.
+#
+
+from analysis.mm_log import LogAnalyzer
+
+BIN_MS = 1000
+
+# (ms) rolling delays this close to their mean are within
+# tolerance, however small the tolerance.
+DELAY_FLOOR_MS = 1.0
+
+class SteadyState:
+
+    def __init__(self, window=10.0, tolerance=0.05, max_duration=None, bin_ms=BIN_MS):
+        """Watches for a steady state: rolling statistics over
+        WINDOW seconds that stay within TOLERANCE (a fraction of
+        their mean) for another WINDOW seconds. The run ends at
+        MAX_DURATION seconds in any case.
+        """
+        self.window_bins = max(1, int(round(window * 1000.0 / bin_ms)))
+        self.tolerance = tolerance
+        self.max_duration = max_duration
+        self.bin_ms = bin_ms
+
+        # Rolling (utilization, delay) of each window, by last bin.
+        self.rolling = []
+        self.first_bin = None
+        # (ms) start of the steady part of the run, once found.
+        self.cutoff = None
+        self.steady = False
+        self.done = False
+
+    def analyzer(self):
+        """Returns a LogAnalyzer keeping the bins this watches."""
+        return LogAnalyzer(bin_ms=self.bin_ms)
+
+    def _within_tolerance(self, values, floor=0.0):
+        if any(v is None for v in values):
+            return False
+        mean = sum(values) / float(len(values))
+        return all(abs(v - mean) <= max(self.tolerance * abs(mean), floor) for v in values)
+
+    def update(self, analyzer):
+        """Looks at the bins ANALYZER completed since the last call.
+
+        Returns:
+            True once the run can end: it is steady, or it
+            reached the maximum duration.
+        """
+        if self.done or analyzer.first_timestamp is None:
+            return self.done
+        if self.first_bin is None:
+            self.first_bin = analyzer.first_timestamp // self.bin_ms
+
+        w = self.window_bins
+        while self.first_bin + len(self.rolling) + w <= analyzer.complete_bins():
+            last = self.first_bin + len(self.rolling) + w - 1
+            self.rolling.append(analyzer.window(last - w + 1, last))
+            recent = self.rolling[-w:]
+            if len(recent) < w:
+                continue
+            if (self._within_tolerance([u for u, _ in recent])
+                    and self._within_tolerance([d for _, d in recent], DELAY_FLOOR_MS)):
+                # The first of these windows starts at the cutoff.
+                self.cutoff = (last - 2 * w + 2) * self.bin_ms
+                self.steady = True
+                self.done = True
+                return True
+
+        if self.max_duration is not None:
+            elapsed = analyzer.last_timestamp - analyzer.first_timestamp
+            self.done = elapsed >= self.max_duration * 1000.0
+        return self.done
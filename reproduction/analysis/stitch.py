@@ -0,0 +1,41 @@
+#
+# Stitches the results of trace segments run in parallel.
+#
+# Each segment's results leave out its warm-up (see
+# tracelib/segments.py), so the segments cover the trace
+# once, back to back. Rates are averaged weighted by the
+# time each segment was measured for, and the delay
+# percentiles come from the segments' merged sketches of
+# per-packet queueing delays and per-ms signal delays.
+#
+
+from analysis.mm_log import LinkStats
+from analysis.sketch import merge_all
+
+def stitch_results(parts):
+    """Returns the LinkStats of a whole trace from the LinkStats
+    PARTS of its segments.
+    """
+    if not parts:
+        raise ValueError("No segment results to stitch")
+    for p in parts:
+        if p.delay_sketch is None or p.signal_sketch is None:
+            raise ValueError("Segment results need delay sketches")
+
+    duration = sum(p.duration for p in parts)
+    def rate(field):
+        return sum(getattr(p, field) * p.duration for p in parts) / duration
+
+    delays = merge_all(p.delay_sketch for p in parts)
+    signal = merge_all(p.signal_sketch for p in parts)
+    return LinkStats(
+            duration=duration,
+            avg_capacity=rate('avg_capacity'),
+            avg_ingress=rate('avg_ingress'),
+            avg_throughput=rate('avg_throughput'),
+            queuing_delay=delays.percentile(95),
+            signal_delay=signal.percentile(95),
+            departures=sum(p.departures for p in parts),
+            delay_sketch=delays.to_dict(),
+            signal_sketch=signal.to_dict()
+    )
@@ -0,0 +1,4 @@
+#
+# Benchmarks of the hot paths of our reproduction
+# toolchain, on synthetic fixtures.
+#
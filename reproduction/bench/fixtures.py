@@ -0,0 +1,169 @@
+#
+# Synthetic inputs for the benchmarks.
+#
+# Fixtures are derived from a trace bundled with mahimahi,
+# at a scale factor: a 1x trace is the bundled trace, a 10x
+# trace is it repeated ten times back to back, and so on.
+# The mm-link log of a scale is a run over its trace in
+# which a fixed fraction of the opportunities deliver a
+# packet after a random queueing delay, and the results
+# tree is what --num-runs leaves under results/. Fixtures
+# are generated on first use and kept under FIXTURE_DIR.
+#
+
+import gzip
+import os
+import shutil
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from analysis.mm_log import LinkStats, save_results, ARRIVAL, DEPARTURE, OPPORTUNITY
+from analysis.sketch import DelaySketch
+from tracelib.binary import (read_text_trace, write_text_trace, write_binary_trace,
+        OPPORTUNITY_BYTES)
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+TRACE_DIR = os.path.join(REPO_DIR, 'mahimahi', 'traces')
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+BASE_TRACE = 'Verizon-LTE-short.up'
+SCALES = [1, 10, 100]
+
+# Fraction of opportunities that deliver a packet, and the
+# mean queueing delay (ms) of a packet, in synthetic logs.
+LOAD = 0.8
+MEAN_DELAY = 40
+
+# Fraction of arrivals that are dropped.
+DROP_RATE = 0.01
+
+# Results tree: every scheme is run RUNS_PER_SCALE times
+# for each unit of scale.
+SCHEMES = ['abc', 'cubic', 'cubiccodel', 'cubicpie', 'bbr', 'vegas', 'sprout', 'verus']
+RUNS_PER_SCALE = 10
+EXPERIMENT = 'figure2a'
+
+# Events written per chunk of a synthetic log.
+CHUNK_EVENTS = 1 << 20
+
+_CODE_CHARS = {ARRIVAL: '+', DEPARTURE: '-', OPPORTUNITY: '#'}
+
+def scaled_timestamps(scale, trace=BASE_TRACE):
+    """Returns the timestamps of TRACE repeated SCALE times."""
+    timestamps = read_text_trace(os.path.join(TRACE_DIR, trace))
+    period = timestamps[-1]
+    return np.concatenate([timestamps + k * period for k in range(scale)])
+
+def synthetic_events(timestamps, seed=0):
+    """Returns the (timestamps, codes, num_bytes, delays) of a run
+    over the opportunities at TIMESTAMPS, in time order.
+    """
+    rs = np.random.RandomState(seed)
+    used = timestamps[rs.random_sample(len(timestamps)) < LOAD]
+    delays = rs.exponential(MEAN_DELAY, len(used)).astype(np.int64)
+    delays = np.minimum(delays, used)
+    arrivals = used - delays
+    dropped = rs.choice(arrivals, int(DROP_RATE * len(arrivals)))
+
+    times = np.concatenate([timestamps, arrivals, dropped, used])
+    codes = np.concatenate([
+            np.full(len(timestamps), OPPORTUNITY, dtype=np.int64),
+            np.full(len(arrivals) + len(dropped), ARRIVAL, dtype=np.int64),
+            np.full(len(used), DEPARTURE, dtype=np.int64)])
+    all_delays = np.concatenate([
+            np.zeros(len(timestamps) + len(arrivals) + len(dropped), dtype=np.int64),
+            delays])
+    order = np.argsort(times, kind='mergesort')
+    num_bytes = np.full(len(times), OPPORTUNITY_BYTES, dtype=np.int64)
+    return times[order], codes[order], num_bytes, all_delays[order]
+
+def write_log(path, timestamps, seed=0):
+    """Writes a synthetic mm-link log of a run over the
+    opportunities at TIMESTAMPS to PATH.
+    """
+    times, codes, num_bytes, delays = synthetic_events(timestamps, seed)
+    with open(path, 'w') as f:
+        f.write('# mahimahi mm-link (synthetic benchmark log)\n')
+        f.write('# init timestamp: 0\n')
+        f.write('# base timestamp: 0\n')
+        for start in range(0, len(times), CHUNK_EVENTS):
+            end = start + CHUNK_EVENTS
+            lines = []
+            for t, c, b, d in zip(times[start:end].tolist(), codes[start:end].tolist(),
+                    num_bytes[start:end].tolist(), delays[start:end].tolist()):
+                if c == DEPARTURE:
+                    lines.append('%d - %d %d\n' % (t, b, d))
+                else:
+                    lines.append('%d %s %d\n' % (t, _CODE_CHARS[c], b))
+            f.write(''.join(lines))
+
+def write_results_tree(root, scale, seed=0):
+    """Writes the results of RUNS_PER_SCALE * SCALE runs of every
+    scheme under ROOT, laid out like --num-runs leaves them.
+    """
+    rs = np.random.RandomState(seed)
+    name = 'UPLINK_%s-DOWNLINK_%s.json' % (BASE_TRACE, BASE_TRACE.replace('.up', '.down'))
+    for scheme in SCHEMES:
+        for i in range(1, RUNS_PER_SCALE * scale + 1):
+            directory = os.path.join(root, 'results', EXPERIMENT, scheme, 'multiple', str(i))
+            if not os.path.exists(directory): os.makedirs(directory)
+            sketch = DelaySketch()
+            sketch.add(rs.exponential(MEAN_DELAY, 1000).astype(np.int64))
+            capacity = 6.0
+            throughput = capacity * rs.uniform(0.3, 1.0)
+            save_results(LinkStats(
+                    duration=140.0, avg_capacity=capacity, avg_ingress=throughput,
+                    avg_throughput=throughput, queuing_delay=sketch.percentile(95),
+                    signal_delay=sketch.percentile(95) + 20, departures=1000,
+                    delay_sketch=sketch.to_dict()), os.path.join(directory, name))
+
+class Fixtures:
+
+    def __init__(self, directory=FIXTURE_DIR):
+        """Fixtures kept under DIRECTORY."""
+        self.directory = directory
+        if not os.path.exists(directory): os.makedirs(directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _make(self, name, write):
+        # Generate under a temporary name, so an interrupted run
+        # does not leave a partial fixture behind.
+        path = self.path(name)
+        if not os.path.exists(path):
+            tmp = path + '.tmp'
+            write(tmp)
+            os.rename(tmp, path)
+        return path
+
+    def trace(self, scale):
+        """Returns the path of the text trace at SCALE."""
+        return self._make('trace-%dx.mahi' % scale,
+                lambda p: write_text_trace(scaled_timestamps(scale), p))
+
+    def binary_trace(self, scale):
+        """Returns the path of the binary trace at SCALE."""
+        return self._make('trace-%dx.mmtrace' % scale,
+                lambda p: write_binary_trace(read_text_trace(self.trace(scale)), p))
+
+    def log(self, scale):
+        """Returns the path of the mm-link log at SCALE."""
+        return self._make('mm-link-%dx.log' % scale,
+                lambda p: write_log(p, read_text_trace(self.trace(scale)), seed=scale))
+
+    def gzip_log(self, scale):
+        """Returns the path of the mm-link log at SCALE, gzipped."""
+        def write(p):
+            with open(self.log(scale), 'rb') as src:
+                with gzip.open(p, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+        return self._make('mm-link-%dx.log.gz' % scale, write)
+
+    def results_tree(self, scale):
+        """Returns the directory holding the results tree at SCALE."""
+        def write(tmp):
+            os.makedirs(tmp)
+            write_results_tree(tmp, scale, seed=scale)
+        return self._make('results-%dx' % scale, write)
@@ -0,0 +1,234 @@
+#!/usr/bin/python
+
+#
+# Runs the benchmarks and compares them to a baseline.
+#
+# Each benchmark times one hot path of the toolchain on the
+# fixtures of a scale, taking the best of several repeats,
+# and (under Python 3) measures its peak memory with
+# tracemalloc in a separate, untimed call. The report is
+# JSON; passing an earlier report as --baseline fails the
+# run if a benchmark got slower or bigger by more than the
+# tolerance. Nothing here needs root or mahimahi.
+#
+
+from collections import OrderedDict
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'plotting'))
+from bench.fixtures import Fixtures, SCALES, SCHEMES, RUNS_PER_SCALE, EXPERIMENT
+from analysis.mm_log import analyze_log
+from tracelib.binary import BinaryTrace, read_text_trace, load_timestamps
+from tracelib.generate import constant_profile, write_trace
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+REPORT_VERSION = 1
+
+# Differences below these are noise, not regressions.
+MIN_SECONDS = 0.005
+MIN_PEAK_KB = 1024
+
+class Skip(Exception):
+    """Raised by a benchmark that cannot run here."""
+
+def bench_parse_text_trace(fixtures, scale):
+    path = fixtures.trace(scale)
+    return lambda: read_text_trace(path)
+
+def bench_parse_binary_trace(fixtures, scale):
+    path = fixtures.binary_trace(scale)
+    return lambda: BinaryTrace(path).timestamps()
+
+def bench_analyze_log(fixtures, scale):
+    path = fixtures.log(scale)
+    return lambda: analyze_log(path)
+
+def bench_analyze_gzip_log(fixtures, scale):
+    path = fixtures.gzip_log(scale)
+    return lambda: analyze_log(path)
+
+def bench_make_bw_file(fixtures, scale):
+    # What experiment.make_bw_file does, into the fixture directory.
+    ref_trace = fixtures.trace(scale)
+    bw_trace = fixtures.path('bw48-%dx.mahi' % scale)
+    def run():
+        if os.path.exists(bw_trace):
+            os.remove(bw_trace)
+        length = int(load_timestamps(ref_trace)[-1])
+        write_trace(constant_profile(length, 48), bw_trace)
+    return run
+
+def bench_gather_results(fixtures, scale):
+    from gather_multiple_results import gather_results
+    root = fixtures.results_tree(scale)
+    def run():
+        cwd = os.getcwd()
+        stdout = sys.stdout
+        os.chdir(root)
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            gather_results(SCHEMES, RUNS_PER_SCALE * scale, EXPERIMENT)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+            os.chdir(cwd)
+    return run
+
+def bench_plot_cloud(fixtures, scale):
+    try:
+        import figure2_plot
+        import matplotlib.pyplot as plt
+    except ImportError as e:
+        raise Skip(str(e))
+    import numpy as np
+    rs = np.random.RandomState(scale)
+    stats = dict((proto, [figure2_plot.Stats(u, d) for u, d in zip(
+            rs.uniform(0.3, 1.0, RUNS_PER_SCALE * scale),
+            rs.uniform(100, 600, RUNS_PER_SCALE * scale))]) for proto in SCHEMES)
+    def run():
+        fig = plt.figure()
+        figure2_plot.plot_cloud(fig.add_subplot(111), stats)
+        plt.close(fig)
+    return run
+
+BENCHMARKS = OrderedDict([
+    ('parse_text_trace', bench_parse_text_trace),
+    ('parse_binary_trace', bench_parse_binary_trace),
+    ('analyze_log', bench_analyze_log),
+    ('analyze_gzip_log', bench_analyze_gzip_log),
+    ('make_bw_file', bench_make_bw_file),
+    ('gather_results', bench_gather_results),
+    ('plot_cloud', bench_plot_cloud),
+])
+
+def time_call(fn, repeats):
+    """Returns the wall-clock seconds of REPEATS calls of FN."""
+    times = []
+    for _ in range(repeats):
+        start = time.time()
+        fn()
+        times.append(time.time() - start)
+    return times
+
+def peak_memory(fn):
+    """Returns the peak memory (KB) allocated during a call of
+    FN, or None without tracemalloc.
+    """
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024.0
+    finally:
+        tracemalloc.stop()
+
+def run_benchmarks(names, scales, repeats, fixtures, verbose=True):
+    """Runs the benchmarks NAMES at each of SCALES.
+
+    Returns:
+        the report, as a dict.
+    """
+    results = OrderedDict()
+    for name in names:
+        for scale in scales:
+            key = '%s@%dx' % (name, scale)
+            result = {'benchmark': name, 'scale': scale}
+            try:
+                fn = BENCHMARKS[name](fixtures, scale)
+            except Skip as e:
+                result['skipped'] = str(e)
+                results[key] = result
+                if verbose:
+                    print("%-28s skipped: %s" % (key, e))
+                continue
+            times = time_call(fn, repeats)
+            result.update(seconds=min(times), times=times, peak_kb=peak_memory(fn))
+            results[key] = result
+            if verbose:
+                print("%-28s %9.4f s  %s" % (key, result['seconds'],
+                        '%.0f KB peak' % result['peak_kb']
+                        if result['peak_kb'] is not None else ''))
+
+    return OrderedDict([
+        ('version', REPORT_VERSION),
+        ('created', time.time()),
+        ('host', platform.node()),
+        ('python', platform.python_version()),
+        ('repeats', repeats),
+        ('results', results),
+    ])
+
+def compare(report, baseline, tolerance):
+    """Compares REPORT to the BASELINE report.
+
+    Returns:
+        list of descriptions of the regressions: results more
+        than TOLERANCE (a fraction) slower or bigger.
+    """
+    regressions = []
+    for key, result in report['results'].items():
+        base = baseline['results'].get(key)
+        if not base or 'skipped' in result or 'skipped' in base:
+            continue
+        if (result['seconds'] > base['seconds'] * (1 + tolerance)
+                and result['seconds'] - base['seconds'] > MIN_SECONDS):
+            regressions.append("%s: %.4f s, baseline %.4f s (+%.0f%%)" % (
+                    key, result['seconds'], base['seconds'],
+                    100 * (result['seconds'] / base['seconds'] - 1)))
+        if result.get('peak_kb') is None or base.get('peak_kb') is None:
+            continue
+        if (result['peak_kb'] > base['peak_kb'] * (1 + tolerance)
+                and result['peak_kb'] - base['peak_kb'] > MIN_PEAK_KB):
+            regressions.append("%s: %.0f KB peak, baseline %.0f KB (+%.0f%%)" % (
+                    key, result['peak_kb'], base['peak_kb'],
+                    100 * (result['peak_kb'] / base['peak_kb'] - 1)))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--only', default=list(BENCHMARKS), nargs='+',
+        choices=list(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('--scales', default=SCALES, nargs='+', type=int,
+        help='scale factors of the fixtures')
+    parser.add_argument('--repeats', default=3, type=int,
+        help='times to run each benchmark, keeping the fastest')
+    parser.add_argument('--fixture-dir', default=None, type=str,
+        help='where to keep the generated fixtures')
+    parser.add_argument('--out', default=None, type=str,
+        help='save the report as JSON to this file')
+    parser.add_argument('--baseline', default=None, type=str,
+        help='report to compare against; exits 1 on a regression')
+    parser.add_argument('--tolerance', default=0.25, type=float,
+        help='fraction by which a result may exceed the baseline')
+    args = parser.parse_args()
+
+    fixtures = Fixtures(args.fixture_dir) if args.fixture_dir else Fixtures()
+    report = run_benchmarks(args.only, args.scales, args.repeats, fixtures)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against %s:" % args.baseline)
+            for r in regressions:
+                print("  %s" % r)
+            sys.exit(1)
+        print("\nNo regressions against %s" % args.baseline)
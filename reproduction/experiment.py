@@ -5,154 +5,225 @@
 # ABC HotNets 2017 paper.
 #
 
-from subprocess import Popen
-from collections import namedtuple
 from protocols.cc_protocol import CCProtocol
 from protocols.utils import get_protocol
-
+from analysis.logfiles import COMPRESSORS
+from analysis.mm_log import load_results, save_results
+from analysis.stats import experiment_stats
+from analysis.stitch import stitch_results
+from runner.commands import run_cmds, format_phase_times
+from runner.monitor import ProcessMonitor
+from runner.adaptive import AdaptiveRuns
+from runner.scheduler import Cell, run_cells, print_timings, port_offset
+from runner.placement import load_profile, resolve_placement, max_jobs
+from runner.timeline import Timeline
+from runner.spec import load_spec, expand_spec
+from runner.taskgraph import TaskGraph, run_graph
+from storage.cache import ResultCache, cell_inputs, cell_key
+from storage.results_db import ResultsDB, new_run_id
+from storage.retention import prune_logs
+from tracelib.binary import load_timestamps
+from tracelib.generate import constant_profile, write_trace
+from tracelib.index import load_index
+from tracelib.segments import segment_name, split_trace
+
+import json
 import os
 import argparse
-import time
 import sys
-import shlex
 
 TRACE_DIR = '~/ABC-1/mahimahi/traces/'
 BW_TRACE_DIR = '~/ABC-1/reproduction/traces/'
+SEGMENT_DIR = os.path.join(BW_TRACE_DIR, 'segments')
 
 STATIC_BW_FIXED = 'bw48-fixed.mahi'
 STATIC_BW_VARIABLE = 'bw48-variable.mahi'
 
+# Host overhead samples are saved next to the run's log.
+MONITOR_SUFFIX = '.monitor.json'
+
 # Becomes populated with experiment results for figure 2.
-Stats = namedtuple(
-        'Stats',
-        ['util', 'delay', 'throughput', 'power', \
-         'queuing_delay', 'per_packet_delay', 'uplink_trace', 'downlink_trace']
-)
 stats = []
 
-def retrieve_and_print_stats(cc_proto, rtt, uplink_trace, downlink_trace):
+# Results database every run is recorded in, if any.
+results_db = None
+run_id = new_run_id()
+
+# Timeline the sweep is profiled on, with --profile.
+timeline = None
+
+def record_run(cc_proto, s, link_stats, experiment, rtt, iteration):
+    """Appends the Stats S of a run of CC_PROTO to results_db."""
+    if results_db is None:
+        return
+    monitor = getattr(cc_proto, 'monitor', None)
+    results_db.append(
+            run_id=run_id, experiment=experiment, scheme=cc_proto.config['name'],
+            uplink_trace=s.uplink_trace, downlink_trace=s.downlink_trace,
+            mm_delay=rtt // 2, queue=cc_proto.config.get('uplink_queue'),
+            queue_args=cc_proto.config.get('uplink_queue_args'), iteration=iteration,
+            util=s.util, delay=s.delay, throughput=s.throughput, power=s.power,
+            queuing_delay=s.queuing_delay, per_packet_delay=s.per_packet_delay,
+            capacity=link_stats.avg_capacity, results_file=cc_proto.results_file_path,
+            placement=json.dumps(cc_proto.placement, sort_keys=True)
+                    if cc_proto.placement else None,
+            suspect=int(bool(monitor['suspect'])) if monitor else None,
+            monitor=json.dumps(monitor, sort_keys=True) if monitor else None,
+            delay_sketch=json.dumps(link_stats.delay_sketch)
+                    if link_stats.delay_sketch else None,
+            cutoff=link_stats.cutoff,
+            steady=int(link_stats.steady) if link_stats.steady is not None else None)
+
+def retrieve_and_print_stats(cc_proto, rtt, uplink_trace, downlink_trace,
+        experiment=None, iteration=1):
     """ Prints results for a figure 1, 2 - type experiment.
 
     Additionally, saves statistics to the "stats" global
-    variable.
+    variable, and records them in the results database.
+
+    Returns:
+        the run's Stats, or None if it has no results.
     """
     proto_name = cc_proto.config['name']
     if os.path.isfile(cc_proto.results_file_path):
-        with open(cc_proto.results_file_path) as f:
-            lines = f.readlines()
-            avg_capacity = float(lines[0].split(' ')[2])
-            avg_throughput = float(lines[1].split(' ')[2])
-            queuing_delay = float(lines[2].split(' ')[5])
-            signal_delay = float(lines[3].split(' ')[4])
-
-            utilization = avg_throughput / avg_capacity
-
-            per_packet_delay = rtt + queuing_delay
-            power_score = 1000 * avg_throughput / float(signal_delay)
-
-            stats_bundle = {}
-
-            stats_bundle[proto_name] = Stats(
-                    utilization, signal_delay, avg_throughput,
-                    power_score, queuing_delay, per_packet_delay,
-                    uplink_trace, downlink_trace
-            )
-
-            stats.append(stats_bundle)
-
-            print("\n  ~~ Results for protocol: %s ~~" % proto_name)
-            print("\tutilization: %s%%" % str(round(100 * utilization, 2)))
-            print("\tthroughput: %s Mbps" % str(avg_throughput))
-            print("\tsignal delay: %s ms" % str(signal_delay))
-            print("\tqueuing delay: %s ms" % str(queuing_delay))
-            print("\tpower score: %s" % str(power_score))
-            print("\tavg capacity: %s Mbps" % str(avg_capacity))
-            print("\tper-packet delay: %s ms\n" % str(per_packet_delay))
+        link_stats = load_results(cc_proto.results_file_path)
+        s = experiment_stats(link_stats, rtt, uplink_trace, downlink_trace)
+
+        stats.append({proto_name: s})
+        record_run(cc_proto, s, link_stats, experiment, rtt, iteration)
+
+        print("\n  ~~ Results for protocol: %s ~~" % proto_name)
+        print("\tutilization: %s%%" % str(round(100 * s.util, 2)))
+        print("\tthroughput: %s Mbps" % str(s.throughput))
+        print("\tsignal delay: %s ms" % str(s.delay))
+        print("\tqueuing delay: %s ms" % str(s.queuing_delay))
+        print("\tpower score: %s" % str(s.power))
+        print("\tavg capacity: %s Mbps" % str(link_stats.avg_capacity))
+        if link_stats.steady is not None:
+            if link_stats.steady:
+                print("\tsteady after: %s s (left out), for %s s"
+                        % (link_stats.cutoff, link_stats.duration))
+            else:
+                print("\tnever steady, ran %s s" % link_stats.duration)
+        if getattr(cc_proto, 'monitor', None) and cc_proto.monitor['suspect']:
+            print("\tSUSPECT: %s saturated its CPU" % ' and '.join(cc_proto.monitor['suspect']))
+        if cc_proto.placement:
+            print("\tplacement: %s" % json.dumps(cc_proto.placement, sort_keys=True))
+        print("\tper-packet delay: %s ms\n" % str(s.per_packet_delay))
+        return s
 
     else:
         print("No results found for proto %s at path: %s\n"
                 % (proto_name, cc_proto.results_file_path))
+        return None
 
-def run_cmds(cmds, verbose=False):
-    """Runs the commands in CMDS.
+def make_bw_file(ref_trace, bw_trace, bw):
+    """Generates bw*.mahi file at bw_trace to match
+    the exact length of ref_trace, with bw Mbps bandwidth.
+    An existing file that already matches is kept.
+    """
+    length = int(load_timestamps(ref_trace)[-1])
+    write_trace(constant_profile(length, bw), bw_trace)
 
-    Runs "prep" commands in the background, and
-    all other commands sequentially.  Cleans up
-    lingering processes returned by Popen call.
+def bw_trace_path(uplink_trace):
+    """Returns the path of the fixed-bandwidth downlink trace
+    matching the length of UPLINK_TRACE.
 
-    Args:
-        cmds: (OrderedDict) Maps descriptions of commands to
-              lists of command strings to run.
+    Every uplink trace gets its own file, so that cells for
+    different traces can run at the same time.
     """
-    processes = []
-    home = os.path.expanduser('~')
-    devnull = open(os.devnull, 'w')
-    try:
-        for c_type in cmds:
-            for c in cmds[c_type]:
-                if not c: continue
-
-                # Need full pathname for home
-                c = c.replace('~', home)
-
-                if verbose:
-                    print("$ %s" % ' '.join(c.split(' ')))
-
-                # Ugly hack, I'm sorry. Don't know how else
-                # to respect a sleep between commands.
-                if c.startswith('sleep '):
-                    time.sleep(int(c.split(' ')[-1]))
-                    continue
-
-                if c_type == "prep":
-                    proc = Popen(
-                            shlex.split(c), stdout=devnull, stderr=devnull
-                            )
-                else:
-                    proc = Popen(
-                            c, shell=True, stdout=devnull,
-                            stderr=devnull
-                            )
+    return os.path.join(BW_TRACE_DIR, '%s.%s' % (
+            os.path.basename(uplink_trace), STATIC_BW_VARIABLE))
 
-                processes.append(proc)
-
-                # We run all 'prep' commands in the background,
-                # and wait for everything else to finish.
-                if c_type != 'prep':
-                    proc.wait()
+def placement_for(args, slot):
+    """Returns the placement of the cell running in worker SLOT,
+    or None if no placement profile was given.
+    """
+    if not args.placement_profile:
+        return None
+    return resolve_placement(args.placement_profile, slot)
+
+def run_protocol_cmds(name, protocol, cmds, args, isolated):
+    """Runs the commands CMDS of cell NAME, monitoring the host
+    overhead of its processes if args.monitor is set, and
+    profiling them if args.profile is.
+    """
+    monitor = None
+    if args.monitor:
+        monitor = ProcessMonitor(args.monitor_interval, args.monitor_threshold)
+
+    phase_times = run_cmds(cmds, args.verbose, isolated, monitor, protocol.stop_condition,
+            timeline)
+    print(" %s phase times: %s" % (name, format_phase_times(phase_times)))
+
+    if monitor:
+        monitor.save(protocol.uplink_log_file_path + MONITOR_SUFFIX)
+        protocol.monitor = monitor.summary()
+        if protocol.monitor['suspect']:
+            print(" %s is suspect: %s saturated its CPU" % (
+                    name, ' and '.join(protocol.monitor['suspect'])))
+
+def use_iteration_paths(protocol, i):
+    """Points PROTOCOL's results and log files at the
+    directories for iteration I of a multi-run experiment.
+    """
+    results_path, results_file = os.path.split(protocol.results_file_path)
+    log_path, log_file = os.path.split(protocol.uplink_log_file_path)
 
-    except KeyboardInterrupt:
-        pass
+    curr_results_path = os.path.join(results_path, 'multiple', str(i))
+    curr_log_path = os.path.join(log_path, 'multiple', str(i))
 
-    devnull.close()
+    if not os.path.exists(curr_log_path): os.makedirs(curr_log_path)
+    if not os.path.exists(curr_results_path): os.makedirs(curr_results_path)
 
-    # Attempt to kill all lingering processes
-    for p in processes:
-        if p:
-            try:
-                p.kill()
-            except OSError:
-                pass
+    protocol.results_file_path = os.path.join(curr_results_path, results_file)
+    protocol.uplink_log_file_path = os.path.join(curr_log_path, log_file)
 
-def make_bw_file(ref_trace, bw_trace, bw):
-    """Generates bw*.mahi file at bw_trace to match
-    the exact length of ref_trace, with bw Mbps bandwidth.
+def run_options(args, protocol):
+    """Returns the options of ARGS and PROTOCOL that change how
+    long a run lasts or which part of it is analyzed, which the
+    cache must tell apart.
     """
-    if bw % 12 != 0:
-        raise ValueError("Can only create files of bandwidth multiples of 12")
-
-    length = 0
-    with open(os.path.expanduser(ref_trace), 'r') as f:
-        for line in f:
-            pass
-        length = int(line.strip())
-
-    with open(os.path.expanduser(bw_trace), 'w') as f:
-        for i in range(1, length+1):
-            for _ in range(bw / 12):
-                f.write("%d\n" % i)
+    options = {
+        'live_analysis': bool(args.live_analysis),
+        'steady_state': bool(args.steady_state),
+        'analysis_start': protocol.analysis_start,
+    }
+    if args.steady_state:
+        options['steady_window'] = args.steady_window
+        options['steady_tolerance'] = args.steady_tolerance
+        options['max_duration'] = args.max_duration
+    if args.segments:
+        options['segments'] = args.segments
+        options['segment_overlap'] = args.segment_overlap
+    return options
+
+def check_cache(cache, protocol, args, mm_delay, uplink_trace, downlink_trace,
+        experiment, iteration=1):
+    """Looks up a cell, run with the options ARGS, in the result
+    cache.
+
+    On a hit, the cached results are copied to PROTOCOL's
+    results file and None is returned. Otherwise, returns
+    the (key, inputs) to store the cell's results under
+    once it has run.
+    """
+    inputs = cell_inputs(protocol.config, mm_delay, uplink_trace,
+            downlink_trace, experiment, iteration, run_options(args, protocol))
+    key = cell_key(inputs)
+    if cache.restore(key, protocol.results_file_path):
+        print(" up to date in cache: %s" % protocol.results_file_path)
+        return None
+    return key, inputs
+
+def fig1_uplink_trace(trace, tiny=False):
+    """Returns the path of the figure 1 uplink trace TRACE."""
+    uplink_trace = os.path.join(TRACE_DIR, trace)
+    if tiny:
+        uplink_trace += "-tiny"
+    return uplink_trace
 
-def run_fig1_exp(schemes, traces, args, run_full):
+def run_fig1_exp(schemes, traces, args, run_full, cache=None):
     """ Runs experiments to reproduce
     results of figure 1 in original ABC HotNets 2017 paper.
     """
@@ -163,45 +234,209 @@ def run_fig1_exp(schemes, traces, args, run_full):
     delay = 50
     bw = 48
     downlink_ext = STATIC_BW_VARIABLE
-    downlink_trace = os.path.join(BW_TRACE_DIR, downlink_ext)
-
-    for scheme in schemes:
-        print(" ---- Running Figure 1 Experiment for protocol: %s ---\n" % scheme)
-
-        for trace in traces:
-
-            uplink_trace = os.path.join(TRACE_DIR, trace)
-            if args.tiny_trace:
-                uplink_trace += "-tiny"
-
-            print("   --> Running trace: %s\n" % uplink_trace)
-            protocol = get_protocol(scheme, trace, downlink_ext, figure="figure1")
+    isolated = args.jobs > 1
+
+    def uplink_trace_for(trace):
+        return fig1_uplink_trace(trace, args.tiny_trace)
+
+    # Downlink files are shared by every scheme running on
+    # a trace, so make them before any cell starts.
+    for trace in traces:
+        if any((s, trace) in run_full for s in schemes):
+            uplink_trace = uplink_trace_for(trace)
+            make_bw_file(uplink_trace, bw_trace_path(uplink_trace), bw)
+
+    # Cells whose results must be cached once they have run.
+    pending = {}
+
+    adaptive = None
+    if args.target_precision:
+        adaptive = AdaptiveRuns([(s, t) for s in schemes for t in traces
+                                 if (s, t) in run_full],
+                args.min_runs, args.max_runs, args.target_precision)
+
+    def protocol_for(scheme, trace, i, slot=0):
+        protocol = get_protocol(scheme, trace, downlink_ext, figure="figure1",
+                port_offset=port_offset(slot), placement=placement_for(args, slot),
+                log_compression=args.log_compression)
+        if adaptive:
+            use_iteration_paths(protocol, i)
+        return protocol
+
+    def make_cell(scheme, trace, i=1):
+        uplink_trace = uplink_trace_for(trace)
+        downlink_trace = bw_trace_path(uplink_trace)
+        name = '%s:%s' % (scheme, trace)
+        if adaptive:
+            name += ':%d' % i
+
+        run_cell = (scheme, trace) in run_full
+        if run_cell and cache:
+            pending[name] = check_cache(cache, protocol_for(scheme, trace, i), args, delay,
+                    uplink_trace, downlink_trace, "figure1", i)
+            run_cell = pending[name] is not None
+
+        def run(slot):
+            print("   --> Running Figure 1 cell: %s, %s\n" % (scheme, uplink_trace))
+            protocol = protocol_for(scheme, trace, i, slot)
             cmds = protocol.get_figure1_cmds(delay, uplink_trace, downlink_trace, args)
 
-            if (scheme, trace) in run_full:
-                make_bw_file(uplink_trace, downlink_trace, bw)
-                run_cmds(cmds, args.verbose)
+            if run_cell:
+                # Never report (or cache) results from an older run.
+                if os.path.isfile(protocol.results_file_path):
+                    os.remove(protocol.results_file_path)
+                run_protocol_cmds(name, protocol, cmds, args, isolated)
             else:
                 print(" experiment skipped: (%s, %s)" % (scheme, trace))
 
-            time.sleep(2)
-
-            uplink_trace_name = os.path.basename(uplink_trace)
-            downlink_trace_name = os.path.basename(downlink_trace)
+            return protocol
+
+        return Cell(name, run)
+
+    def on_done(cell, protocol):
+        if pending.get(cell.name):
+            key, inputs = pending[cell.name]
+            cache.store(key, inputs, protocol.results_file_path,
+                    protocol.uplink_log_file_path)
+
+        scheme, trace = cell.name.split(':')[:2]
+        i = int(cell.name.split(':')[2]) if adaptive else 1
+        uplink_trace_name = os.path.basename(uplink_trace_for(trace))
+        s = retrieve_and_print_stats(
+                protocol, 2 * delay, uplink_trace_name, downlink_ext, "figure1", i
+        )
+        if adaptive and (scheme, trace) in run_full:
+            adaptive.record((scheme, trace), s)
+
+    def on_error(cell, error):
+        # A failed run counts as a run without results.
+        scheme, trace = cell.name.split(':')[:2]
+        if (scheme, trace) in run_full:
+            adaptive.record((scheme, trace), None)
+
+    if not adaptive:
+        cells = [make_cell(s, t) for s in schemes for t in traces]
+        return run_cells(cells, args.jobs, on_done, timeline=timeline)
+
+    # Cells reusing results are only reported; the others are
+    # repeated until their results are precise enough.
+    cells = [make_cell(s, t) for s in schemes for t in traces
+             if (s, t) not in run_full]
+    more = lambda n: [make_cell(s, t, i) for (s, t), i in adaptive.next(n)]
+    timings = run_cells(cells, args.jobs, on_done, more, timeline, on_error)
+    adaptive.print_summary()
+    return timings
+
+
+def run_fig1_segmented(schemes, traces, args, run_full, cache=None):
+    """ Runs figure 1 with every uplink trace split into
+    args.segments segments (see tracelib/segments.py).
+
+    The segments of a cell run as cells of their own, in
+    parallel, each starting args.segment_overlap seconds early
+    to warm up. Once they are all done, their results, without
+    the warm-up, are stitched into the results of the cell.
+    """
+    delay = 50
+    bw = 48
+    k = args.segments
+    overlap = int(args.segment_overlap * 1000)
+    isolated = args.jobs > 1
+    graph = TaskGraph()
+
+    # Segments of each trace, once it is split.
+    segments = {}
+    # Cells (scheme, trace) by the name of the task reporting them.
+    reported = {}
+    # Segment cells whose results must be cached once they have run.
+    pending = {}
+
+    def split_stage(trace):
+        def run(slot):
+            segments[trace] = split_trace(fig1_uplink_trace(trace, args.tiny_trace),
+                    k, overlap, SEGMENT_DIR)
+            for seg in segments[trace]:
+                make_bw_file(seg.path, bw_trace_path(seg.path), bw)
+        return graph.stage('split:%s' % trace, run).name
+
+    def segment_protocol(scheme, trace, i, slot=0):
+        name = segment_name(fig1_uplink_trace(trace, args.tiny_trace), i, k)
+        protocol = get_protocol(scheme, name, '%s.%s' % (name, STATIC_BW_VARIABLE),
+                figure="figure1-segments", port_offset=port_offset(slot),
+                placement=placement_for(args, slot), log_compression=args.log_compression)
+        protocol.analysis_start = segments[trace][i].warmup or None
+        return protocol
+
+    def add_segment(scheme, trace, i, deps):
+        name = '%s:%s:seg%d' % (scheme, trace, i)
+
+        def run(slot):
+            print("   --> Running Figure 1 segment %d/%d: %s, %s\n" % (i + 1, k, scheme, trace))
+            seg = segments[trace][i]
+            downlink_trace = bw_trace_path(seg.path)
+            protocol = segment_protocol(scheme, trace, i, slot)
+            if cache:
+                pending[name] = check_cache(cache, protocol, args, delay, seg.path,
+                        downlink_trace, "figure1-segments")
+                if pending[name] is None:
+                    return protocol
+
+            # Never stitch (or cache) results from an older run.
+            if os.path.isfile(protocol.results_file_path):
+                os.remove(protocol.results_file_path)
+            cmds = protocol.get_figure1_cmds(delay, seg.path, downlink_trace, args)
+            run_protocol_cmds(name, protocol, cmds, args, isolated)
+            return protocol
+
+        return graph.add(name, run, deps).name
+
+    def add_cell(scheme, trace):
+        name = '%s:%s' % (scheme, trace)
+        reported[name] = (scheme, trace)
+        run_cell = (scheme, trace) in run_full
+
+        def run(slot):
+            protocol = get_protocol(scheme, trace, STATIC_BW_VARIABLE, figure="figure1")
+            if run_cell:
+                parts = [load_results(segment_protocol(scheme, trace, i).results_file_path)
+                        for i in range(k)]
+                save_results(stitch_results(parts), protocol.results_file_path)
+            else:
+                print(" experiment skipped: (%s, %s)" % (scheme, trace))
+            return protocol
+
+        deps = []
+        if run_cell:
+            split = split_stage(trace)
+            deps = [add_segment(scheme, trace, i, [split]) for i in range(k)]
+        graph.add(name, run, deps)
+
+    def on_done(cell, protocol):
+        if pending.get(cell.name):
+            key, inputs = pending[cell.name]
+            cache.store(key, inputs, protocol.results_file_path,
+                    protocol.uplink_log_file_path)
+        if cell.name in reported:
+            trace = reported[cell.name][1]
+            retrieve_and_print_stats(protocol, 2 * delay,
+                    os.path.basename(fig1_uplink_trace(trace, args.tiny_trace)),
+                    STATIC_BW_VARIABLE, "figure1")
 
-            retrieve_and_print_stats(
-                    protocol, 2 * delay, uplink_trace_name, downlink_trace_name
-            )
-        time.sleep(2)
+    for scheme in schemes:
+        for trace in traces:
+            add_cell(scheme, trace)
+    print(" ---- Figure 1: %d cells of %d segments ---- \n" % (len(reported), k))
 
+    return run_graph(graph, args.jobs, on_done, timeline)
 
-def run_fig2_exp(schemes, args, run_full):
+def run_fig2_exp(schemes, args, run_full, cache=None):
     """ Runs experiments for the given schemes, in
     the style of figure 2.
 
     Runs full experiments for everything in run_full,
     assuming that results files already exist for protocols present
-    in schemes but not in run_full.
+    in schemes but not in run_full. Cells whose results are
+    up to date in CACHE are not re-run.
     """
     delay = 50
     exp = args.experiment
@@ -240,44 +475,168 @@ def run_fig2_exp(schemes, args, run_full):
     if args.num_runs:
         num_runs = args.num_runs
 
-    # Run experiment for each scheme
-    for scheme in schemes:
-        print(" ---- Running Experiment %s for protocol: %s ---- \n" % (exp, scheme))
-        protocol = get_protocol(scheme, uplink_ext, downlink_ext, exp)
-        results_path, results_file = os.path.split(protocol.results_file_path)
-        log_path, log_file = os.path.split(protocol.uplink_log_file_path)
-
-        results_path_fmt = results_path + '/multiple/%d/' + results_file
-        log_path_fmt = log_path + '/multiple/%d/' + log_file
-
-        for i in range(1, num_runs + 1):
-            print("         -> Iteration: %d\n" % i)
-
-            if num_runs > 1:
-                curr_results_file = results_path_fmt % i
-                curr_log_file = log_path_fmt % i
-
-                curr_log_path, _ = os.path.split(curr_log_file)
-                curr_results_path, _ = os.path.split(curr_results_file)
-
-                if not os.path.exists(curr_log_path): os.makedirs(curr_log_path)
-                if not os.path.exists(curr_results_path): os.makedirs(curr_results_path)
-
-                protocol.results_file_path = curr_results_file
-                protocol.uplink_log_file_path = curr_log_file
+    adaptive = None
+    if args.target_precision:
+        num_runs = args.max_runs
+        adaptive = AdaptiveRuns([s for s in schemes if s in run_full],
+                args.min_runs, args.max_runs, args.target_precision)
+
+    isolated = args.jobs > 1
+    uplink_trace_name = os.path.basename(uplink_trace)
+    downlink_trace_name = os.path.basename(downlink_trace)
+
+    # Cells whose results must be cached once they have run.
+    pending = {}
+
+    def protocol_for(scheme, i, slot=0):
+        protocol = get_protocol(scheme, uplink_ext, downlink_ext, exp,
+                port_offset=port_offset(slot), placement=placement_for(args, slot),
+                log_compression=args.log_compression)
+        if num_runs > 1:
+            use_iteration_paths(protocol, i)
+        return protocol
+
+    def make_cell(scheme, i):
+        name = '%s:%s:%d' % (scheme, exp, i)
+
+        run_cell = scheme in run_full
+        if run_cell and cache:
+            pending[name] = check_cache(cache, protocol_for(scheme, i), args, delay,
+                    uplink_trace, downlink_trace, exp, i)
+            run_cell = pending[name] is not None
+
+        def run(slot):
+            print(" ---- Running Experiment %s for protocol: %s, iteration %d ---- \n"
+                    % (exp, scheme, i))
+            protocol = protocol_for(scheme, i, slot)
 
             cmds = protocol.get_figure2_cmds(delay, uplink_trace, downlink_trace, args)
-            if scheme in run_full:
-                run_cmds(cmds, args.verbose)
+            if run_cell:
+                # Never report (or cache) results from an older run.
+                if os.path.isfile(protocol.results_file_path):
+                    os.remove(protocol.results_file_path)
+                run_protocol_cmds(name, protocol, cmds, args, isolated)
             else:
                 print(" Experiment skipped ")
 
-            uplink_trace_name = os.path.basename(uplink_trace)
-            downlink_trace_name = os.path.basename(downlink_trace)
-            retrieve_and_print_stats(protocol, delay * 2, uplink_trace_name, downlink_trace_name)
-            time.sleep(2)
+            return protocol
+
+        return Cell(name, run)
+
+    def on_done(cell, protocol):
+        if pending.get(cell.name):
+            key, inputs = pending[cell.name]
+            cache.store(key, inputs, protocol.results_file_path,
+                    protocol.uplink_log_file_path)
+
+        scheme = cell.name.split(':')[0]
+        i = int(cell.name.split(':')[-1])
+        s = retrieve_and_print_stats(protocol, delay * 2, uplink_trace_name,
+                downlink_trace_name, exp, i)
+        if adaptive and scheme in run_full:
+            adaptive.record(scheme, s)
+
+    def on_error(cell, error):
+        # A failed run counts as a run without results.
+        scheme = cell.name.split(':')[0]
+        if scheme in run_full:
+            adaptive.record(scheme, None)
+
+    if adaptive:
+        # Schemes reusing results are only reported; the others
+        # are repeated until their results are precise enough.
+        cells = [make_cell(s, 1) for s in schemes if s not in run_full]
+        more = lambda n: [make_cell(s, i) for s, i in adaptive.next(n)]
+        timings = run_cells(cells, args.jobs, on_done, more, timeline, on_error)
+        adaptive.print_summary()
+    else:
+        cells = [make_cell(s, i) for s in schemes for i in range(1, num_runs + 1)]
+        timings = run_cells(cells, args.jobs, on_done, timeline=timeline)
+
+    print(" ---- Done ---- \n")
+    return timings
+
+def run_spec_exp(spec, args, cache=None):
+    """ Runs the experiment matrix declared by SPEC (see
+    runner/spec.py).
 
+    The cells are compiled into a task graph along with the
+    stages they share: generating each bandwidth downlink and
+    indexing each uplink trace. Each stage runs once, before
+    any cell that needs it.
+    """
+    exp = spec['name']
+    isolated = args.jobs > 1
+    graph = TaskGraph()
+    cells = {}
+
+    # Cells whose results must be cached once they have run.
+    pending = {}
+
+    def stages_for(c):
+        deps = []
+        if c.bandwidth is not None:
+            deps.append(graph.stage('bw:%s' % c.downlink,
+                    lambda slot: make_bw_file(c.uplink, c.downlink, c.bandwidth)).name)
+        deps.append(graph.stage('index:%s' % c.uplink,
+                lambda slot: load_index(c.uplink)).name)
+        return deps
+
+    def protocol_for(c, slot=0):
+        overrides = {'uplink_queue_args': c.queue_args} if c.queue_args else None
+        protocol = get_protocol(c.scheme, os.path.basename(c.uplink),
+                os.path.basename(c.downlink), c.figure, port_offset=port_offset(slot),
+                overrides=overrides, placement=placement_for(args, slot),
+                log_compression=args.log_compression)
+        if spec['repetitions'] > 1:
+            use_iteration_paths(protocol, c.iteration)
+        return protocol
+
+    def add_cell(c):
+        name = ':'.join([c.scheme, c.figure, os.path.basename(c.uplink),
+                os.path.basename(c.downlink), str(c.iteration)])
+        cells[name] = c
+
+        def run(slot):
+            print(" ---- Running Experiment %s cell: %s ---- \n" % (exp, name))
+            protocol = protocol_for(c, slot)
+
+            # Traces may only exist once the stages have run, so
+            # the cache is checked here rather than up front.
+            if cache:
+                pending[name] = check_cache(cache, protocol, args, c.delay, c.uplink,
+                        c.downlink, exp, c.iteration)
+                if pending[name] is None:
+                    return protocol
+
+            # Never report (or cache) results from an older run.
+            if os.path.isfile(protocol.results_file_path):
+                os.remove(protocol.results_file_path)
+            cmds = protocol.get_figure2_cmds(c.delay, c.uplink, c.downlink, args)
+            run_protocol_cmds(name, protocol, cmds, args, isolated)
+            return protocol
+
+        graph.add(name, run, stages_for(c))
+
+    def on_done(cell, protocol):
+        if cell.name not in cells:
+            return
+        c = cells[cell.name]
+        if pending.get(cell.name):
+            key, inputs = pending[cell.name]
+            cache.store(key, inputs, protocol.results_file_path,
+                    protocol.uplink_log_file_path)
+        retrieve_and_print_stats(protocol, 2 * c.delay, os.path.basename(c.uplink),
+                os.path.basename(c.downlink), exp, c.iteration)
+
+    for c in expand_spec(spec, BW_TRACE_DIR, args.tiny_trace):
+        add_cell(c)
+    print(" ---- Experiment %s: %d cells sharing %d stages ---- \n"
+            % (exp, graph.count('cell'), graph.count('stage')))
+
+    timings = run_graph(graph, args.jobs, on_done, timeline)
     print(" ---- Done ---- \n")
+    return timings
 
 def fig2_get_run_full(args, schemes):
     """Given a list of schemes, returns
@@ -349,6 +708,9 @@ if __name__ == '__main__':
         help='list of protocols to run from scratch; runs all if empty')
     parser.add_argument('--experiment', default="figure2a", type=str,
         help='The experiment to run: e.g. figure1, figure2a, figure2b, bothlinks')
+    parser.add_argument('--spec', default=None, type=str,
+        help='run the experiment matrix declared in this YAML spec instead \
+                of --experiment (see specs/)')
     parser.add_argument('--csv-out', default=None, type=str,
         help='save results to CSV file with this name')
 
@@ -358,9 +720,63 @@ if __name__ == '__main__':
             help='use a 5 second version of the Verizon/BW traces')
     parser.add_argument('--num-runs', default=None, type=int,
             help='(fig 2) run each experiment multiple times')
+    parser.add_argument('--target-precision', default=None, type=float,
+            help='repeat each cell until the 95%% confidence intervals of its utilization \
+                    and per-packet delay are within this fraction of their means')
+    parser.add_argument('--min-runs', default=3, type=int,
+            help='(with --target-precision) runs of each cell before stopping early')
+    parser.add_argument('--max-runs', default=10, type=int,
+            help='(with --target-precision) most runs of each cell')
 
     parser.add_argument('--verbose', action='store_true',
             help='be verbose during the experiment')
+    parser.add_argument('--jobs', default=1, type=int,
+            help='number of experiment cells to run at the same time')
+    parser.add_argument('--cache-dir', default='cache', type=str,
+            help='directory of the result cache')
+    parser.add_argument('--no-cache', action='store_true',
+            help='re-run every cell, even if its results are up to date in the cache')
+    parser.add_argument('--cache-log-budget', default=None, type=float,
+            help='(MB) evict least recently used logs beyond this size')
+    parser.add_argument('--log-compression', default=None, choices=sorted(COMPRESSORS),
+            help='compress the mm-link logs on the fly with this compressor')
+    parser.add_argument('--live-analysis', action='store_true',
+            help='analyze each mm-link log as it is written, through a named pipe, \
+                    without saving it')
+    parser.add_argument('--keep-log', action='store_true',
+            help='(with --live-analysis) also save the mm-link logs')
+    parser.add_argument('--steady-state', action='store_true',
+            help='end each run once its utilization and delay are steady, leaving out \
+                    the startup transient (implies --live-analysis)')
+    parser.add_argument('--steady-window', default=10.0, type=float,
+            help='(s) window of the rolling statistics, and how long they must stay steady')
+    parser.add_argument('--steady-tolerance', default=0.05, type=float,
+            help='fraction of their mean by which steady statistics may vary')
+    parser.add_argument('--max-duration', default=None, type=float,
+            help='(s, with --steady-state) end each run after this long regardless')
+    parser.add_argument('--segments', default=None, type=int,
+            help='(fig 1) split each trace into this many segments, run in parallel')
+    parser.add_argument('--segment-overlap', default=10.0, type=float,
+            help='(s, with --segments) warm-up each segment starts with, left out of \
+                    its results')
+    parser.add_argument('--log-retention-days', default=None, type=float,
+            help='after the run, delete logs older than this whose results are saved')
+    parser.add_argument('--results-db', default='results/results.db', type=str,
+            help='SQLite database every run is recorded in')
+    parser.add_argument('--placement', default=None, type=str,
+            help='CPU placement profile: a name under placement/ or a JSON file')
+    parser.add_argument('--monitor', action='store_true',
+            help='sample the CPU use of each cell and flag runs that saturated it')
+    parser.add_argument('--monitor-interval', default=0.5, type=float,
+            help='(s) time between CPU samples')
+    parser.add_argument('--monitor-threshold', default=0.9, type=float,
+            help='(cores) CPU use of the emulator or sender that makes a run suspect')
+    parser.add_argument('--profile', default=None, type=str,
+            help='save the wall and CPU time of every phase of every cell to this \
+                    file, as a Chrome trace')
+    parser.add_argument('--profile-python', action='store_true',
+            help='(with --profile) also run the log analysis and Python senders under \
+                    cProfile, saving their stats next to the trace')
 
     skip = parser.add_mutually_exclusive_group(required=False)
     skip.add_argument('--run-full', default=None,
@@ -378,6 +794,21 @@ if __name__ == '__main__':
 
     args = parser.parse_args()
 
+    if args.num_runs and args.target_precision:
+        parser.error("--num-runs and --target-precision cannot be used together")
+    if args.spec and (args.num_runs or args.target_precision):
+        parser.error("--spec declares its own repetitions")
+    if args.max_duration and not args.steady_state:
+        parser.error("--max-duration needs --steady-state")
+    if args.steady_state:
+        args.live_analysis = True
+    if args.segments and (args.spec or args.experiment != 'figure1'):
+        parser.error("--segments only applies to figure 1")
+    if args.segments and (args.target_precision or args.steady_state):
+        parser.error("--segments cannot be used with --target-precision or --steady-state")
+    if args.profile_python and not args.profile:
+        parser.error("--profile-python needs --profile")
+
     if not os.path.exists('logs'): os.makedirs('logs')
     if not os.path.exists('results'): os.makedirs('results')
     if not os.path.exists('graphs'): os.makedirs('graphs')
@@ -394,19 +825,70 @@ if __name__ == '__main__':
     else:
         traces = ALL_FIG1_TRACES
 
+    results_db = ResultsDB(args.results_db)
+
+    # Python steps are profiled into a directory named after the trace.
+    args.profile_dir = None
+    if args.profile_python:
+        args.profile_dir = os.path.abspath(os.path.splitext(args.profile)[0] + '.cprofile')
+    if args.profile:
+        timeline = Timeline(args.profile_dir)
+
+    args.placement_profile = None
+    if args.placement:
+        args.placement_profile = load_profile(args.placement)
+        limit = max_jobs(args.placement_profile)
+        if limit and args.jobs > limit:
+            print("Placement %s fits %d cells on this host; running %d at a time"
+                    % (args.placement, limit, limit))
+            args.jobs = limit
+
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(args.cache_dir)
+
     # What schemes to run in full and which to reuse results from?
 
-    if args.experiment == "figure2a" or args.experiment == "figure2b" \
+    spec = None
+    if args.spec:
+        spec = load_spec(args.spec)
+        timings = run_spec_exp(spec, args, cache)
+    elif args.experiment == "figure2a" or args.experiment == "figure2b" \
             or args.experiment == "bothlinks" or args.experiment == "pa1":
         run_full = fig2_get_run_full(args, schemes)
-        run_fig2_exp(schemes, args, run_full)
+        timings = run_fig2_exp(schemes, args, run_full, cache)
     elif args.experiment == "figure1":
         run_full = fig1_get_run_full(args, schemes, traces)
-        run_fig1_exp(schemes, traces, args, run_full)
+        if args.segments:
+            timings = run_fig1_segmented(schemes, traces, args, run_full, cache)
+        else:
+            timings = run_fig1_exp(schemes, traces, args, run_full, cache)
     else:
         raise NotImplementedError("Unknown experiment: %s" % args.experiment)
 
-    if args.num_runs and args.csv_out:
+    print_timings(timings)
+
+    if timeline:
+        timeline.print_summary()
+        timeline.save(args.profile)
+        print(" profile saved to %s" % args.profile)
+        if args.profile_dir:
+            print(" cProfile stats saved to %s" % args.profile_dir)
+
+    pruned = []
+    if args.log_retention_days is not None:
+        pruned = [path for path, _ in prune_logs(max_age_days=args.log_retention_days)]
+        print(" deleted %d logs older than %g days" % (len(pruned), args.log_retention_days))
+
+    if cache:
+        cache.forget_logs(pruned)
+        if args.cache_log_budget is not None:
+            for log in cache.evict_logs(args.cache_log_budget * 1000000):
+                print(" evicted old log: %s" % log)
+        cache.save()
+
+    repeated = args.num_runs or args.target_precision or (spec and spec['repetitions'] > 1)
+    if repeated and args.csv_out:
         raise ValueError("You must run the gather_multiple_results.py script to generate \
                 a CSV file when you run experiments multiple times.\n")
 
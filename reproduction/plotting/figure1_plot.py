@@ -6,6 +6,12 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from collections import defaultdict, OrderedDict
 
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from storage.results_db import load_runs
+
 COLORS = {
     'abc': '#3d68c5',
     'cubiccodel': '#449331',
@@ -47,20 +53,19 @@ TRACES = [ # maintain same ordering as original figure
     'ATT-LTE-driving.down'
 ]
 
-def parse_file(filename):
+def runs_to_stats(runs):
+    """Returns the (scheme, power) points of RUNS, by uplink trace."""
     stats = defaultdict(lambda: [])
-    with open(filename) as f:
-        for l in f:
-            split = l.split(', ')
-            proto = split[0]
-            util = split[1]
-            delay = split[6]
-            trace = split[7]
-            power = 1000 * float(util) / float(delay)
-            if proto in SHAPES:
-                stats[trace].append((proto, float(power)))
+    for run in runs:
+        power = 1000 * run.util / run.per_packet_delay
+        if run.scheme in SHAPES:
+            stats[run.uplink_trace].append((run.scheme, power))
     return stats
 
+def parse_file(filename, experiment='figure1'):
+    """Reads results from a results database or CSV file."""
+    return runs_to_stats(load_runs(filename, experiment=experiment))
+
 def plot_data(ax1, stats, traces):
     all_for_proto = defaultdict(lambda: [])
     for trace in traces:
@@ -79,7 +84,7 @@ def plot_data(ax1, stats, traces):
         ax1.plot(len(traces), avg, shape, markersize=size,
             color=COLORS[proto], label=NAMES[proto])
 
-def update_layout(ax1, stats, traces):
+def update_layout(fig, ax1, stats, traces):
     ax1.set_xlim(-.5, len(stats) + .5)
     ax1.set_ylim(0, 6.0)
     ax1.set_yticks([0, 2, 4, 6])
@@ -89,7 +94,7 @@ def update_layout(ax1, stats, traces):
     ax1.spines['left'].set_visible(False)
     # remove y ticks and set smaller font to match paper
     for tic in ax1.yaxis.get_major_ticks():
-        tic.label.set_fontsize(6)
+        tic.label1.set_fontsize(6)
         tic.tick1On = tic.tick2On = False
     ax1.set_xticks(list(range(len(traces) + 1)))
     xlabels = traces + ['AVERAGE']
@@ -99,37 +104,47 @@ def update_layout(ax1, stats, traces):
         tic.tick1On = tic.tick2On = False
     # remove duplicates and alphabetize
     # https://stackoverflow.com/questions/13588920/stop-matplotlib-repeating-labels-in-legend
-    handles, labels = plt.gca().get_legend_handles_labels()
+    handles, labels = ax1.get_legend_handles_labels()
     # https://stackoverflow.com/questions/22263807/how-is-order-of-items-in-matplotlib-legend-determined
     by_label = OrderedDict(sorted(zip(labels, handles), key=lambda t: t[0]))
-    plt.legend(by_label.values(), by_label.keys(), frameon=False,
+    ax1.legend(by_label.values(), by_label.keys(), frameon=False,
         loc='upper center', bbox_to_anchor=(0.5, 1.1), fontsize='x-small',
         edgecolor=None, ncol=len(labels), handletextpad=0, columnspacing=.5)
 
-    plt.tight_layout() # makes space for bottom x-labels
+    fig.tight_layout() # makes space for bottom x-labels
+
+def render(stats, plot_filename):
+    """Plots STATS (from runs_to_stats()) to the svg file
+    PLOT_FILENAME, in a figure of its own.
+    """
+    traces = list(filter(lambda t: t in stats, TRACES))
+
+    fig = plt.figure()
+    ax1 = fig.add_subplot(111)
+    ax1.set_ylabel('Power')
+
+    # Only this figure's text is large and grey.
+    with plt.rc_context({'font.size': 14,
+            'text.color': '#808080', 'lines.color': 'gray'}):
+        plot_data(ax1, stats, traces)
+        update_layout(fig, ax1, stats, traces)
+
+    # save plot to file
+    if not plot_filename.endswith('.svg'): plot_filename += '.svg'
+    fig.savefig(plot_filename)
+    plt.close(fig)
+    return plot_filename
 
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument(dest='data_filename',
-        help='csv file from which to read data', type=str)
+        help='results database or csv file from which to read data', type=str)
     parser.add_argument(dest='plot_filename',
         help='svg file to save plot', type=str)
+    parser.add_argument('-e', '--experiment', default='figure1',
+        help='experiment to plot from a results database', type=str)
     args = parser.parse_args()
 
-    stats = parse_file(args.data_filename)
-    traces = list(filter(lambda t: t in stats, TRACES))
-
-    plt.ylabel('Power')
-    plt.rcParams.update({'font.size': 14,
-        'text.color': '#808080', 'lines.color': 'gray'})
-
-    ax1 = plt.subplot(111)
-
-    plot_data(ax1, stats, traces)
-    update_layout(ax1, stats, traces)
-
-    # save plot to file
-    pf = args.plot_filename
-    if not pf.endswith('.svg'): pf += '.svg'
-    plt.savefig(pf)
+    stats = parse_file(args.data_filename, args.experiment)
+    render(stats, args.plot_filename)
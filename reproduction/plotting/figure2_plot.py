@@ -4,7 +4,6 @@ import matplotlib
 matplotlib.use('Agg')
 
 import matplotlib.pyplot as plt
-from matplotlib import rc
 from matplotlib.ticker import ScalarFormatter, NullFormatter
 from collections import namedtuple, defaultdict
 from functools import reduce
@@ -12,6 +11,13 @@ import numpy as np
 from scipy import interpolate
 from scipy.spatial import ConvexHull
 
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from analysis.sketch import merge_all
+from storage.results_db import load_runs, run_sketch
+
 Stats = namedtuple('Stats', ['util', 'delay'])
 
 PARETO_COLOR = 'red'
@@ -71,144 +77,165 @@ FIGURE2B_ORIGINAL = {
 }
 ORIGINAL_FIGURES = { '2a': FIGURE2A_ORIGINAL, '2b': FIGURE2B_ORIGINAL }
 
-def parse_file(filename, cloud, limit):
+def run_delay(run, percentile):
+    """Returns the PERCENTILE-th percentile per-packet delay of RUN,
+    or its stored 95th percentile if PERCENTILE is None.
+    """
+    if percentile is None:
+        return run.per_packet_delay
+    sketch = run_sketch(run)
+    if sketch is None:
+        raise ValueError("Run of %s has no delay sketch" % run.scheme)
+    return 2 * run.mm_delay + sketch.percentile(percentile)
+
+def runs_to_stats(runs, cloud, limit, percentile=None):
+    """Returns the Stats to plot for RUNS, by scheme.
+
+    With PERCENTILE, the delay is that percentile of the runs'
+    delay sketches (so needs a results database). Without a
+    cloud, a scheme's runs are merged into one point: the
+    percentile over all of their packets, and the mean
+    utilization.
+    """
     stats = defaultdict(lambda: [])
-    with open(filename) as f:
-        for l in f:
-            split = l.split(', ')
-            if not len(split) > 6: continue # blank line
-            proto = split[0]
-            # 'limit' means only plot things from the original paper
-            if limit and not proto in FIGURE2A_ORIGINAL: continue
-            util = split[1]
-            delay = split[6]
-            if cloud:
-                stats[proto].append(Stats(float(util), float(delay)))
-            else: # only one point if no cloud
-                stats[proto] = Stats(float(util), float(delay))
+    by_proto = defaultdict(lambda: [])
+    for run in runs:
+        proto = run.scheme
+        # 'limit' means only plot things from the original paper
+        if limit and not proto in FIGURE2A_ORIGINAL: continue
+        by_proto[proto].append(run)
+        if cloud:
+            stats[proto].append(Stats(run.util, run_delay(run, percentile)))
+        else: # only one point if no cloud
+            stats[proto] = Stats(run.util, run_delay(run, percentile))
+
+    if percentile is not None and not cloud:
+        for proto, rs in by_proto.items():
+            merged = merge_all(run_sketch(r) for r in rs)
+            stats[proto] = Stats(np.mean([r.util for r in rs]),
+                    2 * rs[0].mm_delay + merged.percentile(percentile))
     return stats
 
-def plot_cloud(stats):
-    for proto, ss in stats.items():
-        points = []
+def parse_file(filename, cloud, limit, experiment='figure2a', percentile=None):
+    """Reads results from a results database or CSV file."""
+    return runs_to_stats(load_runs(filename, experiment=experiment), cloud, limit,
+            percentile)
 
-        for s in ss:
-            if CLOUD_DOTS:
-                ax1.plot(s.delay, s.util, 'o', markersize=1,
-                    color=COLORS[proto], label=NAMES[proto])
-            points.append((s.delay, s.util))
+def mean_point(s, cloud):
+    """Returns the (delay, util) point of a scheme's Stats S."""
+    if cloud:
+        return (np.mean(np.array([i.delay for i in s])),
+                np.mean(np.array([i.util for i in s])))
+    return s.delay, s.util
+
+def distinct_points(points):
+    """Returns the rows of the (n, 2) array POINTS whose x and y
+    coordinates both differ from those of every point kept
+    before them, which the closed spline around a cloud needs.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    seen_x = set()
+    seen_y = set()
+    keep = np.zeros(len(points), dtype=bool)
+    for i, (x, y) in enumerate(points.tolist()):
+        if x not in seen_x and y not in seen_y:
+            seen_x.add(x)
+            seen_y.add(y)
+            keep[i] = True
+    return points[keep]
+
+def plot_cloud(ax1, stats):
+    for proto, ss in stats.items():
+        points = np.array([(s.delay, s.util) for s in ss])
+        if CLOUD_DOTS:
+            ax1.plot(points[:, 0], points[:, 1], 'o', markersize=1,
+                color=COLORS[proto], label=NAMES[proto])
 
         # cloud background
-        temp_points = list(points)
-        points = []
-        for p in temp_points:
-            if not p[0] in [x[0] for x in points] and \
-                not p[1] in [x[1] for x in points]:
-                points.append(p)
+        points = distinct_points(points)
         # only works with more than 3 pts and not same x or y coord for points
         if len(points) >= 3:
             # get border
             hull = ConvexHull(points)
             # https://stackoverflow.com/questions/33962717/interpolating-a-closed-curve-using-scipy
-            x = np.array([points[v][0] for v in hull.vertices])
-            y = np.array([points[v][1] for v in hull.vertices])
-            x = np.r_[x, x[0]]
-            y = np.r_[y, y[0]]
+            x = np.r_[points[hull.vertices, 0], points[hull.vertices[0], 0]]
+            y = np.r_[points[hull.vertices, 1], points[hull.vertices[0], 1]]
             # fit splines to x=f(u) and y=g(u), treating both as periodic. also note that s=0
             # is needed in order to force the spline fit to pass through all the input points.
             tck, u = interpolate.splprep([x, y], s=0, per=True)
             # evaluate the spline fits for 1000 evenly spaced distance values
             xi, yi = interpolate.splev(np.linspace(0, 1, 1000), tck)
-            plt.fill(xi, yi, color=COLORS[proto], alpha=.4, edgecolor=None, linewidth=0)
+            ax1.fill(xi, yi, color=COLORS[proto], alpha=.4, edgecolor=None, linewidth=0)
         else:
             # if no cloud, small background
-            x = np.mean(np.array([i.delay for i in ss]))
-            y = np.mean(np.array([i.util for i in ss]))
+            x, y = mean_point(ss, True)
             ax1.plot(x, y, 'o', markersize=4, color=COLORS[proto],
                 alpha=.4, markeredgewidth=0, markeredgecolor=None)
 
+def pareto_frontier(Xs, Ys):
+    """Returns the (x, y) arrays of the points of XS, YS on the
+    lower-left to upper-right frontier: sorted by x, the points
+    with at least the utilization of every point before them.
+    """
+    Xs = np.asarray(Xs, dtype=float)
+    Ys = np.asarray(Ys, dtype=float)
+    order = np.lexsort((Ys, Xs))
+    Xs, Ys = Xs[order], Ys[order]
+    front = Ys >= np.maximum.accumulate(Ys)
+    return Xs[front], Ys[front]
+
 # based off of https://sirinnes.wordpress.com/2013/04/25/pareto-frontier-graphic-via-python/
-def plot_pareto_frontier(Xs, Ys, color, linestyle, maxX=True, maxY=True):
-    '''Pareto frontier selection process'''
-    sorted_list = sorted([[Xs[i], Ys[i]] for i in range(len(Xs))], reverse=maxY)
-    pareto_front = [sorted_list[0]]
-    for pair in sorted_list[1:]:
-        if pair[0] >= pareto_front[-1][0] and pair[1] >= pareto_front[-1][1]:
-            pareto_front.append(pair)
-
-    '''Plotting process'''
-    pf_X = [pair[0] for pair in pareto_front]
-    pf_Y = [pair[1] for pair in pareto_front]
-    plt.plot(pf_X, pf_Y, color=color, linestyle=linestyle, linewidth=1)
-
-def plot_reproduction_frontier(stats, cloud):
-    x = []
-    y = []
-    for proto, s in stats.items():
-        if proto == 'abc': continue # don't plot abc in frontier
-        if cloud:
-            x.append(np.mean(np.array([i.delay for i in s])))
-            y.append(np.mean(np.array([i.util for i in s])))
-        else:
-            x.append(s.delay)
-            y.append(s.util)
+def plot_pareto_frontier(ax1, Xs, Ys, color, linestyle):
+    pf_X, pf_Y = pareto_frontier(Xs, Ys)
+    ax1.plot(pf_X, pf_Y, color=color, linestyle=linestyle, linewidth=1)
 
-    plot_pareto_frontier(x, y, PARETO_COLOR_LIGHT, ':', maxY=False)
+def plot_reproduction_frontier(ax1, stats, cloud):
+    points = [mean_point(s, cloud) for proto, s in stats.items()
+              if proto != 'abc'] # don't plot abc in frontier
+    if not points: return
+    x, y = zip(*points)
+    plot_pareto_frontier(ax1, x, y, PARETO_COLOR_LIGHT, ':')
 
-def plot_original(orig, stats, cloud):
+def plot_original(ax1, orig, stats, cloud):
     for proto, point in orig.items():
-        s = stats[proto]
         ax1.plot(point[0], point[1], 'o', markersize=4, color=COLORS[proto])
         # text
         ax1.annotate(NAMES[proto], xy=point,
             xytext=(point[0] + 5, point[1]), color=COLORS[proto])
-        if cloud:
-            x = np.mean(np.array([i.delay for i in s]))
-            y = np.mean(np.array([i.util for i in s]))
-        else:
-            x = s.delay
-            y = s.util
+        x, y = mean_point(stats[proto], cloud)
         # line between our point and original
         ax1.plot([x, point[0]], [y, point[1]],'k-', color=COLORS[proto], linewidth=1)
         ax1.plot(x, y, 'o', markersize=4, markeredgewidth=1, markeredgecolor=COLORS[proto],
                 markerfacecolor='None', label=NAMES[proto])
 
-    plot_pareto_frontier(
+    plot_pareto_frontier(ax1,
         [point[0] for proto, point in orig.items() if proto != 'abc'],
         [point[1] for proto, point in orig.items() if proto != 'abc'],
-        PARETO_COLOR, '--', maxY=False)
+        PARETO_COLOR, '--')
 
 # https://matplotlib.org/2.0.2/users/annotations.html
-def plot_better_box():
+def plot_better_box(ax1):
     bbox_props = dict(boxstyle='larrow,pad=1', fc='#cce5e5', ec='b', lw=1)
-    t = plt.text(350, .4, 'Better', ha='center', va='center', rotation=-45,
+    t = ax1.text(350, .4, 'Better', ha='center', va='center', rotation=-45,
             size=10, bbox=bbox_props)
 
-if __name__ == '__main__':
-    import argparse
-    parser = argparse.ArgumentParser()
-    parser.add_argument(dest='data_filename',
-        help='csv file from which to read data', type=str)
-    parser.add_argument(dest='plot_filename',
-        help='svg file to save plot', type=str)
-    parser.add_argument('-o', '--original-figure', default=None,
-        help='original result to plot [2a, 2b]', type=str)
-    parser.add_argument('-c', '--cloud', action='store_true', default=False,
-        help='')
-    parser.add_argument('-l', '--limit', action='store_true', default=False,
-        help='')
-    parser.add_argument('-b', '--better-box', action='store_true', default=False,
-        help='')
-    args = parser.parse_args()
-
-    plt.xlabel('95th percentile packet delay (ms)')
-    plt.ylabel('Utilization')
-    plt.rcParams.update({'font.size': 10})
+def render(stats, plot_filename, original_figure=None, cloud=False,
+        better_box=False, percentile=None):
+    """Plots STATS (from runs_to_stats()) to the svg file
+    PLOT_FILENAME, in a figure of its own.
+    """
     # make axis ticks smaller so it doesn't get crowded
-    rc('xtick', labelsize=10)
-    rc('ytick', labelsize=10)
+    with plt.rc_context({'font.size': 10, 'xtick.labelsize': 10,
+            'ytick.labelsize': 10}):
+        return _render(stats, plot_filename, original_figure, cloud,
+                better_box, percentile)
 
-    ax1 = plt.subplot(111)
+def _render(stats, plot_filename, original_figure, cloud, better_box, percentile):
+    fig = plt.figure()
+    ax1 = fig.add_subplot(111)
+    ax1.set_xlabel('%gth percentile packet delay (ms)'
+        % (95 if percentile is None else percentile))
+    ax1.set_ylabel('Utilization')
     ax1.set_ylim(.1, 1.0) # should be .3 for proper reproduction
 
     # log scale for x axis
@@ -219,39 +246,59 @@ if __name__ == '__main__':
     ax1.xaxis.set_major_formatter(NullFormatter())
     ax1.xaxis.set_minor_formatter(ScalarFormatter())
 
-    stats = parse_file(args.data_filename, args.cloud, args.limit)
-
-    if args.cloud:
-        plot_cloud(stats)
+    if cloud:
+        plot_cloud(ax1, stats)
 
     for proto, s in stats.items():
-        if args.cloud:
-            x = np.mean(np.array([i.delay for i in s]))
-            y = np.mean(np.array([i.util for i in s]))
-        else:
-            x = s.delay
-            y = s.util
+        x, y = mean_point(s, cloud)
         ax1.plot(x, y, 'o', markersize=5, markeredgewidth=1, markeredgecolor=COLORS[proto],
                 markerfacecolor='None', label=NAMES[proto])
         # annotate our point if not original figure
-        if not args.original_figure or proto not in FIGURE2B_ORIGINAL:
+        if not original_figure or proto not in FIGURE2B_ORIGINAL:
             ax1.annotate(NAMES[proto], xy=(x, y),
                 xytext=(x + 5, y), color=COLORS[proto])
 
-    plot_reproduction_frontier(stats, args.cloud)
+    plot_reproduction_frontier(ax1, stats, cloud)
 
     # plot original result for comparison
-    if args.original_figure:
-        if args.original_figure not in ORIGINAL_FIGURES:
+    if original_figure:
+        if original_figure not in ORIGINAL_FIGURES:
             raise Exception('No data found for that figure')
-        orig = ORIGINAL_FIGURES[args.original_figure]
+        orig = ORIGINAL_FIGURES[original_figure]
         orig = { p: orig[p] for p in orig if p in stats }
-        plot_original(orig, stats, args.cloud)
+        plot_original(ax1, orig, stats, cloud)
 
-    if args.better_box:
-        plot_better_box()
+    if better_box:
+        plot_better_box(ax1)
 
     # save plot to file
-    pf = args.plot_filename
-    if not pf.endswith('.svg'): pf += '.svg'
-    plt.savefig(pf)
+    if not plot_filename.endswith('.svg'): plot_filename += '.svg'
+    fig.savefig(plot_filename)
+    plt.close(fig)
+    return plot_filename
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument(dest='data_filename',
+        help='results database or csv file from which to read data', type=str)
+    parser.add_argument(dest='plot_filename',
+        help='svg file to save plot', type=str)
+    parser.add_argument('-o', '--original-figure', default=None,
+        help='original result to plot [2a, 2b]', type=str)
+    parser.add_argument('-c', '--cloud', action='store_true', default=False,
+        help='')
+    parser.add_argument('-l', '--limit', action='store_true', default=False,
+        help='')
+    parser.add_argument('-b', '--better-box', action='store_true', default=False,
+        help='')
+    parser.add_argument('-e', '--experiment', default='figure2a',
+        help='experiment to plot from a results database', type=str)
+    parser.add_argument('-p', '--percentile', default=None, type=float,
+        help='plot this percentile of the delay, from the runs\' delay sketches')
+    args = parser.parse_args()
+
+    stats = parse_file(args.data_filename, args.cloud, args.limit, args.experiment,
+        args.percentile)
+    render(stats, args.plot_filename, args.original_figure, args.cloud,
+        args.better_box, args.percentile)
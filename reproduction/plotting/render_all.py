@@ -0,0 +1,151 @@
+#!/usr/bin/python
+
+#
+# Renders every figure in one go.
+#
+# Each results file (or experiment of a results database)
+# is read once, and the figures are rendered from those
+# runs across a pool of worker processes. matplotlib and
+# scipy are imported once, before the workers fork, instead
+# of once per figure. With --profile, each figure is
+# rendered under cProfile.
+#
+
+from collections import OrderedDict
+from multiprocessing import Pool, cpu_count
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from runner.timeline import profile_call, profile_path
+from storage.results_db import load_runs
+import figure1_plot
+import figure2_plot
+
+# The figures generate_plots.sh used to render one process
+# at a time. "data" is the file under --results-dir they
+# read, and "experiment" what they read from --results-db.
+FIGURES = OrderedDict([
+    ('figure1', {'kind': 'figure1', 'data': 'figure1.csv', 'experiment': 'figure1'}),
+    ('figure2a', {'kind': 'figure2', 'data': 'figure2a.csv', 'experiment': 'figure2a',
+                  'original_figure': '2a', 'cloud': True, 'limit': True,
+                  'better_box': True}),
+    ('figure2b', {'kind': 'figure2', 'data': 'figure2b.csv', 'experiment': 'figure2b',
+                  'original_figure': '2b', 'cloud': True, 'limit': True}),
+    ('bothlinks', {'kind': 'figure2', 'data': 'bothlinks.csv', 'experiment': 'bothlinks'}),
+    ('figure2a_extra', {'kind': 'figure2', 'data': 'figure2a.csv', 'experiment': 'figure2a',
+                        'original_figure': '2a', 'cloud': True}),
+    ('figure2b_extra', {'kind': 'figure2', 'data': 'figure2b.csv', 'experiment': 'figure2b',
+                        'original_figure': '2b', 'cloud': True}),
+])
+
+def figure_source(spec, results_dir, results_db):
+    """Returns the (path, experiment) a figure SPEC reads."""
+    if results_db:
+        return results_db, spec['experiment']
+    return os.path.join(results_dir, spec['data']), spec['experiment']
+
+def load_sources(sources):
+    """Reads each distinct (path, experiment) in SOURCES once.
+
+    Returns:
+        dict of (path, experiment) to its Runs, without the
+        sources whose file does not exist.
+    """
+    runs = {}
+    for path, experiment in set(sources):
+        if os.path.isfile(path):
+            runs[(path, experiment)] = load_runs(path, experiment=experiment)
+    return runs
+
+def render_figure(task):
+    """Renders one figure: TASK is (name, spec, runs, plot
+    filename, delay percentile, directory of its cProfile stats
+    or None).
+
+    Returns:
+        (name, the file written or None, error message or None).
+    """
+    name, spec, runs, plot_filename, percentile, profile_dir = task
+    if profile_dir:
+        return profile_call(profile_path(profile_dir, name), render_figure,
+                task[:-1] + (None,))
+    try:
+        if spec['kind'] == 'figure1':
+            written = figure1_plot.render(figure1_plot.runs_to_stats(runs), plot_filename)
+        else:
+            cloud = spec.get('cloud', False)
+            stats = figure2_plot.runs_to_stats(runs, cloud, spec.get('limit', False),
+                    percentile)
+            written = figure2_plot.render(stats, plot_filename,
+                    spec.get('original_figure'), cloud, spec.get('better_box', False),
+                    percentile)
+        return name, written, None
+    except Exception as e:
+        return name, None, '%s: %s' % (type(e).__name__, e)
+
+def render_all(names, out_dir, results_dir=None, results_db=None, jobs=None,
+        percentile=None, profile_dir=None):
+    """Renders the figures NAMES into OUT_DIR, saving the cProfile
+    stats of each to PROFILE_DIR if given.
+
+    Returns:
+        list of (name, file written or None, error or None).
+    """
+    if not os.path.exists(out_dir): os.makedirs(out_dir)
+    if profile_dir and not os.path.exists(profile_dir): os.makedirs(profile_dir)
+    sources = dict((n, figure_source(FIGURES[n], results_dir, results_db)) for n in names)
+    runs = load_sources(sources.values())
+
+    tasks = []
+    outcomes = []
+    for name in names:
+        if sources[name] not in runs:
+            outcomes.append((name, None, 'no results at %s' % sources[name][0]))
+            continue
+        tasks.append((name, FIGURES[name], runs[sources[name]],
+                os.path.join(out_dir, name + '.svg'), percentile, profile_dir))
+
+    jobs = min(jobs or cpu_count(), len(tasks))
+    if jobs <= 1:
+        outcomes.extend(render_figure(t) for t in tasks)
+    else:
+        pool = Pool(jobs)
+        try:
+            outcomes.extend(pool.map(render_figure, tasks))
+        finally:
+            pool.close()
+            pool.join()
+    order = dict((n, i) for i, n in enumerate(names))
+    return sorted(outcomes, key=lambda o: order[o[0]])
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--results-dir', default='results-1', type=str,
+        help='directory holding the csv results of each figure')
+    parser.add_argument('--results-db', default=None, type=str,
+        help='read every figure from this results database instead')
+    parser.add_argument('--out-dir', default='plots', type=str,
+        help='directory to save the svg plots to')
+    parser.add_argument('--figures', default=list(FIGURES), nargs='+',
+        choices=list(FIGURES), help='figures to render')
+    parser.add_argument('-j', '--jobs', default=None, type=int,
+        help='number of figures to render at once (default: one per core)')
+    parser.add_argument('-p', '--percentile', default=None, type=float,
+        help='plot this percentile of the delay in figure 2, from delay sketches')
+    parser.add_argument('--profile', default=None, type=str,
+        help='save the cProfile stats of each figure to this directory')
+    args = parser.parse_args()
+
+    failed = False
+    for name, written, error in render_all(args.figures, args.out_dir,
+            args.results_dir, args.results_db, args.jobs, args.percentile,
+            args.profile):
+        if error:
+            failed = True
+            print("%s: %s" % (name, error))
+        else:
+            print("%s: %s" % (name, written))
+    sys.exit(1 if failed else 0)
@@ -7,8 +7,16 @@
 import json
 import pprint
 import collections
+import functools
 import os
 
+from analysis import mm_log
+from analysis.live import LiveAnalysis
+from analysis.steady import SteadyState
+from analysis.logfiles import compression_of, compressing_command, decompress_command
+from runner.placement import command_prefix
+from runner.timeline import profile_command, profile_path
+
 class CCProtocol:
 
     fig_2_base_cmd_fmt = "mm-delay {delay} \
@@ -17,14 +25,17 @@ class CCProtocol:
             {uplink} {downlink} \
             -- bash -c '{mahimahi_command}'"
 
-    fig_2_results_cmd_fmt = "mm-throughput-graph 500 {log_file} > \
-            {graph_file} 2> {results_file}"
+    fig_2_graph_cmd_fmt = "mm-throughput-graph 500 {log_file} > \
+            {graph_file} 2> /dev/null"
+
+    fig_2_compressed_graph_cmd_fmt = "{decompress} | mm-throughput-graph 500 > \
+            {graph_file} 2> /dev/null"
 
     mahimahi_queue_args_fmt = "--{target_link}-queue={queue} \
             --{target_link}-queue-args=\"{queue_args}\""
 
     def __init__(self, config_file_path, results_file_path,
-            uplink_log_file_path, extra_args):
+            uplink_log_file_path, extra_args, port_offset=0, placement=None):
         """Constructs class representing a testable protocol.
 
         This class houses the configuration for a congestion
@@ -34,6 +45,14 @@ class CCProtocol:
         Reads a configuration dict from the specified JSON file.
         Any arguments in extra_args are added to the protocol's
         config dictionary, overwriting defaults from the JSON file.
+
+        Commands in the config may contain a "{port}" placeholder,
+        which is filled in with the config's "port" shifted by
+        port_offset so that concurrent runs do not collide.
+
+        PLACEMENT, if given, is a resolved placement profile (see
+        runner/placement.py) pinning the emulator, sender and
+        server to their cores.
         """
         with open(os.path.expanduser(config_file_path)) as f:
             self.config = json.load(f)
@@ -44,6 +63,19 @@ class CCProtocol:
         for arg in extra_args:
             self.config[arg] = extra_args[arg]
 
+        self.port = self.config.get('port', 0) + port_offset
+        self.placement = placement
+        # Host overhead summary of the last run, if it was monitored.
+        self.monitor = None
+        # Polled while mm-link runs, if the run may end early.
+        self.stop_condition = None
+        # (ms) warm-up at the start of the run left out of its results.
+        self.analysis_start = None
+
+    def _fill_ports(self, commands):
+        """Substitutes this protocol's port into COMMANDS."""
+        return [c.replace('{port}', str(self.port)) for c in commands]
+
     def get_figure1_cmds(self, mm_delay, uplink_trace, downlink_trace, args):
         """ Returns list of commands to run to generate Figure 1 results.
         """
@@ -65,28 +97,79 @@ class CCProtocol:
                     queue_args=self.config['uplink_queue_args']
             )
 
-        prep_commands = self.config['prep_commands']
+        server_prefix = command_prefix(self.placement, 'server')
+        prep_commands = [server_prefix + c if c else c
+                for c in self._fill_ports(self.config['prep_commands'])]
+        ready_probes = self._fill_ports(self.config.get('ready_probes', []))
+        # The logged link always runs the (cellular) uplink trace.
+        logged_trace = uplink_trace
         if target_link == 'downlink':
             uplink_trace, downlink_trace = (downlink_trace, uplink_trace)
-        mahimahi_cmd = self.fig_2_base_cmd_fmt.format(
-                target_link=target_link, delay=str(mm_delay), log=self.uplink_log_file_path,
+        sender_cmd = command_prefix(self.placement, 'sender') + \
+                self._fill_ports([self.config['mahimahi_command']])[0]
+        if args.profile_dir:
+            sender_cmd = profile_command(sender_cmd, profile_path(args.profile_dir,
+                    os.path.basename(self.uplink_log_file_path) + '.sender'))
+        # With live analysis, mm-link logs into a named pipe read
+        # by an analyzer in this process, which only saves the log
+        # if it is needed. Otherwise a compressed log is written
+        # through a named pipe that the compressor drains as
+        # mm-link writes to it.
+        compression = compression_of(self.uplink_log_file_path)
+        live = None
+        mm_log_path = self.uplink_log_file_path
+        if args.live_analysis:
+            keep_log = args.keep_log or args.print_graph
+            steady = None
+            if args.steady_state:
+                steady = SteadyState(args.steady_window, args.steady_tolerance,
+                        args.max_duration)
+            live = LiveAnalysis(self.uplink_log_file_path + '.fifo',
+                    self.uplink_log_file_path if keep_log else None, steady,
+                    self.analysis_start)
+            mm_log_path = live.fifo_path
+            self.stop_condition = live.should_stop if steady else None
+        elif compression:
+            mm_log_path += '.fifo'
+        mahimahi_cmd = command_prefix(self.placement, 'emulator') + self.fig_2_base_cmd_fmt.format(
+                target_link=target_link, delay=str(mm_delay), log=mm_log_path,
                 queue_args=queue_args, uplink=uplink_trace,
-                downlink=downlink_trace, mahimahi_command=self.config['mahimahi_command']
+                downlink=downlink_trace, mahimahi_command=sender_cmd
         )
-
-        graph_out = '/dev/null'
+        if compression and not live:
+            mahimahi_cmd = compressing_command(mahimahi_cmd,
+                    self.uplink_log_file_path, compression)
+        mahimahi_cmds = [mahimahi_cmd]
+        if live:
+            mahimahi_cmds.insert(0, live.start)
+
+        # Results are computed in-process from the log, against
+        # the trace's precomputed capacity; the Perl script is
+        # only needed to draw the graph.
+        if live:
+            results_cmds = [functools.partial(live.write_results,
+                    self.results_file_path, logged_trace)]
+        else:
+            results_cmds = [functools.partial(mm_log.write_results,
+                    self.uplink_log_file_path, self.results_file_path, logged_trace,
+                    self.analysis_start)]
         if args.print_graph:
-            graph_out = 'graphs/%s_graph.svg' % self.config['name']
-        results_cmd = self.fig_2_results_cmd_fmt.format(
-                log_file=self.uplink_log_file_path, results_file=self.results_file_path,
-                graph_file=graph_out)
+            graph_file = 'graphs/%s_graph.svg' % self.config['name']
+            if compression:
+                results_cmds.append(self.fig_2_compressed_graph_cmd_fmt.format(
+                        decompress=decompress_command(self.uplink_log_file_path),
+                        graph_file=graph_file))
+            else:
+                results_cmds.append(self.fig_2_graph_cmd_fmt.format(
+                        log_file=self.uplink_log_file_path, graph_file=graph_file))
 
-        cleanup_commands = self.config['cleanup_commands']
+        cleanup_commands = self._fill_ports(self.config['cleanup_commands'])
 
         commands = [("prep", prep_commands),
-                    ("mahimahi", [mahimahi_cmd]),
+                    ("ready", ready_probes),
+                    ("mahimahi", mahimahi_cmds),
                     ("cleanup", cleanup_commands),
-                    ("results", [results_cmd])]
+                    ("results", results_cmds)]
 
         return collections.OrderedDict(commands)
 
@@ -2,49 +2,35 @@
 # Contains utility routines for our reproduction.
 #
 
+import json
 import os
+from analysis.logfiles import compressed_path
 from protocols.cc_protocol import CCProtocol
 
 UPLINK_LOG_FILE_FMT = 'logs/{}/{}/UPLINK_{}-DOWNLINK_{}.log'
-RESULTS_FILE_FMT = 'results/{}/{}/UPLINK_{}-DOWNLINK_{}.txt'
+RESULTS_FILE_FMT = 'results/{}/{}/UPLINK_{}-DOWNLINK_{}.json'
 CONFIG_FILE_FMT = '~/ABC-1/reproduction/protocols/config/{}.json'
 
-def get_protocol(scheme, uplink_ext, downlink_ext, figure="figure2"):
-    """Returns a CCProtocol object populated with
-       the correct scheme arguments, ready to extract
-       figure commands from.
+def get_scheme_config(scheme):
+    """Returns the (config_file_path, extra_config) pair
+       describing SCHEME, where extra_config overrides
+       entries of the JSON config file.
 
     Args:
-        scheme: (str) what scheme to return CCProtocol for
-        uplink_ext: (str) the name of the uplink trace file
-        downlink_ext: (str) the name of the downlink trace file
+        scheme: (str) what scheme to return the config for
 
     """
-
-    results_file_path = RESULTS_FILE_FMT.format(
-            figure, scheme, uplink_ext, downlink_ext
-    )
-    uplink_log_file_path = UPLINK_LOG_FILE_FMT.format(
-            figure, scheme, uplink_ext, downlink_ext
-    )
-
-    results_dir = os.path.dirname(results_file_path)
-    log_dir = os.path.dirname(uplink_log_file_path)
-
-    if not os.path.exists(results_dir): os.makedirs(results_dir)
-    if not os.path.exists(log_dir): os.makedirs(log_dir)
-
     extra_config = {}
-    
+
     config_file_name = None
 
     if scheme in ['copa', 'ledbat', 'pcc', 'quic', 'verus', 'cubic', 'abc', 'sprout']:
         config_file_name = scheme
-    
+
     elif scheme == 'vegas': 
         config_file_name = 'cubic'
         extra_config['name'] = 'vegas'
-        extra_config['mahimahi_command'] = 'sh ~/ABC-1/start_tcp.sh vegas'
+        extra_config['mahimahi_command'] = 'sh ~/ABC-1/start_tcp.sh vegas {port}'
 
     elif scheme == 'cubiccodel': 
         config_file_name = 'cubic'
@@ -61,14 +47,65 @@ def get_protocol(scheme, uplink_ext, downlink_ext, figure="figure2"):
     elif scheme == 'bbr':
         config_file_name = 'cubic'
         extra_config['name'] = 'bbr'
-        extra_config['mahimahi_command'] = 'sh ~/ABC-1/start_tcp.sh bbr'
+        extra_config['mahimahi_command'] = 'sh ~/ABC-1/start_tcp.sh bbr {port}'
 
     else:
         raise ValueError("Unknown scheme: %s" % scheme)
-    
+
     config_file_path = CONFIG_FILE_FMT.format(config_file_name)
 
-    p = CCProtocol(config_file_path, results_file_path, uplink_log_file_path, extra_config)
+    return config_file_path, extra_config
+
+def load_config(scheme):
+    """Returns the resolved config dictionary of SCHEME,
+       as CCProtocol.config would hold it.
+    """
+    config_file_path, extra_config = get_scheme_config(scheme)
+    with open(os.path.expanduser(config_file_path)) as f:
+        config = json.load(f)
+    config.update(extra_config)
+    return config
+
+def get_protocol(scheme, uplink_ext, downlink_ext, figure="figure2", port_offset=0,
+        overrides=None, placement=None, log_compression=None):
+    """Returns a CCProtocol object populated with
+       the correct scheme arguments, ready to extract
+       figure commands from.
+
+    Args:
+        scheme: (str) what scheme to return CCProtocol for
+        uplink_ext: (str) the name of the uplink trace file
+        downlink_ext: (str) the name of the downlink trace file
+        port_offset: (int) shift applied to the protocol's ports, so
+                     that cells running concurrently do not collide
+        overrides: (dict) config entries replacing the scheme's
+                   defaults, e.g. a different "uplink_queue_args"
+        placement: (dict) resolved placement profile pinning the
+                   protocol's processes to cores
+        log_compression: (str) compress the uplink log on the fly with
+                   this compressor of analysis/logfiles.py, e.g. 'gzip'
+
+    """
+
+    results_file_path = RESULTS_FILE_FMT.format(
+            figure, scheme, uplink_ext, downlink_ext
+    )
+    uplink_log_file_path = compressed_path(UPLINK_LOG_FILE_FMT.format(
+            figure, scheme, uplink_ext, downlink_ext
+    ), log_compression)
+
+    results_dir = os.path.dirname(results_file_path)
+    log_dir = os.path.dirname(uplink_log_file_path)
+
+    if not os.path.exists(results_dir): os.makedirs(results_dir)
+    if not os.path.exists(log_dir): os.makedirs(log_dir)
+
+    config_file_path, extra_config = get_scheme_config(scheme)
+    if overrides:
+        extra_config.update(overrides)
+
+    p = CCProtocol(config_file_path, results_file_path, uplink_log_file_path,
+            extra_config, port_offset, placement)
     return p
 
 
@@ -0,0 +1,4 @@
+#
+# Helpers for scheduling and running experiment
+# cells for our reproduction of the ABC paper.
+#
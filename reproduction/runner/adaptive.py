@@ -0,0 +1,157 @@
+#
+# Adaptive repetition of experiment cells.
+#
+# Instead of running every cell a fixed number of times, a
+# cell is repeated until the confidence interval of each of
+# its metrics is narrower than a target fraction of the
+# metric's mean, or until it has run a maximum number of
+# times. Whenever a worker is free, the cell whose interval
+# is currently the widest (relative to its mean) runs next,
+# so the noisiest cells get the extra runs.
+#
+# Delays are judged by their queueing part: the per-packet
+# delay adds the fixed base RTT, which would make its
+# interval look narrower than the variation it measures.
+#
+# A run that fails or produces no results still counts
+# towards the cell's runs, so a broken cell stops once it
+# reaches the maximum, and is reported with its failures.
+#
+
+import math
+
+# Two-sided 95% Student t quantiles, by degrees of freedom.
+T_95 = [None, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306,
+        2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110,
+        2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056,
+        2.052, 2.048, 2.045, 2.042]
+Z_95 = 1.960
+
+def t_quantile(df):
+    """Returns the 95% two-sided Student t quantile for DF."""
+    return T_95[df] if df < len(T_95) else Z_95
+
+def confidence_halfwidth(values):
+    """Returns the half-width of the 95% confidence interval of the
+    mean of VALUES, or infinity if there are fewer than two.
+    """
+    n = len(values)
+    if n < 2:
+        return float('inf')
+    mean = sum(values) / float(n)
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1)
+    return t_quantile(n - 1) * math.sqrt(variance / n)
+
+def relative_halfwidth(values):
+    """Returns the confidence half-width of VALUES relative to
+    their mean.
+    """
+    halfwidth = confidence_halfwidth(values)
+    mean = sum(values) / float(len(values)) if values else 0.0
+    if math.isinf(halfwidth):
+        return halfwidth
+    if mean == 0:
+        return 0.0 if halfwidth == 0 else float('inf')
+    return halfwidth / abs(mean)
+
+class AdaptiveRuns:
+
+    def __init__(self, keys, min_runs, max_runs, precision,
+            metrics=('util', 'queuing_delay')):
+        """Tracks the repetitions of the cells KEYS.
+
+        Args:
+            min_runs: (int) runs of every cell before its interval
+                      is trusted
+            max_runs: (int) most runs of any cell
+            precision: (float) target confidence half-width, as a
+                       fraction of the mean, e.g. 0.05
+            metrics: Stats fields whose intervals must be narrow
+        """
+        if min_runs < 2 or max_runs < min_runs:
+            raise ValueError("Need 2 <= min runs <= max runs")
+        self.keys = list(keys)
+        self.min_runs = min_runs
+        self.max_runs = max_runs
+        self.precision = precision
+        self.metrics = metrics
+        self.launched = dict((k, 0) for k in self.keys)
+        self.finished = dict((k, 0) for k in self.keys)
+        self.failed = dict((k, 0) for k in self.keys)
+        self.values = dict((k, dict((m, []) for m in metrics)) for k in self.keys)
+
+    def record(self, key, stats):
+        """Records the Stats of a finished run of KEY (None if the
+        run failed or produced no results).
+        """
+        self.finished[key] += 1
+        if stats is None:
+            self.failed[key] += 1
+        else:
+            for m in self.metrics:
+                self.values[key][m].append(getattr(stats, m))
+
+    def width(self, key):
+        """Returns the widest relative confidence half-width of KEY's
+        metrics.
+        """
+        return max(relative_halfwidth(self.values[key][m]) for m in self.metrics)
+
+    def done(self, key):
+        """Returns True if KEY needs no more runs."""
+        if self.launched[key] >= self.max_runs:
+            return True
+        if self.finished[key] < self.min_runs:
+            return False
+        return self.width(key) <= self.precision
+
+    def next(self, n):
+        """Picks up to N runs to start next.
+
+        Cells that have not reached the minimum number of runs come
+        first. After that a cell is only re-run once its previous
+        runs have finished, widest interval first.
+
+        Returns:
+            list of (key, iteration) pairs, iterations counting from 1.
+        """
+        chosen = []
+        for _ in range(n):
+            warmup = [k for k in self.keys if self.launched[k] < self.min_runs]
+            if warmup:
+                key = min(warmup, key=lambda k: self.launched[k])
+            else:
+                ready = [k for k in self.keys if not self.done(k)
+                         and self.launched[k] == self.finished[k]]
+                if not ready:
+                    break
+                key = max(ready, key=self.width)
+            self.launched[key] += 1
+            chosen.append((key, self.launched[key]))
+        return chosen
+
+    def summary(self):
+        """Returns (key, runs, failures, {metric: (mean, halfwidth)})
+        for every cell.
+        """
+        rows = []
+        for k in self.keys:
+            intervals = {}
+            for m in self.metrics:
+                values = self.values[k][m]
+                mean = sum(values) / float(len(values)) if values else float('nan')
+                intervals[m] = (mean, confidence_halfwidth(values))
+            rows.append((k, self.finished[k], self.failed[k], intervals))
+        return rows
+
+    def print_summary(self):
+        print("\n ---- Adaptive repetition (95%% CI, target +/- %.1f%%) ---- \n"
+                % (100 * self.precision))
+        for key, runs, failures, intervals in self.summary():
+            name = key if isinstance(key, str) else ':'.join(key)
+            parts = ['%s %.4g +/- %.2g' % (m, mean, hw) for m, (mean, hw) in
+                     sorted(intervals.items())]
+            if failures:
+                parts.append('%d failed' % failures)
+            print("   %-40s %3d runs  %s" % (name, runs, ', '.join(parts)))
+        print("")
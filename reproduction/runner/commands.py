@@ -0,0 +1,336 @@
+#
+# Runs the commands that make up an experiment cell.
+#
+# Instead of sleeping for a fixed time, a cell waits on
+# readiness probes: the commands of its "ready" phase are
+# conditions such as "tcp:12345" (something listens on TCP
+# port 12345) that must hold before the next phase starts.
+#
+
+from collections import OrderedDict
+from subprocess import Popen
+
+import os
+import shlex
+import signal
+import socket
+import sys
+import time
+
+from runner.timeline import cpu_time, span
+
+# (s) how long a probe waits, unless it gives a timeout.
+PROBE_TIMEOUT = 10
+PROBE_INTERVAL = 0.01
+
+# (s) how long to wait for a cell's ports to be released.
+RELEASE_TIMEOUT = 5
+
+# (s) how long a run stopped early has to exit.
+STOP_TIMEOUT = 5
+
+PROC_NET = {'tcp': ['/proc/net/tcp', '/proc/net/tcp6'],
+            'udp': ['/proc/net/udp', '/proc/net/udp6']}
+
+# State of a listening socket in /proc/net/tcp.
+TCP_LISTEN = '0A'
+
+def _proc_net_bound(port, proto):
+    for path in PROC_NET[proto]:
+        if not os.path.isfile(path):
+            continue
+        with open(path) as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if int(fields[1].split(':')[1], 16) != port:
+                    continue
+                if proto == 'udp' or fields[3] == TCP_LISTEN:
+                    return True
+    return False
+
+def port_bound(port, proto='tcp'):
+    """Returns True if a socket is listening on (TCP) or bound to
+    (UDP) PORT on this host.
+    """
+    if os.path.isfile(PROC_NET[proto][0]):
+        return _proc_net_bound(port, proto)
+
+    # Without /proc, a port is taken if we cannot bind it.
+    kind = socket.SOCK_STREAM if proto == 'tcp' else socket.SOCK_DGRAM
+    s = socket.socket(socket.AF_INET, kind)
+    try:
+        s.bind(('', port))
+        return False
+    except socket.error:
+        return True
+    finally:
+        s.close()
+
+def file_exists(path):
+    """Returns True if there is a file at PATH."""
+    return os.path.exists(os.path.expanduser(path))
+
+def process_exited(proc):
+    """Returns True if the Popen PROC has exited."""
+    return proc.poll() is not None
+
+def wait_for(condition, timeout, abort=None):
+    """Polls CONDITION until it holds, TIMEOUT seconds pass, or
+    ABORT (if given) holds.
+
+    Returns:
+        True if the condition holds.
+    """
+    deadline = time.time() + timeout
+    while True:
+        if condition():
+            return True
+        if time.time() >= deadline or (abort and abort()):
+            return False
+        time.sleep(PROBE_INTERVAL)
+
+def parse_probe(spec):
+    """Parses a probe "KIND:TARGET[@TIMEOUT]".
+
+    Kinds are "tcp" and "udp" (TARGET is a port that must be
+    bound), "file" (TARGET must exist) and "wait" (TARGET is a
+    number of seconds to sleep, for servers with no observable
+    readiness).
+
+    Returns:
+        (kind, target, timeout) tuple.
+    """
+    timeout = PROBE_TIMEOUT
+    if '@' in spec:
+        spec, timeout = spec.rsplit('@', 1)
+        timeout = float(timeout)
+    kind, _, target = spec.partition(':')
+    if kind in ('tcp', 'udp'):
+        return kind, int(target), timeout
+    if kind == 'file':
+        return kind, target, timeout
+    if kind == 'wait':
+        return kind, float(target), float(target)
+    raise ValueError("Unknown readiness probe: %s" % spec)
+
+def probe(spec, background):
+    """Waits for the readiness probe SPEC.
+
+    Gives up early if every process in BACKGROUND has exited,
+    since nothing is left to become ready.
+
+    Returns:
+        True if the condition was met.
+    """
+    kind, target, timeout = parse_probe(spec)
+    if kind == 'wait':
+        time.sleep(target)
+        return True
+
+    if kind == 'file':
+        condition = lambda: file_exists(target)
+    else:
+        condition = lambda: port_bound(target, kind)
+    abort = None
+    if background:
+        abort = lambda: all(process_exited(p) for p in background)
+    return wait_for(condition, timeout, abort)
+
+def wait_or_stop(proc, stop):
+    """Waits for the Popen PROC, which leads its own session, to
+    exit, ending the session early once STOP() holds.
+
+    Returns:
+        True if PROC was stopped.
+    """
+    wait_for(lambda: process_exited(proc) or stop(), float('inf'))
+    if process_exited(proc):
+        return False
+    os.killpg(proc.pid, signal.SIGTERM)
+    if not wait_for(lambda: process_exited(proc), STOP_TIMEOUT):
+        os.killpg(proc.pid, signal.SIGKILL)
+    proc.wait()
+    return True
+
+def session_args(new_session):
+    """Returns the Popen keyword arguments that start a process
+    as the leader of a new session, if NEW_SESSION.
+
+    Cells run from worker threads, where a preexec_fn may
+    deadlock the child, so it is only used on Python 2, which
+    has no start_new_session.
+    """
+    if not new_session:
+        return {}
+    if sys.version_info[0] >= 3:
+        return {'start_new_session': True}
+    return {'preexec_fn': os.setsid}
+
+def format_phase_times(phase_times):
+    """Returns PHASE_TIMES as a one-line summary."""
+    return ', '.join('%s %.1f s' % (phase, t) for phase, t in phase_times.items())
+
+def _label(command):
+    # Spans are named after the start of their command.
+    return command if len(command) <= 60 else command[:57] + '...'
+
+def run_cmds(cmds, verbose=False, isolated=False, monitor=None, stop=None,
+        timeline=None):
+    """Runs the commands in CMDS.
+
+    Runs "prep" commands in the background, waits on the
+    readiness probes of the "ready" phase, and runs all other
+    commands sequentially.  Cleans up lingering processes
+    returned by Popen call, and waits for the ports probed
+    in the "ready" phase to be released.
+
+    Args:
+        cmds: (OrderedDict) Maps descriptions of commands to
+              lists of command strings to run. A command may
+              also be a Python callable, which is called in place.
+        isolated: (bool) True if other cells may be running
+              at the same time. Every process is started in its
+              own session and cleaned up by killing that session,
+              and "killall" cleanup commands, which would also hit
+              the other cells' processes, are skipped.
+        monitor: (ProcessMonitor) if given, samples the processes
+              started by the commands during the "mahimahi" phase.
+        stop: (callable) if given, polled while a "mahimahi" phase
+              command runs; once it returns True, the command is
+              ended by terminating its session.
+        timeline: (Timeline) if given, the phases, commands and
+              process spawns are recorded on it, and Python steps
+              are run through it (see runner/timeline.py).
+
+    Returns:
+        OrderedDict mapping each phase to the seconds it took.
+    """
+    processes = []
+    background = []
+    ports = []
+    phase_times = OrderedDict()
+    home = os.path.expanduser('~')
+    devnull = open(os.devnull, 'w')
+    try:
+        for c_type in cmds:
+            start = time.time()
+            phase_cpu = cpu_time()
+            if monitor and c_type == 'mahimahi':
+                monitor.start()
+            for c in cmds[c_type]:
+                if not c: continue
+
+                # Python steps (e.g. log analysis) run in-process.
+                if callable(c):
+                    name = getattr(c, 'func', c).__name__
+                    if verbose:
+                        print("$ <python> %s" % name)
+                    try:
+                        with span(timeline, name, 'python'):
+                            if timeline:
+                                timeline.call(name, c)
+                            else:
+                                c()
+                    except (IOError, ValueError) as e:
+                        print(" %s step failed: %s" % (c_type, e))
+                    continue
+
+                # Need full pathname for home
+                c = c.replace('~', home)
+
+                if c_type == 'ready':
+                    if verbose:
+                        print("? %s" % c)
+                    kind, target, _ = parse_probe(c)
+                    if kind in ('tcp', 'udp'):
+                        ports.append((target, kind))
+                    with span(timeline, c, 'probe'):
+                        ready = probe(c, background)
+                    if not ready:
+                        print(" not ready after %.1f s: %s" % (time.time() - start, c))
+                    continue
+
+                if isolated and c.startswith('killall '):
+                    continue
+
+                if verbose:
+                    print("$ %s" % ' '.join(c.split(' ')))
+
+                # Old configs may still wait with a plain sleep.
+                if c.startswith('sleep '):
+                    with span(timeline, c, 'sleep'):
+                        time.sleep(float(c.split(' ')[-1]))
+                    continue
+
+                command_start = time.time()
+                command_cpu = cpu_time()
+                if c_type == "prep":
+                    proc = Popen(
+                            shlex.split(c), stdout=devnull, stderr=devnull,
+                            **session_args(isolated)
+                            )
+                    background.append(proc)
+                    if monitor:
+                        monitor.add(proc.pid, 'server')
+                else:
+                    stoppable = stop and c_type == 'mahimahi'
+                    proc = Popen(
+                            c, shell=True, stdout=devnull, stderr=devnull,
+                            **session_args(isolated or stoppable)
+                            )
+
+                processes.append(proc)
+                if timeline:
+                    timeline.add('spawn', 'spawn', command_start, time.time(),
+                            args={'command': c})
+                if monitor and c_type == 'mahimahi':
+                    monitor.add(proc.pid, 'sender')
+
+                # We run all 'prep' commands in the background,
+                # and wait for everything else to finish.
+                if c_type != 'prep':
+                    if stoppable:
+                        if wait_or_stop(proc, stop):
+                            print(" %s stopped early" % c_type)
+                    else:
+                        proc.wait()
+                    if timeline:
+                        timeline.add(_label(c), 'command', command_start, time.time(),
+                                cpu_time() - command_cpu, {'command': c, 'phase': c_type})
+            if monitor and c_type == 'mahimahi':
+                monitor.stop()
+            phase_times[c_type] = time.time() - start
+            if timeline:
+                timeline.add(c_type, 'phase', start, time.time(), cpu_time() - phase_cpu)
+
+    except KeyboardInterrupt:
+        pass
+
+    devnull.close()
+
+    # Attempt to kill all lingering processes
+    start = time.time()
+    teardown_cpu = cpu_time()
+    for p in processes:
+        if p:
+            try:
+                if isolated:
+                    os.killpg(p.pid, signal.SIGKILL)
+                else:
+                    p.kill()
+            except OSError:
+                pass
+            p.wait()
+
+    # The next cell may reuse our ports.
+    for port, proto in ports:
+        if not wait_for(lambda: not port_bound(port, proto), RELEASE_TIMEOUT):
+            print(" %s port %d still bound after cleanup" % (proto, port))
+    phase_times['teardown'] = time.time() - start
+    if timeline:
+        timeline.add('teardown', 'phase', start, time.time(), cpu_time() - teardown_cpu)
+
+    if verbose:
+        print(" phase times: %s" % format_phase_times(phase_times))
+    return phase_times
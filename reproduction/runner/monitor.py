@@ -0,0 +1,251 @@
+#
+# Samples the CPU use of a cell's processes from /proc.
+#
+# While the mahimahi phase runs, a background thread
+# periodically reads /proc/<pid>/stat, status and schedstat
+# for every process descended from the commands run_cmds
+# started, and /proc/stat for the whole host. Processes are
+# grouped by role, from their command lines: the "emulator"
+# (mm-delay, mm-link), the "sender" (what runs inside the
+# emulator), the "server" (descendants of prep commands) and
+# "helper" processes run alongside the emulator, such as a
+# log compressor. "sh -c" wrappers are left out. A run is
+# suspect when a single emulator or sender process used more
+# than a threshold fraction of a core, since it may have
+# fallen behind real time and skewed the results.
+#
+
+import json
+import os
+import threading
+import time
+
+EMULATOR_COMMANDS = ['mm-delay', 'mm-link']
+ROLES = ['emulator', 'sender', 'server', 'helper']
+
+# Shells that only wrap the commands they run with -c.
+SHELLS = ['sh', 'bash', 'dash']
+
+# Roles whose saturation makes a run suspect.
+CRITICAL_ROLES = ['emulator', 'sender']
+
+# A role is saturated if it passed the threshold in more than
+# this fraction of the samples, so a busy moment at startup
+# does not make a run suspect.
+SATURATED_FRACTION = 0.05
+
+CLOCK_TICKS = float(os.sysconf('SC_CLK_TCK')) if hasattr(os, 'sysconf') else 100.0
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+def read_stat(pid):
+    """Returns (comm, ppid, cpu seconds) of PID, or None if it is gone."""
+    text = _read('/proc/%d/stat' % pid)
+    if text is None:
+        return None
+    comm = text[text.index('(') + 1:text.rindex(')')]
+    fields = text[text.rindex(')') + 2:].split()
+    return comm, int(fields[1]), (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+def read_cmdline(pid):
+    """Returns the command line of PID as a list, empty if it is gone."""
+    text = _read('/proc/%d/cmdline' % pid) or ''
+    return [arg for arg in text.split('\0') if arg]
+
+def classify(cmdline, role, in_emulator):
+    """Returns the role of a process running CMDLINE, descended
+    from a command run as ROLE, and from an emulator process if
+    IN_EMULATOR, or None for a shell wrapper.
+    """
+    name = os.path.basename(cmdline[0]) if cmdline else ''
+    if name in SHELLS and '-c' in cmdline[1:2]:
+        return None
+    if role == 'server':
+        return 'server'
+    if name in EMULATOR_COMMANDS:
+        return 'emulator'
+    return 'sender' if in_emulator else 'helper'
+
+def read_switches(pid):
+    """Returns PID's (voluntary, involuntary) context switches."""
+    text = _read('/proc/%d/status' % pid) or ''
+    counts = {}
+    for line in text.splitlines():
+        if 'ctxt_switches:' in line:
+            name, _, value = line.partition(':')
+            counts[name] = int(value)
+    return (counts.get('voluntary_ctxt_switches', 0),
+            counts.get('nonvoluntary_ctxt_switches', 0))
+
+def read_run_delay(pid):
+    """Returns the seconds PID has spent waiting for a CPU."""
+    text = _read('/proc/%d/schedstat' % pid)
+    if not text:
+        return 0.0
+    return int(text.split()[1]) / 1e9
+
+def read_host_cpu():
+    """Returns (busy, total) CPU seconds of the host."""
+    text = _read('/proc/stat') or 'cpu 0 0 0 0'
+    ticks = [int(x) for x in text.splitlines()[0].split()[1:]]
+    idle = sum(ticks[3:5])
+    return (sum(ticks) - idle) / CLOCK_TICKS, sum(ticks) / CLOCK_TICKS
+
+def process_table():
+    """Returns a dict of pid to (comm, ppid, cpu seconds)."""
+    table = {}
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            stat = read_stat(int(name))
+            if stat is not None:
+                table[int(name)] = stat
+    return table
+
+class ProcessMonitor:
+
+    def __init__(self, interval=0.5, threshold=0.9):
+        """Monitor sampling every INTERVAL seconds, which flags runs
+        where an emulator or sender process used more than
+        THRESHOLD of a core over a sample.
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.roots = {}
+        self.samples = []
+        self._last = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, pid, role):
+        """Monitors PID, and all of its descendants, as ROLE.
+
+        Descendants of an emulator command are classified by
+        command line: mm-delay and mm-link are the emulator,
+        what runs inside them the sender, and the rest helpers.
+        """
+        with self._lock:
+            self.roots[pid] = role
+
+    def start(self):
+        """Starts sampling in the background."""
+        if not os.path.isdir('/proc/self'):
+            return
+        self._stop.clear()
+        self._last = self._snapshot()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Takes a last sample and stops sampling."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _roles(self, table):
+        with self._lock:
+            roots = dict(self.roots)
+        children = {}
+        for pid, (_, ppid, _) in table.items():
+            children.setdefault(ppid, []).append(pid)
+
+        roles = {}
+        for root, role in roots.items():
+            stack = [(root, False)]
+            while stack:
+                pid, in_emulator = stack.pop()
+                if pid not in table:
+                    continue
+                r = classify(read_cmdline(pid), role, in_emulator)
+                if r is not None:
+                    roles[pid] = r
+                in_emulator = in_emulator or r == 'emulator'
+                stack.extend((c, in_emulator) for c in children.get(pid, []))
+        return roles
+
+    def _snapshot(self):
+        table = process_table()
+        procs = {}
+        for pid, role in self._roles(table).items():
+            procs[pid] = (role, table[pid][2], read_switches(pid), read_run_delay(pid))
+        return time.time(), read_host_cpu(), procs
+
+    def _sample(self):
+        now, host, procs = self._snapshot()
+        last_time, last_host, last_procs = self._last
+        self._last = (now, host, procs)
+        elapsed = now - last_time
+        if elapsed <= 0:
+            return
+
+        sample = {'time': now, 'host_cpu': 0.0}
+        if host[1] > last_host[1]:
+            sample['host_cpu'] = (host[0] - last_host[0]) / (host[1] - last_host[1])
+        for role in ROLES:
+            sample[role] = {'cpu': 0.0, 'busiest_cpu': 0.0, 'voluntary_switches': 0,
+                    'involuntary_switches': 0, 'run_delay': 0.0, 'processes': 0}
+        for pid, (role, cpu, switches, run_delay) in procs.items():
+            s = sample[role]
+            s['processes'] += 1
+            if pid not in last_procs:
+                continue
+            _, last_cpu, last_switches, last_run_delay = last_procs[pid]
+            process_cpu = (cpu - last_cpu) / elapsed
+            s['cpu'] += process_cpu
+            s['busiest_cpu'] = max(s['busiest_cpu'], process_cpu)
+            s['voluntary_switches'] += switches[0] - last_switches[0]
+            s['involuntary_switches'] += switches[1] - last_switches[1]
+            s['run_delay'] += (run_delay - last_run_delay) / elapsed
+        self.samples.append(sample)
+
+    def peak_cpu(self, role, key='busiest_cpu'):
+        """Returns the highest CPU use (in cores) of the busiest
+        process of ROLE in a sample, or of all of them with KEY
+        'cpu'.
+        """
+        return max([s[role][key] for s in self.samples] or [0.0])
+
+    def saturated_fraction(self, role):
+        """Returns the fraction of samples in which a process of
+        ROLE passed the CPU threshold.
+        """
+        if not self.samples:
+            return 0.0
+        over = sum(1 for s in self.samples if s[role]['busiest_cpu'] > self.threshold)
+        return over / float(len(self.samples))
+
+    def suspect_roles(self):
+        """Returns the critical roles that were saturated."""
+        return [r for r in CRITICAL_ROLES
+                if self.saturated_fraction(r) > SATURATED_FRACTION]
+
+    def summary(self):
+        """Returns a dict summarizing the run, for the results."""
+        return {
+            'interval': self.interval,
+            'threshold': self.threshold,
+            'samples': len(self.samples),
+            'peak_cpu': dict((r, self.peak_cpu(r)) for r in ROLES),
+            'peak_total_cpu': dict((r, self.peak_cpu(r, 'cpu')) for r in ROLES),
+            'saturated_fraction': dict((r, self.saturated_fraction(r)) for r in ROLES),
+            'peak_host_cpu': max([s['host_cpu'] for s in self.samples] or [0.0]),
+            'suspect': self.suspect_roles(),
+        }
+
+    def save(self, path):
+        """Writes the summary and the time series to PATH as JSON."""
+        with open(path, 'w') as f:
+            json.dump({'summary': self.summary(), 'samples': self.samples}, f, indent=1)
@@ -0,0 +1,107 @@
+#
+# CPU placement profiles for experiment cells.
+#
+# A profile pins each role of a cell to a set of cores:
+# the "emulator" (mm-delay and mm-link), the "sender" run
+# inside the emulator, and the "server" started by the prep
+# commands. Cores are given either per cell, as offsets into
+# a block of "cores_per_cell" cores that every worker slot
+# gets to itself, or (with cores_per_cell 0) as absolute
+# core numbers shared by all cells. For example:
+#
+#   {"name": "dedicated", "cores_per_cell": 3,
+#    "roles": {"emulator": [0], "sender": [1], "server": [2]},
+#    "emulator_nice": -10}
+#
+# Pinning uses taskset and priority uses nice, which work
+# for any command and under Python 2. The sender runs inside
+# the emulator's command line, so it would inherit the
+# emulator's priority: its command resets the nice value to
+# that of the experiment. The resolved placement records the
+# nice value each role runs at under "nice".
+#
+
+import json
+import multiprocessing
+import os
+
+ROLES = ['emulator', 'sender', 'server']
+
+MIN_NICE = -20
+MAX_NICE = 19
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'placement')
+
+def load_profile(name):
+    """Returns the placement profile NAME, either a path to a JSON
+    file or the name of one under reproduction/placement/.
+    """
+    path = os.path.expanduser(name)
+    if not os.path.isfile(path):
+        path = os.path.join(PROFILE_DIR, name + '.json')
+    with open(path) as f:
+        profile = json.load(f)
+
+    unknown = set(profile.get('roles', {})) - set(ROLES)
+    if unknown:
+        raise ValueError("Unknown roles in placement profile: %s"
+                % ', '.join(sorted(unknown)))
+    return profile
+
+def resolve_placement(profile, slot=0):
+    """Returns the placement of the cell running in worker SLOT:
+    a dict of role to the list of cores it may use, plus the
+    emulator's nice value under "emulator_nice" if any, and the
+    nice value of each role under "nice".
+    """
+    per_cell = profile.get('cores_per_cell', 0)
+    base = slot * per_cell
+    cpus = multiprocessing.cpu_count()
+
+    placement = {'profile': profile.get('name')}
+    for role, cores in profile.get('roles', {}).items():
+        cores = [base + c for c in cores]
+        if per_cell and any(c >= base + per_cell for c in cores):
+            raise ValueError("Role %s uses cores outside its %d-core block"
+                    % (role, per_cell))
+        if max(cores) >= cpus:
+            raise ValueError("Placement of slot %d needs core %d, but this host has %d"
+                    % (slot, max(cores), cpus))
+        placement[role] = cores
+    base = os.nice(0)
+    placement['nice'] = dict((role, base) for role in ROLES)
+    if 'emulator_nice' in profile:
+        placement['emulator_nice'] = profile['emulator_nice']
+        emulator = max(MIN_NICE, min(MAX_NICE, base + profile['emulator_nice']))
+        # Without privileges, nice cannot raise the priority.
+        if emulator < base and os.geteuid() != 0:
+            emulator = base
+        placement['nice']['emulator'] = emulator
+    return placement
+
+def max_jobs(profile):
+    """Returns how many cells can run at once on this host
+    without sharing cores, or None if the profile shares them.
+    """
+    per_cell = profile.get('cores_per_cell', 0)
+    if not per_cell:
+        return None
+    return max(1, multiprocessing.cpu_count() // per_cell)
+
+def command_prefix(placement, role):
+    """Returns the prefix that runs a command as ROLE under
+    PLACEMENT (which may be None). The sender's command is run
+    by the shell inside the emulator.
+    """
+    if not placement:
+        return ''
+    prefix = ''
+    if placement.get('emulator_nice') is not None:
+        if role == 'emulator':
+            prefix += 'nice -n %d ' % placement['emulator_nice']
+        elif role == 'sender':
+            # Back from the emulator's nice value to the experiment's.
+            prefix += 'nice -n $((%d - $(nice))) ' % placement['nice']['sender']
+    if placement.get(role):
+        prefix += 'taskset -c %s ' % ','.join(map(str, placement[role]))
+    return prefix
@@ -0,0 +1,152 @@
+#
+# Runs independent experiment cells concurrently.
+#
+# A cell is one (scheme, trace, iteration) combination of
+# an experiment. Each worker owns a "slot", which the cell
+# uses to pick a port range that does not collide with
+# cells running on the other workers.
+#
+
+from collections import namedtuple
+
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Number of ports reserved for each worker slot. Cells
+# running in slot N offset their protocol ports by
+# N * PORT_STRIDE.
+PORT_STRIDE = 10
+
+Cell = namedtuple('Cell', ['name', 'func', 'kind'])
+Cell.__new__.__defaults__ = ('cell',)
+CellTiming = namedtuple('CellTiming', ['name', 'slot', 'wall_time', 'error'])
+
+def port_offset(slot):
+    """Returns the port offset reserved for worker SLOT."""
+    return slot * PORT_STRIDE
+
+def _call(cell, slot, timeline):
+    if timeline is None:
+        return cell.func(slot)
+    timeline.bind(slot, cell.name)
+    with timeline.span(cell.name, cell.kind, {'slot': slot}):
+        return cell.func(slot)
+
+def _run_one(cell, slot, timeline=None):
+    start = time.time()
+    error = None
+    result = None
+    try:
+        result = _call(cell, slot, timeline)
+    except Exception as e:
+        print(" cell %s failed: %s" % (cell.name, e))
+        error = e
+    return result, CellTiming(cell.name, slot, time.time() - start, error)
+
+def _report(cell, result, timing, on_done, on_error):
+    if timing.error is None:
+        if on_done:
+            on_done(cell, result)
+    elif on_error:
+        on_error(cell, timing.error)
+
+def run_cells(cells, jobs=1, on_done=None, more=None, timeline=None, on_error=None):
+    """Runs CELLS, at most JOBS at a time.
+
+    Each cell's func is called with the slot of the worker
+    running it. ON_DONE, if given, is called from the calling
+    thread as on_done(cell, result) after every cell finishes,
+    in completion order, so callers can print and collect
+    results without locking. A cell that raises is reported
+    to ON_ERROR instead, as on_error(cell, error).
+
+    Args:
+        cells: (list) Cell tuples to run.
+        jobs: (int) maximum number of cells to run at once.
+        on_done: (callable) completion callback.
+        more: (callable) if given, called as more(n) from the
+              calling thread whenever N workers are idle, after
+              on_done; returns a list of further cells to run,
+              so callers can decide what to run next from the
+              results so far.
+        timeline: (Timeline) if given, every cell is recorded
+              on it, in the row of its slot.
+        on_error: (callable) failure callback.
+
+    Returns:
+        list of CellTiming, in the order the cells were started.
+    """
+    cells = list(cells)
+    if more is None:
+        jobs = min(jobs, len(cells))
+    jobs = max(1, jobs)
+    if more and len(cells) < jobs:
+        cells.extend(more(jobs - len(cells)))
+    timings = [None] * len(cells)
+
+    if jobs == 1:
+        i = 0
+        while i < len(cells):
+            result, timings[i] = _run_one(cells[i], 0, timeline)
+            _report(cells[i], result, timings[i], on_done, on_error)
+            i += 1
+            if more and i == len(cells):
+                new_cells = more(1)
+                cells.extend(new_cells)
+                timings.extend([None] * len(new_cells))
+        return timings
+
+    pending = queue.Queue()
+    finished = queue.Queue()
+    for i, cell in enumerate(cells):
+        pending.put((i, cell))
+
+    def worker(slot):
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            i, cell = item
+            result, timing = _run_one(cell, slot, timeline)
+            finished.put((i, cell, result, timing))
+
+    threads = [threading.Thread(target=worker, args=(slot,))
+               for slot in range(jobs)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+
+    outstanding = len(cells)
+    while outstanding:
+        i, cell, result, timing = finished.get()
+        outstanding -= 1
+        timings[i] = timing
+        _report(cell, result, timing, on_done, on_error)
+        if more and outstanding < jobs:
+            for new_cell in more(jobs - outstanding):
+                pending.put((len(cells), new_cell))
+                cells.append(new_cell)
+                timings.append(None)
+                outstanding += 1
+
+    for _ in threads:
+        pending.put(None)
+    for t in threads:
+        t.join()
+
+    return timings
+
+def print_timings(timings):
+    """Prints the per-cell wall time report for TIMINGS."""
+    print("\n ---- Cell wall times ---- \n")
+    total = 0.0
+    for t in timings:
+        total += t.wall_time
+        status = '' if t.error is None else '  FAILED: %s' % t.error
+        print("   %-60s %8.1f s  (slot %d)%s" % (t.name, t.wall_time, t.slot, status))
+    print("\n   total cell time: %.1f s\n" % total)
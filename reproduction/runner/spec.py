@@ -0,0 +1,137 @@
+#
+# Declarative experiment specs.
+#
+# A spec is a YAML file declaring the matrix of an
+# experiment: schemes x uplink traces x downlink traces x
+# one-way delays x queue arguments x repetitions. See
+# specs/ for examples. Traces are names in one of the trace
+# directories or paths; a downlink may instead be a fixed
+# bandwidth, {bandwidth: 48}, for which a trace matching
+# the length of the uplink is generated. Queue arguments
+# are per scheme: a list of variants, each either a dict
+# of arguments merged into the scheme's uplink_queue_args
+# or a complete args string, with null for the scheme's
+# own config.
+#
+# expand_spec() turns a spec into its cells; experiment.py
+# compiles them into a TaskGraph with the shared stages
+# they need.
+#
+
+from collections import namedtuple
+
+import itertools
+import os
+import yaml
+
+from protocols.utils import load_config
+from runner.sweep import merge_queue_args
+from tracelib.index import TRACE_DIRS
+
+SPEC_KEYS = ['name', 'schemes', 'uplinks', 'downlinks', 'delays', 'queue_args',
+        'repetitions', 'trace_dirs']
+
+SpecCell = namedtuple('SpecCell', [
+        'scheme',
+        'uplink',         # path of the uplink trace
+        'downlink',       # path of the downlink trace
+        'bandwidth',      # (Mbits/s) if the downlink is generated, else None
+        'delay',          # (ms) one-way mm-delay
+        'queue_label',    # name of the queue args variant, '' for the default
+        'queue_args',     # uplink_queue_args override, or None
+        'iteration',      # from 1
+        'figure'          # results/ and logs/ subdirectory of the cell
+])
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+def load_spec(path):
+    """Loads the experiment spec at PATH, filling in defaults."""
+    with open(os.path.expanduser(path)) as f:
+        spec = yaml.safe_load(f)
+    if not isinstance(spec, dict):
+        raise ValueError("Experiment spec must be a mapping: %s" % path)
+
+    unknown = set(spec) - set(SPEC_KEYS)
+    if unknown:
+        raise ValueError("Unknown keys in experiment spec: %s" % ', '.join(sorted(unknown)))
+    for key in ['schemes', 'uplinks', 'downlinks']:
+        if not spec.get(key):
+            raise ValueError("Experiment spec needs '%s'" % key)
+
+    spec.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    spec.setdefault('delays', [50])
+    spec.setdefault('queue_args', {})
+    spec.setdefault('repetitions', 1)
+    spec.setdefault('trace_dirs', TRACE_DIRS)
+    for key in ['schemes', 'uplinks', 'downlinks', 'delays', 'trace_dirs']:
+        spec[key] = _as_list(spec[key])
+    if spec['repetitions'] < 1:
+        raise ValueError("Experiment spec needs at least one repetition")
+    return spec
+
+def resolve_trace(name, trace_dirs):
+    """Returns the path of the trace NAME: NAME itself if it is a
+    file, or else NAME in the first of TRACE_DIRS that has it.
+    """
+    if os.path.isfile(os.path.expanduser(name)):
+        return name
+    for directory in trace_dirs:
+        path = os.path.join(directory, name)
+        if os.path.isfile(os.path.expanduser(path)):
+            return path
+    raise ValueError("Trace %s not found in %s" % (name, ', '.join(trace_dirs)))
+
+def bandwidth_trace_path(uplink, bandwidth, directory):
+    """Returns where the BANDWIDTH Mbits/s trace matching the
+    length of UPLINK is generated, in DIRECTORY.
+    """
+    return os.path.join(directory, '%s.bw%g.mahi' % (os.path.basename(uplink), bandwidth))
+
+def queue_variants(spec, scheme):
+    """Returns the (label, uplink_queue_args or None) variants of
+    SCHEME's queue in SPEC.
+    """
+    variants = []
+    for v in spec['queue_args'].get(scheme) or [None]:
+        if v is None:
+            variants.append(('', None))
+        elif isinstance(v, dict):
+            label = '-'.join('%s=%s' % (n, v[n]) for n in sorted(v))
+            base_args = load_config(scheme)['uplink_queue_args']
+            variants.append((label, merge_queue_args(base_args, v)))
+        else:
+            variants.append((str(v).replace(',', '-'), str(v)))
+    return variants
+
+def expand_spec(spec, bw_trace_dir, tiny=False):
+    """Returns the SpecCells of SPEC, in run order.
+
+    Args:
+        bw_trace_dir: where to generate bandwidth downlinks
+        tiny: use the -tiny version of every trace
+    """
+    suffix = '-tiny' if tiny else ''
+    uplinks = [resolve_trace(u + suffix, spec['trace_dirs']) for u in spec['uplinks']]
+
+    cells = []
+    for scheme, uplink, downlink, delay in itertools.product(
+            spec['schemes'], uplinks, spec['downlinks'], spec['delays']):
+        bandwidth = None
+        if isinstance(downlink, dict):
+            bandwidth = downlink['bandwidth']
+            downlink = bandwidth_trace_path(uplink, bandwidth, bw_trace_dir)
+        else:
+            downlink = resolve_trace(downlink + suffix, spec['trace_dirs'])
+
+        for label, queue_args in queue_variants(spec, scheme):
+            parts = [spec['name']]
+            if len(spec['delays']) > 1:
+                parts.append('delay%d' % delay)
+            if label:
+                parts.append(label)
+            for i in range(1, spec['repetitions'] + 1):
+                cells.append(SpecCell(scheme, uplink, downlink, bandwidth, delay,
+                        label, queue_args, i, os.path.join(*parts)))
+    return cells
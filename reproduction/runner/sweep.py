@@ -0,0 +1,232 @@
+#!/usr/bin/python
+
+#
+# Sweeps a scheme's queue arguments (e.g. ABC's qdelay_ref,
+# beta, packets, window and delta) and summarizes the
+# utilization/delay trade-off of every setting.
+#
+# A sweep spec is a JSON file naming the scheme, the traces,
+# the one-way delay and either a "grid" of values for each
+# argument or a "random" search over ranges; see sweeps/
+# for examples. Each setting becomes a CCProtocol variant
+# whose uplink_queue_args override the scheme's config.
+# Variants run in parallel, either in mahimahi or in the
+# simulator, and their results are collected into one
+# columnar table along with its Pareto frontier.
+#
+
+from collections import OrderedDict, namedtuple
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from analysis.mm_log import load_results
+from analysis.stats import experiment_stats
+from protocols.utils import get_protocol, load_config
+from runner.commands import run_cmds
+from runner.scheduler import Cell, run_cells, port_offset
+from sim.queues import parse_queue_args
+
+METRICS = ['util', 'delay', 'throughput', 'power', 'queuing_delay']
+
+Variant = namedtuple('Variant', ['label', 'params', 'queue_args'])
+
+def load_spec(spec_path):
+    """Loads a sweep spec, filling in defaults."""
+    with open(spec_path) as f:
+        spec = json.load(f)
+    spec.setdefault('name', os.path.splitext(os.path.basename(spec_path))[0])
+    spec.setdefault('scheme', 'abc')
+    spec.setdefault('uplink', '~/ABC-1/mahimahi/traces/Verizon-LTE-short.up')
+    spec.setdefault('downlink', '~/ABC-1/reproduction/traces/bw48-fixed.mahi')
+    spec.setdefault('delay', 50)
+    if ('grid' in spec) == ('random' in spec):
+        raise ValueError("Sweep spec needs exactly one of 'grid' or 'random'")
+    return spec
+
+def expand_params(spec):
+    """Returns the list of {argument: value} settings in SPEC."""
+    if 'grid' in spec:
+        names = sorted(spec['grid'])
+        values = [spec['grid'][n] for n in names]
+        return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+    rand = random.Random(spec['random'].get('seed'))
+    ranges = spec['random']['ranges']
+    names = sorted(ranges)
+    return [dict((n, rand.randint(ranges[n][0], ranges[n][1])) for n in names)
+            for _ in range(spec['random']['samples'])]
+
+def merge_queue_args(base_args, params):
+    """Returns BASE_ARGS (a mahimahi queue args string) with the
+    values in PARAMS replacing or extending its arguments.
+    """
+    merged = OrderedDict(parse_queue_args(base_args))
+    for name in sorted(params):
+        merged[name] = params[name]
+    return ','.join('%s=%d' % (n, v) for n, v in merged.items())
+
+def expand_spec(spec):
+    """Expands SPEC into the list of Variants to run."""
+    base_args = spec.get('base_queue_args')
+    if base_args is None:
+        base_args = load_config(spec['scheme'])['uplink_queue_args']
+
+    variants = []
+    for params in expand_params(spec):
+        label = '-'.join('%s=%d' % (n, params[n]) for n in sorted(params))
+        variants.append(Variant(label, params, merge_queue_args(base_args, params)))
+    return variants
+
+def _simulate_variant(task):
+    from sim.simulate import simulate
+    scheme, uplink, downlink, delay, queue_args = task
+    return simulate(scheme, os.path.expanduser(uplink), os.path.expanduser(downlink),
+            delay, queue_args=queue_args).stats
+
+def run_sim(spec, variants, jobs):
+    """Runs VARIANTS in the simulator, JOBS processes at a time.
+
+    Returns:
+        list of Stats, in the order of VARIANTS.
+    """
+    tasks = [(spec['scheme'], spec['uplink'], spec['downlink'], spec['delay'],
+              v.queue_args) for v in variants]
+    if jobs == 1:
+        return [_simulate_variant(t) for t in tasks]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        return pool.map(_simulate_variant, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+def run_mahimahi(spec, variants, jobs, verbose=False):
+    """Runs VARIANTS as mahimahi experiment cells, JOBS at a time.
+
+    Returns:
+        list of Stats (None for variants without results), in
+        the order of VARIANTS.
+    """
+    uplink_ext = os.path.basename(spec['uplink'])
+    downlink_ext = os.path.basename(spec['downlink'])
+    graph_args = argparse.Namespace(print_graph=False, live_analysis=False,
+            keep_log=False, steady_state=False, profile_dir=None)
+    results = [None] * len(variants)
+
+    def make_cell(i, variant):
+        def run(slot):
+            protocol = get_protocol(spec['scheme'], uplink_ext, downlink_ext,
+                    figure=os.path.join('sweep', spec['name'], variant.label),
+                    port_offset=port_offset(slot),
+                    overrides={'uplink_queue_args': variant.queue_args})
+            cmds = protocol.get_figure2_cmds(spec['delay'], spec['uplink'],
+                    spec['downlink'], graph_args)
+            run_cmds(cmds, verbose, jobs > 1)
+            return protocol
+        return Cell(str(i), run)
+
+    def on_done(cell, protocol):
+        if os.path.isfile(protocol.results_file_path):
+            results[int(cell.name)] = experiment_stats(
+                    load_results(protocol.results_file_path), 2 * spec['delay'],
+                    uplink_ext, downlink_ext)
+
+    run_cells([make_cell(i, v) for i, v in enumerate(variants)], jobs, on_done)
+    return results
+
+def pareto_frontier(delay, util):
+    """Returns a boolean mask of the points not dominated by
+    another point with lower (or equal) delay and higher
+    utilization.
+    """
+    order = np.lexsort((-util, delay))
+    sorted_util = util[order]
+    best_before = np.r_[-np.inf, np.maximum.accumulate(sorted_util)[:-1]]
+    mask = np.zeros(len(util), dtype=bool)
+    mask[order] = sorted_util > best_before
+    return mask
+
+def make_table(variants, results):
+    """Collects VARIANTS and their Stats RESULTS into a table.
+
+    Returns:
+        OrderedDict mapping column names to NumPy arrays, one
+        row per variant that produced results.
+    """
+    rows = [(v, s) for v, s in zip(variants, results) if s is not None]
+    names = sorted(set(n for v, _ in rows for n in v.params))
+
+    table = OrderedDict()
+    table['variant'] = np.array([v.label for v, _ in rows])
+    for n in names:
+        table[n] = np.array([v.params.get(n, 0) for v, _ in rows], dtype=np.int64)
+    for m in METRICS:
+        table[m] = np.array([getattr(s, m) for _, s in rows], dtype=np.float64)
+    if rows:
+        table['pareto'] = pareto_frontier(table['delay'], table['util'])
+    else:
+        table['pareto'] = np.zeros(0, dtype=bool)
+    return table
+
+def save_table(table, path):
+    """Writes TABLE to PATH as CSV with a header row."""
+    with open(path, 'w') as f:
+        f.write(', '.join(table) + '\n')
+        for i in range(len(table['variant'])):
+            f.write(', '.join(str(col[i]) for col in table.values()) + '\n')
+
+def print_summary(table):
+    """Prints the Pareto frontier and the best-power setting."""
+    if not len(table['variant']):
+        print("No results.")
+        return
+
+    frontier = np.flatnonzero(table['pareto'])
+    frontier = frontier[np.argsort(table['delay'][frontier])]
+    print("\n ---- Pareto frontier (%d of %d settings) ---- \n"
+            % (len(frontier), len(table['variant'])))
+    for i in frontier:
+        print("   %-50s util %5.1f%%  delay %6.1f ms  power %6.2f" % (
+            table['variant'][i], 100 * table['util'][i], table['delay'][i],
+            table['power'][i]))
+
+    best = int(np.argmax(table['power']))
+    print("\n   best power: %s (%.2f)\n" % (table['variant'][best], table['power'][best]))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(dest='spec', help='JSON sweep spec', type=str)
+    parser.add_argument('--backend', default='sim', choices=['sim', 'mahimahi'],
+        help='run variants in the simulator or in mahimahi')
+    parser.add_argument('--jobs', default=1, type=int,
+        help='number of variants to run at the same time')
+    parser.add_argument('--csv-out', default=None, type=str,
+        help='save the results table to this CSV file')
+    parser.add_argument('--verbose', action='store_true',
+        help='be verbose during the experiment')
+    args = parser.parse_args()
+
+    spec = load_spec(args.spec)
+    variants = expand_spec(spec)
+    print(" ---- Sweep %s: %d settings of %s ---- \n"
+            % (spec['name'], len(variants), spec['scheme']))
+
+    if args.backend == 'sim':
+        results = run_sim(spec, variants, args.jobs)
+    else:
+        results = run_mahimahi(spec, variants, args.jobs, args.verbose)
+
+    table = make_table(variants, results)
+    print_summary(table)
+    if args.csv_out:
+        save_table(table, args.csv_out)
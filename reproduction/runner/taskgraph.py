@@ -0,0 +1,94 @@
+#
+# Graph of the tasks an experiment is made of.
+#
+# Besides its cells, an experiment has shared stages, such
+# as generating a bandwidth trace or indexing a trace, that
+# several cells depend on. Tasks are named by what they
+# produce, so adding a stage that is already in the graph
+# returns the existing task: every stage runs once, however
+# many cells need it. run_graph() runs the graph level by
+# level, each level with the cell scheduler.
+#
+
+from collections import OrderedDict
+
+from runner.scheduler import Cell, CellTiming, run_cells
+
+class Task:
+
+    def __init__(self, name, func, deps=(), kind='cell'):
+        """A task NAME, run as FUNC(slot) once the tasks DEPS
+        have succeeded. KIND is 'stage' or 'cell'.
+        """
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.kind = kind
+
+class TaskGraph:
+
+    def __init__(self):
+        self.tasks = OrderedDict()
+
+    def add(self, name, func, deps=(), kind='cell'):
+        """Adds the task NAME, unless the graph already has it.
+
+        Returns:
+            the graph's task NAME.
+        """
+        if name not in self.tasks:
+            for d in deps:
+                if d not in self.tasks:
+                    raise ValueError("Task %s depends on unknown task %s" % (name, d))
+            self.tasks[name] = Task(name, func, deps, kind)
+        return self.tasks[name]
+
+    def stage(self, name, func, deps=()):
+        """Adds a shared stage; see add()."""
+        return self.add(name, func, deps, kind='stage')
+
+    def count(self, kind):
+        return sum(1 for t in self.tasks.values() if t.kind == kind)
+
+    def levels(self):
+        """Returns the tasks grouped into lists, each of which only
+        depends on tasks in earlier lists.
+        """
+        # Tasks can only depend on tasks added before them.
+        level = {}
+        for name, task in self.tasks.items():
+            level[name] = 1 + max([level[d] for d in task.deps] or [-1])
+        grouped = [[] for _ in range(1 + max(list(level.values()) or [-1]))]
+        for name, task in self.tasks.items():
+            grouped[level[name]].append(task)
+        return grouped
+
+def run_graph(graph, jobs=1, on_done=None, timeline=None):
+    """Runs the tasks of GRAPH, at most JOBS at a time.
+
+    A task whose dependencies did not all succeed is not run.
+    ON_DONE is called as in run_cells(), with a Cell named
+    after the task, for every task that succeeds. Tasks are
+    recorded on TIMELINE, if given.
+
+    Returns:
+        list of CellTiming, stages first.
+    """
+    failed = set()
+    timings = []
+    for level in graph.levels():
+        runnable = []
+        for task in level:
+            bad = [d for d in task.deps if d in failed]
+            if bad:
+                failed.add(task.name)
+                print(" skipping %s: %s failed" % (task.name, ', '.join(bad)))
+                timings.append(CellTiming(task.name, 0, 0.0,
+                        ValueError("dependency failed: %s" % ', '.join(bad))))
+            else:
+                runnable.append(Cell(task.name, task.func, task.kind))
+
+        level_timings = run_cells(runnable, jobs, on_done, timeline=timeline)
+        failed.update(t.name for t in level_timings if t.error is not None)
+        timings.extend(level_timings)
+    return timings
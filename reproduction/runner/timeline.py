@@ -0,0 +1,172 @@
+#
+# Per-phase profiling of experiment runs.
+#
+# With --profile, the experiment records on a Timeline the
+# wall and CPU time of every cell and stage, of each phase
+# run_cmds() runs for a cell (prep, ready, mahimahi, cleanup,
+# results, teardown), of each command in those phases and of
+# the process spawns. The timeline of a sweep is saved in
+# the Chrome trace event format, which chrome://tracing and
+# Perfetto open, with one row per worker slot.
+#
+# CPU times are those of the experiment process and of the
+# children it waited for: with more than one job, they
+# include the work of the cells running alongside.
+#
+# The Python parts of a run can also be profiled with
+# cProfile: the in-process steps such as the log analysis,
+# the sender when it is a Python script (abc/client.py), and
+# the figures plotting/render_all.py renders.
+#
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import cProfile
+import json
+import os
+import re
+import threading
+import time
+
+# A "python script.py" in a command, which cProfile can wrap.
+PYTHON_SCRIPT = re.compile(r'(^|\s)(python[0-9.]*)\s+(\S+\.py)(?=\s|$)')
+
+def cpu_time():
+    """Returns the CPU seconds used by this process and by the
+    children it waited for.
+    """
+    t = os.times()
+    return t[0] + t[1] + t[2] + t[3]
+
+def profile_path(directory, name):
+    """Returns the file the cProfile stats of NAME are saved to
+    under DIRECTORY.
+    """
+    return os.path.join(directory, re.sub(r'[^\w.-]+', '_', name) + '.prof')
+
+def profile_call(path, func, *args):
+    """Calls FUNC(*ARGS) under cProfile, saving the stats to PATH.
+
+    Returns:
+        what FUNC returned.
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        profiler.dump_stats(path)
+
+def profile_command(command, path):
+    """Returns COMMAND with the first Python script it runs run
+    under cProfile, saving the stats to PATH. Commands that run
+    no Python script are returned as they are.
+    """
+    return PYTHON_SCRIPT.sub(lambda m: '%s%s -m cProfile -o %s %s' % (
+            m.group(1), m.group(2), path, m.group(3)), command, count=1)
+
+@contextmanager
+def _unrecorded():
+    yield
+
+def span(timeline, name, category, args=None):
+    """Returns timeline.span(NAME, CATEGORY, ARGS), or a context
+    that records nothing if TIMELINE is None.
+    """
+    if timeline is None:
+        return _unrecorded()
+    return timeline.span(name, category, args)
+
+class Timeline:
+
+    def __init__(self, profile_dir=None):
+        """Timeline of a sweep. If PROFILE_DIR is given, Python
+        steps run through call() are profiled with cProfile, and
+        their stats saved there.
+        """
+        self.profile_dir = profile_dir
+        if profile_dir and not os.path.exists(profile_dir): os.makedirs(profile_dir)
+        self.origin = time.time()
+        self.events = []
+        # (wall, cpu, count) of each phase, over all cells.
+        self.totals = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def bind(self, slot, cell):
+        """Attributes what the calling thread records from now on
+        to CELL, run by worker SLOT.
+        """
+        self.local.slot = slot
+        self.local.cell = cell
+
+    def cell(self):
+        """Returns the cell the calling thread runs, if any."""
+        return getattr(self.local, 'cell', None)
+
+    def add(self, name, category, start, end, cpu=None, args=None):
+        """Records the span NAME of CATEGORY ("cell", "phase",
+        "command", ...) from START to END (time.time()), which
+        used CPU seconds.
+        """
+        args = dict(args or {})
+        if cpu is not None:
+            args['cpu_s'] = round(cpu, 6)
+        if self.cell() is not None:
+            args['cell'] = self.cell()
+        event = {'name': name, 'cat': category, 'ph': 'X',
+                 'pid': os.getpid(), 'tid': getattr(self.local, 'slot', 0),
+                 'ts': int((start - self.origin) * 1000000),
+                 'dur': int((end - start) * 1000000), 'args': args}
+        with self.lock:
+            self.events.append(event)
+            if category == 'phase':
+                wall, total_cpu, n = self.totals.get(name, (0.0, 0.0, 0))
+                self.totals[name] = (wall + end - start, total_cpu + (cpu or 0.0), n + 1)
+
+    @contextmanager
+    def span(self, name, category, args=None):
+        """Records the span NAME of CATEGORY, as long as the
+        context lasts.
+        """
+        start = time.time()
+        cpu = cpu_time()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, time.time(), cpu_time() - cpu, args)
+
+    def call(self, name, func):
+        """Calls FUNC, the Python step NAME, under cProfile if
+        Python steps are profiled.
+
+        Returns:
+            what FUNC returned.
+        """
+        if not self.profile_dir:
+            return func()
+        return profile_call(profile_path(self.profile_dir,
+                '%s.%s' % (self.cell() or 'sweep', name)), func)
+
+    def save(self, path):
+        """Saves the timeline to PATH in the Chrome trace event
+        format.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory): os.makedirs(directory)
+        with self.lock:
+            events = list(self.events)
+        slots = sorted(set(e['tid'] for e in events))
+        names = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': s,
+                  'args': {'name': 'slot %d' % s}} for s in slots]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': names + events, 'displayTimeUnit': 'ms'}, f)
+
+    def print_summary(self):
+        """Prints the wall and CPU time of each phase, summed
+        over the cells.
+        """
+        print("\n ---- Phase profile ---- \n")
+        for name, (wall, cpu, n) in self.totals.items():
+            print("   %-10s %8.1f s wall %8.1f s CPU  (%d runs)" % (name, wall, cpu, n))
+        print("")
@@ -0,0 +1,5 @@
+#
+# Trace-driven link simulator for evaluating
+# mahimahi queues offline, without root or a real
+# network stack.
+#
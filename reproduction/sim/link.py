@@ -0,0 +1,167 @@
+#
+# Trace-driven links, modelled on mahimahi's LinkQueue.
+#
+# A trace lists, one per line, the ms timestamps of
+# delivery opportunities for one PACKET_SIZE packet. The
+# link drains its queue byte by byte at each opportunity,
+# so several small packets (e.g. TCP acks) can share one.
+#
+
+from collections import deque
+
+import numpy as np
+
+from analysis.mm_log import ARRIVAL, DEPARTURE, OPPORTUNITY
+from sim.queues import PACKET_SIZE
+from tracelib.binary import load_timestamps
+
+def load_schedule(trace_path):
+    """Returns the delivery opportunities (ms) of a mahimahi
+    trace, text or binary, as a NumPy array.
+    """
+    schedule = load_timestamps(trace_path)
+    if not len(schedule):
+        raise ValueError("Empty trace: %s" % trace_path)
+    return schedule
+
+class EventRecorder:
+
+    # Number of events to buffer before handing them on.
+    FLUSH_EVENTS = 1 << 16
+
+    def __init__(self, analyzer, log=None):
+        """Records link events for a LogAnalyzer, and optionally
+        writes them to LOG (an open file) in mm-link format.
+        """
+        self.analyzer = analyzer
+        self.log = log
+        self.timestamps = []
+        self.codes = []
+        self.sizes = []
+        self.delays = []
+
+    def record(self, now, code, size, delay=0):
+        self.timestamps.append(now)
+        self.codes.append(code)
+        self.sizes.append(size)
+        self.delays.append(delay)
+        if len(self.timestamps) >= self.FLUSH_EVENTS:
+            self.flush()
+
+    def flush(self):
+        if not self.timestamps:
+            return
+        self.analyzer.feed_events(
+                np.array(self.timestamps, dtype=np.int64),
+                np.array(self.codes, dtype=np.int64),
+                np.array(self.sizes, dtype=np.int64),
+                np.array(self.delays, dtype=np.int64))
+        if self.log:
+            self._write_log()
+        self.timestamps, self.codes, self.sizes, self.delays = [], [], [], []
+
+    def _write_log(self):
+        lines = []
+        for t, c, s, d in zip(self.timestamps, self.codes, self.sizes, self.delays):
+            if c == ARRIVAL:
+                lines.append('%d + %d\n' % (t, s))
+            elif c == DEPARTURE:
+                lines.append('%d - %d %d\n' % (t, s, d))
+            else:
+                lines.append('%d # %d\n' % (t, s))
+        self.log.write(''.join(lines))
+
+class TraceLink:
+
+    def __init__(self, schedule, queue, repeat=True, recorder=None):
+        """A link that drains QUEUE at the opportunities in SCHEDULE.
+
+        Args:
+            schedule: (array) delivery opportunity timestamps (ms).
+            queue: a queue from sim.queues.
+            repeat: (bool) repeat the trace when it ends, like
+                    mm-link without --once.
+            recorder: (EventRecorder) receives arrivals, delivery
+                      opportunities and departures, if given.
+        """
+        self.schedule = [int(t) for t in schedule]
+        self.queue = queue
+        self.repeat = repeat
+        self.recorder = recorder
+
+        self.base_timestamp = 0
+        self.next_delivery = 0
+        self.finished = False
+
+        self.in_transit = None
+        self.in_transit_bytes_left = 0
+
+    def next_delivery_time(self):
+        if self.finished:
+            return None
+        return self.schedule[self.next_delivery] + self.base_timestamp
+
+    def enqueue(self, p, now):
+        """Called when packet P arrives at the link at time NOW."""
+        if self.recorder:
+            self.recorder.record(now, ARRIVAL, p.size)
+        p.arrival = now
+        self.queue.enqueue(p, now)
+
+    def _use_a_delivery_opportunity(self, when):
+        if self.recorder:
+            self.recorder.record(when, OPPORTUNITY, PACKET_SIZE)
+
+        self.next_delivery = (self.next_delivery + 1) % len(self.schedule)
+        if self.next_delivery == 0:
+            if self.repeat:
+                self.base_timestamp += self.schedule[-1]
+            else:
+                self.finished = True
+
+    def rationalize(self, now, deliver):
+        """Emulates the link up to time NOW, calling
+        deliver(packet, time) for every packet that leaves it.
+        """
+        queue = self.queue
+        while not self.finished and self.next_delivery_time() <= now:
+            this_delivery_time = self.next_delivery_time()
+            bytes_left = PACKET_SIZE
+            self._use_a_delivery_opportunity(this_delivery_time)
+
+            while bytes_left > 0:
+                if not self.in_transit_bytes_left:
+                    if queue.empty():
+                        queue.idle_opportunity(this_delivery_time)
+                        break
+                    self.in_transit = queue.dequeue(this_delivery_time)
+                    self.in_transit_bytes_left = self.in_transit.size
+
+                amount = min(bytes_left, self.in_transit_bytes_left)
+                self.in_transit_bytes_left -= amount
+                bytes_left -= amount
+
+                if self.in_transit_bytes_left == 0:
+                    p = self.in_transit
+                    if self.recorder:
+                        self.recorder.record(this_delivery_time, DEPARTURE,
+                                p.size, this_delivery_time - p.arrival)
+                    deliver(p, this_delivery_time)
+
+class DelayLine:
+
+    def __init__(self, delay):
+        """A fixed one-way delay (ms), like mm-delay."""
+        self.delay = delay
+        self.packets = deque()
+
+    def send(self, p, now):
+        self.packets.append((now + self.delay, p))
+
+    def receive(self, now):
+        """Returns the packets that come out of the line by NOW."""
+        out = []
+        packets = self.packets
+        while packets and packets[0][0] <= now:
+            out.append(packets.popleft()[1])
+        return out
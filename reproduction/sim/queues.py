@@ -0,0 +1,340 @@
+#
+# Python ports of the mahimahi packet queues used in our
+# experiments: droptail, CoDel, PIE and the ABC cellular
+# queue from mahimahi/src/packet/cellular_packet_queue.cc.
+#
+# Each queue mirrors the corresponding C++ class, with the
+# current time passed in explicitly instead of read from
+# the wall clock.
+#
+
+from collections import deque
+
+import math
+import random
+
+# Size of one delivery opportunity (max TUN payload).
+PACKET_SIZE = 1504
+
+DQ_COUNT_INVALID = -1
+
+def parse_queue_args(queue_args):
+    """Parses mahimahi queue args, e.g. "packets=100,beta=75",
+    into a dict of ints.
+    """
+    args = {}
+    for arg in queue_args.split(','):
+        if not arg.strip(): continue
+        name, value = arg.split('=')
+        args[name.strip()] = int(value)
+    return args
+
+class DropTailQueue(object):
+
+    def __init__(self, args):
+        """Drops arriving packets once the packet or byte limit is hit."""
+        self.packet_limit = args.get('packets', 0)
+        self.byte_limit = args.get('bytes', 0)
+        if not self.packet_limit and not self.byte_limit:
+            raise ValueError("Dropping queue must have a byte or packet limit.")
+
+        self.packets = deque()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self.packets)
+
+    def empty(self):
+        return not self.packets
+
+    def good_with(self, size_in_bytes, size_in_packets):
+        if self.byte_limit and size_in_bytes > self.byte_limit:
+            return False
+        if self.packet_limit and size_in_packets > self.packet_limit:
+            return False
+        return True
+
+    def accept(self, p):
+        self.bytes += p.size
+        self.packets.append(p)
+
+    def enqueue(self, p, now):
+        if self.good_with(self.bytes + p.size, len(self.packets) + 1):
+            self.accept(p)
+
+    def _dequeue(self):
+        p = self.packets.popleft()
+        self.bytes -= p.size
+        return p
+
+    def dequeue(self, now):
+        return self._dequeue()
+
+    def idle_opportunity(self, now):
+        """Called when a delivery opportunity finds the queue empty."""
+        pass
+
+class InfiniteQueue(DropTailQueue):
+
+    def __init__(self, args=None):
+        """Never drops; mm-link's default queue."""
+        self.packet_limit = 0
+        self.byte_limit = 0
+        self.packets = deque()
+        self.bytes = 0
+
+class CoDelQueue(DropTailQueue):
+
+    def __init__(self, args):
+        DropTailQueue.__init__(self, args)
+        self.target = args.get('target', 0)
+        self.interval = args.get('interval', 0)
+        if not self.target or not self.interval:
+            raise ValueError("CoDel queue must have target and interval arguments.")
+
+        self.first_above_time = 0
+        self.drop_next = 0
+        self.count = 0
+        self.lastcount = 0
+        self.dropping = False
+
+    def _dodequeue(self, now):
+        p = self._dequeue()
+        if self.empty():
+            self.first_above_time = 0
+            return p, False
+
+        ok_to_drop = False
+        if now - p.arrival < self.target or self.bytes <= PACKET_SIZE:
+            self.first_above_time = 0
+        elif self.first_above_time == 0:
+            self.first_above_time = now + self.interval
+        elif now >= self.first_above_time:
+            ok_to_drop = True
+        return p, ok_to_drop
+
+    def _control_law(self, t, count):
+        return t + int(self.interval / math.sqrt(count))
+
+    def dequeue(self, now):
+        p, ok_to_drop = self._dodequeue(now)
+
+        if self.dropping:
+            if not ok_to_drop:
+                self.dropping = False
+
+            while now >= self.drop_next and self.dropping:
+                # Like mahimahi, this drops the packet at the head
+                # of the queue but still delivers the first one.
+                _, ok = self._dodequeue(now)
+                self.count += 1
+                if not ok:
+                    self.dropping = False
+                else:
+                    self.drop_next = self._control_law(self.drop_next, self.count)
+        elif ok_to_drop:
+            self._dodequeue(now)
+            self.dropping = True
+            delta = self.count - self.lastcount
+            if delta > 1 and now - self.drop_next < 16 * self.interval:
+                self.count = delta
+            else:
+                self.count = 1
+            self.drop_next = self._control_law(now, self.count)
+            self.lastcount = self.count
+
+        return p
+
+class PIEQueue(DropTailQueue):
+
+    def __init__(self, args, seed=0):
+        DropTailQueue.__init__(self, args)
+        self.qdelay_ref = args.get('qdelay_ref', 0)
+        self.max_burst = args.get('max_burst', 0)
+        if not self.qdelay_ref or not self.max_burst:
+            raise ValueError("PIE AQM queue must have qdelay_ref and max_burst parameters")
+
+        self.alpha = 0.125
+        self.beta = 1.25
+        self.t_update = 30
+        self.dq_threshold = 16384
+        self.drop_prob = 0.0
+        self.burst_allowance = 0
+        self.qdelay_old = 0
+        self.current_qdelay = 0
+        self.dq_count = DQ_COUNT_INVALID
+        self.dq_tstamp = 0
+        self.avg_dq_rate = 0
+        self.last_update = 0
+        self.random = random.Random(seed)
+
+    def enqueue(self, p, now):
+        self._calculate_drop_prob(now)
+        if not self.good_with(self.bytes + p.size, len(self.packets) + 1):
+            return
+        if not self._drop_early():
+            self.accept(p)
+
+    def _drop_early(self):
+        if self.burst_allowance > 0:
+            return False
+        if self.qdelay_old < self.qdelay_ref // 2 and self.drop_prob < 0.2:
+            return False
+        if self.bytes < 2 * PACKET_SIZE:
+            return False
+        return self.random.random() < self.drop_prob
+
+    def dequeue(self, now):
+        p = self._dequeue()
+
+        if self.bytes >= self.dq_threshold and self.dq_count == DQ_COUNT_INVALID:
+            self.dq_tstamp = now
+            self.dq_count = 0
+
+        if self.dq_count != DQ_COUNT_INVALID:
+            self.dq_count += p.size
+
+            if self.dq_count > self.dq_threshold:
+                dtime = now - self.dq_tstamp
+                if dtime > 0:
+                    rate_sample = self.dq_count // dtime
+                    if self.avg_dq_rate == 0:
+                        self.avg_dq_rate = rate_sample
+                    else:
+                        self.avg_dq_rate = (self.avg_dq_rate - (self.avg_dq_rate >> 3)) + \
+                                (rate_sample >> 3)
+
+                    if self.bytes < self.dq_threshold:
+                        self.dq_count = DQ_COUNT_INVALID
+                    else:
+                        self.dq_count = 0
+                        self.dq_tstamp = now
+
+                    if self.burst_allowance > 0:
+                        self.burst_allowance = max(0, self.burst_allowance - dtime)
+
+        self._calculate_drop_prob(now)
+        return p
+
+    def _calculate_drop_prob(self, now):
+        # Catch up on the periodic updates missed since the last call.
+        while now - self.last_update > self.t_update:
+            update_prob = True
+            self.qdelay_old = self.current_qdelay
+
+            if self.avg_dq_rate > 0:
+                self.current_qdelay = self.bytes // self.avg_dq_rate
+            else:
+                self.current_qdelay = 0
+
+            if self.current_qdelay == 0 and self.bytes != 0:
+                update_prob = False
+
+            p = self.alpha * (self.current_qdelay - self.qdelay_ref) + \
+                    self.beta * (self.current_qdelay - self.qdelay_old)
+
+            if self.drop_prob < 0.01:
+                p /= 128
+            elif self.drop_prob < 0.1:
+                p /= 32
+            else:
+                p /= 16
+
+            self.drop_prob += p
+            if self.drop_prob < 0:
+                self.drop_prob = 0
+            elif self.drop_prob > 1:
+                self.drop_prob = 1
+                update_prob = False
+
+            if self.current_qdelay == 0 and self.qdelay_old == 0 and update_prob:
+                self.drop_prob *= 0.98
+
+            self.burst_allowance = max(0, self.burst_allowance - self.t_update)
+            self.last_update += self.t_update
+
+            if self.drop_prob == 0 and self.current_qdelay < self.qdelay_ref // 2 \
+                    and self.qdelay_old < self.qdelay_ref // 2 and self.avg_dq_rate > 0:
+                self.dq_count = DQ_COUNT_INVALID
+                self.avg_dq_rate = 0
+                self.burst_allowance = self.max_burst
+
+class CellularQueue(DropTailQueue):
+
+    # Default window (ms) over which dequeue rates are measured.
+    WINDOW = 20
+    # Default delta (ms); for stability, it should be greater
+    # than the max RTT.
+    DELTA = 100
+    MAX_CREDITS = 5
+
+    def __init__(self, args):
+        """ABC queue: marks each departing packet accelerate
+        or brake so that the sender tracks a target rate.
+        """
+        DropTailQueue.__init__(self, args)
+        self.qdelay_ref = args.get('qdelay_ref', 0)
+        self.beta = args.get('beta', 0) / 100.0
+        if not self.qdelay_ref or not self.beta:
+            raise ValueError("CELLULAR AQM queue must have qdelay_ref, beta")
+        self.window = args.get('window') or self.WINDOW
+        self.delta = float(args.get('delta') or self.DELTA)
+
+
+        self.observed_dq = deque([0])
+        self.real_dq = deque([0])
+        self.credits = 5.0
+
+    def _record(self, dq, now):
+        while now - dq[0] > self.window and len(dq) > 1 and now > dq[1]:
+            dq.popleft()
+        dq.append(now)
+
+    def idle_opportunity(self, now):
+        # mahimahi still calls dequeue on an empty cellular
+        # queue, which counts towards the real dequeue rate.
+        self._record(self.real_dq, now)
+
+    def dequeue(self, now):
+        self._record(self.real_dq, now)
+        p = self._dequeue()
+        self._record(self.observed_dq, now)
+
+        # Both windows hold at least two samples here, so
+        # the rates are never zero.
+        real_dq_rate = (len(self.real_dq) - 1) / float(self.window)
+        observed_dq_rate = (len(self.observed_dq) - 1) / float(self.window)
+
+        current_qdelay = (len(self.packets) + 1) / real_dq_rate
+        target_rate = 0.98 * real_dq_rate + self.beta * (real_dq_rate / self.delta) * \
+                min(0.0, self.qdelay_ref - current_qdelay)
+        credit_prob = target_rate / observed_dq_rate * 0.5
+
+        self.credits += max(0.0, min(1.0, credit_prob))
+        if self.credits > self.MAX_CREDITS:
+            self.credits = self.MAX_CREDITS
+
+        if self.credits > 1:
+            if not p.brake:
+                self.credits -= 1
+        else:
+            p.brake += 1
+        return p
+
+QUEUES = {
+    'infinite': InfiniteQueue,
+    'droptail': DropTailQueue,
+    'codel': CoDelQueue,
+    'pie': PIEQueue,
+    'cellular': CellularQueue,
+}
+
+def make_queue(name, queue_args):
+    """Returns the queue NAME ("infinite", "droptail", "codel",
+    "pie" or "cellular") configured from mahimahi QUEUE_ARGS.
+    """
+    if not name:
+        name = 'infinite'
+    if name not in QUEUES:
+        raise ValueError("Unknown queue: %s" % name)
+    return QUEUES[name](parse_queue_args(queue_args))
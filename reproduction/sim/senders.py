@@ -0,0 +1,154 @@
+#
+# Model senders and receivers for the simulator.
+#
+# ABCSender follows abc/client.py: it starts with a burst,
+# sends two packets for every accelerate echo, none for a
+# brake, and one after 100 ms of silence. RenoSender is a
+# Reno-style AIMD window, standing in for the loss-based
+# TCP schemes (cubic, cubiccodel, cubicpie).
+#
+
+# Size of the packets the ABC client sends (1472-byte UDP payload).
+ABC_PACKET_SIZE = 1500
+TCP_PACKET_SIZE = 1500
+TCP_ACK_SIZE = 40
+
+class Packet(object):
+
+    __slots__ = ('size', 'seq', 'sent', 'arrival', 'brake', 'lost_before')
+
+    def __init__(self, size, seq, sent):
+        self.size = size
+        self.seq = seq
+        self.sent = sent
+        self.arrival = sent
+        # Number of brake marks applied by an ABC queue.
+        self.brake = 0
+        # (acks) number of packets the receiver found missing.
+        self.lost_before = 0
+
+class ABCSender:
+
+    INITIAL_BURST = 30
+    TIMEOUT = 100
+
+    def __init__(self):
+        self.seq = 0
+        self.deadline = None
+        self.burst_left = self.INITIAL_BURST
+
+    def _send(self, now, send):
+        send(Packet(ABC_PACKET_SIZE, self.seq, now), now)
+        self.seq += 1
+
+    def tick(self, now, send):
+        """Called once every ms."""
+        if self.burst_left:
+            self._send(now, send)
+            self.burst_left -= 1
+            if not self.burst_left:
+                self.deadline = now + self.TIMEOUT
+        elif now >= self.deadline:
+            self._send(now, send)
+            self.deadline = now + self.TIMEOUT
+
+    def on_packet(self, p, now, send):
+        """Called when the echo of a packet comes back."""
+        if self.burst_left:
+            return
+        self.deadline = now + self.TIMEOUT
+        if not p.brake:
+            self._send(now, send)
+            self._send(now, send)
+
+class ABCReceiver:
+
+    def on_packet(self, p, now):
+        """Echoes every packet back, marks included (abc/server.py)."""
+        return [p]
+
+class RenoSender:
+
+    INITIAL_WINDOW = 10
+    MIN_RTO = 200
+
+    def __init__(self):
+        self.cwnd = float(self.INITIAL_WINDOW)
+        self.ssthresh = float('inf')
+        self.seq = 0
+        self.acked = 0
+        self.lost = 0
+        self.srtt = None
+        self.recovery_end = 0
+        self.last_ack = 0
+
+    def in_flight(self):
+        return self.seq - self.acked - self.lost
+
+    def _fill_window(self, now, send):
+        while self.in_flight() < int(self.cwnd):
+            send(Packet(TCP_PACKET_SIZE, self.seq, now), now)
+            self.seq += 1
+
+    def _rto(self):
+        if self.srtt is None:
+            return 1000
+        return max(self.MIN_RTO, 2 * self.srtt)
+
+    def tick(self, now, send):
+        """Called once every ms."""
+        if self.in_flight() and now - self.last_ack >= self._rto():
+            # Retransmission timeout: everything in flight is lost.
+            self.lost += self.in_flight()
+            self.ssthresh = max(self.cwnd / 2, 2.0)
+            self.cwnd = 1.0
+            self.recovery_end = now + self._rto()
+            self.last_ack = now
+        self._fill_window(now, send)
+
+    def on_packet(self, ack, now, send):
+        """Called when an ack comes back."""
+        self.acked += 1
+        self.lost += ack.lost_before
+        self.last_ack = now
+
+        rtt = now - ack.sent
+        self.srtt = rtt if self.srtt is None else 0.875 * self.srtt + 0.125 * rtt
+
+        if ack.lost_before and now >= self.recovery_end:
+            self.ssthresh = max(self.cwnd / 2, 2.0)
+            self.cwnd = self.ssthresh
+            self.recovery_end = now + self.srtt
+        elif self.cwnd < self.ssthresh:
+            self.cwnd += 1
+        else:
+            self.cwnd += 1 / self.cwnd
+
+        self._fill_window(now, send)
+
+class RenoReceiver:
+
+    def __init__(self):
+        self.expected = 0
+
+    def on_packet(self, p, now):
+        """Acks every packet, reporting any gap in sequence numbers."""
+        ack = Packet(TCP_ACK_SIZE, p.seq, p.sent)
+        ack.lost_before = max(0, p.seq - self.expected)
+        self.expected = max(self.expected, p.seq + 1)
+        return [ack]
+
+# Model sender/receiver pair for each scheme we can simulate.
+MODELS = {
+    'abc': (ABCSender, ABCReceiver),
+    'cubic': (RenoSender, RenoReceiver),
+    'cubiccodel': (RenoSender, RenoReceiver),
+    'cubicpie': (RenoSender, RenoReceiver),
+}
+
+def make_model(scheme):
+    """Returns a new (sender, receiver) pair modelling SCHEME."""
+    if scheme not in MODELS:
+        raise ValueError("No model sender for scheme: %s" % scheme)
+    sender_class, receiver_class = MODELS[scheme]
+    return sender_class(), receiver_class()
@@ -0,0 +1,138 @@
+#!/usr/bin/python
+
+#
+# Runs one experiment cell in the trace-driven simulator.
+#
+# Models the topology of our experiments,
+#
+#   sender -> uplink (trace, queue) -> mm-delay -> receiver
+#   sender <- downlink (trace) <- mm-delay <- receiver
+#
+# one ms at a time, and reports the same Stats that
+# experiment.py computes from a real mm-link log.
+#
+
+from collections import namedtuple
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from analysis.mm_log import LogAnalyzer
+from analysis.stats import experiment_stats
+from protocols.utils import load_config
+from sim.link import TraceLink, DelayLine, EventRecorder, load_schedule
+from sim.queues import make_queue, InfiniteQueue
+from sim.senders import make_model
+
+SimResult = namedtuple('SimResult', ['link_stats', 'stats', 'sim_time', 'wall_time'])
+
+def simulate(scheme, uplink_trace, downlink_trace, mm_delay,
+        queue=None, queue_args=None, duration=None, log=None):
+    """Simulates SCHEME over the given traces.
+
+    Args:
+        scheme: (str) scheme to model, e.g. abc or cubic.
+        uplink_trace: (str) path of the uplink (target link) trace.
+        downlink_trace: (str) path of the downlink trace.
+        mm_delay: (int) one-way delay (ms).
+        queue: (str) uplink queue; defaults to the scheme's config.
+        queue_args: (str) uplink queue args, e.g.
+                    "packets=100,qdelay_ref=50,beta=75"; defaults
+                    to the scheme's config.
+        duration: (int) stop after this many ms; defaults to the
+                  length of the uplink trace, like mm-link --once.
+        log: (file) if given, the uplink log is also written to it
+             in mm-link format.
+
+    Returns:
+        a SimResult.
+    """
+    start = time.time()
+
+    if queue is None or queue_args is None:
+        config = load_config(scheme)
+        if queue is None:
+            queue = config['uplink_queue']
+        if queue_args is None:
+            queue_args = config['uplink_queue_args']
+
+    analyzer = LogAnalyzer()
+    analyzer.base_timestamp = 0
+    recorder = EventRecorder(analyzer, log)
+    if log:
+        log.write('# base timestamp: 0\n')
+
+    uplink_schedule = load_schedule(uplink_trace)
+    uplink = TraceLink(uplink_schedule, make_queue(queue, queue_args),
+            repeat=False, recorder=recorder)
+    downlink = TraceLink(load_schedule(downlink_trace), InfiniteQueue())
+    forward = DelayLine(mm_delay)
+    reverse = DelayLine(mm_delay)
+    sender, receiver = make_model(scheme)
+
+    end = int(uplink_schedule[-1])
+    if duration is not None:
+        end = min(end, duration)
+
+    send = uplink.enqueue
+    on_ack = lambda p, now: sender.on_packet(p, now, send)
+
+    for now in range(end + 1):
+        uplink.rationalize(now, forward.send)
+        for p in forward.receive(now):
+            for r in receiver.on_packet(p, now):
+                reverse.send(r, now)
+        for p in reverse.receive(now):
+            downlink.enqueue(p, now)
+        downlink.rationalize(now, on_ack)
+        sender.tick(now, send)
+        if uplink.finished:
+            break
+
+    recorder.flush()
+    link_stats = analyzer.result()
+    stats = experiment_stats(link_stats, 2 * mm_delay,
+            os.path.basename(uplink_trace), os.path.basename(downlink_trace))
+
+    return SimResult(link_stats, stats, now / 1000.0, time.time() - start)
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scheme', default='abc', type=str,
+        help='scheme to simulate: abc, cubic, cubiccodel or cubicpie')
+    parser.add_argument('--uplink', required=True, type=str,
+        help='uplink (bottleneck) trace')
+    parser.add_argument('--downlink', required=True, type=str,
+        help='downlink trace')
+    parser.add_argument('--delay', default=50, type=int,
+        help='(ms) one-way delay')
+    parser.add_argument('--queue', default=None, type=str,
+        help='uplink queue, overriding the scheme config')
+    parser.add_argument('--queue-args', default=None, type=str,
+        help='uplink queue args, overriding the scheme config')
+    parser.add_argument('--duration', default=None, type=int,
+        help='(ms) stop the simulation early')
+    parser.add_argument('--log', default=None, type=str,
+        help='also write the uplink log to this file')
+    args = parser.parse_args()
+
+    log = open(args.log, 'w') if args.log else None
+    result = simulate(args.scheme, args.uplink, args.downlink, args.delay,
+            args.queue, args.queue_args, args.duration, log)
+    if log:
+        log.close()
+
+    s = result.stats
+    print("\n  ~~ Simulated results for protocol: %s ~~" % args.scheme)
+    print("\tutilization: %s%%" % str(round(100 * s.util, 2)))
+    print("\tthroughput: %s Mbps" % str(s.throughput))
+    print("\tsignal delay: %s ms" % str(s.delay))
+    print("\tqueuing delay: %s ms" % str(s.queuing_delay))
+    print("\tpower score: %s" % str(s.power))
+    print("\tavg capacity: %s Mbps" % str(result.link_stats.avg_capacity))
+    print("\tper-packet delay: %s ms" % str(s.per_packet_delay))
+    print("\tsimulated %.1f s in %.1f s\n" % (result.sim_time, result.wall_time))
@@ -0,0 +1,4 @@
+#
+# On-disk storage of experiment results for our
+# reproduction of the ABC paper.
+#
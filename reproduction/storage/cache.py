@@ -0,0 +1,204 @@
+#
+# Content-addressed cache of experiment results.
+#
+# A cell's key is a hash of everything that determines
+# its outcome: the resolved protocol config (including
+# queue args), the contents of both trace files, the
+# mm-delay, the experiment, the iteration and the options
+# that change how long the cell runs or which part of it is
+# analyzed (steady-state detection, warm-up, segments). A cell whose
+# key is already cached is restored instead of re-run, and
+# changing any input invalidates only the affected cells.
+#
+# Results are what the log analysis makes of a run, so the
+# key also covers the analyzer: a hash of the sources of the
+# analysis modules and of the trace modules the capacity
+# comes from, and ANALYZER_VERSION, to bump when the results
+# written change for any other reason.
+#
+# The cache keeps a copy of each results file (small) and
+# remembers where the matching mm-link log lives (large).
+# Old logs are evicted least recently used first once they
+# exceed a size budget; their results stay cached.
+#
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+
+INDEX_FILE = 'index.json'
+
+ANALYZER_VERSION = 1
+
+REPRODUCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules, relative to the reproduction directory, whose
+# changes change the results written for a run.
+ANALYZER_SOURCES = ['analysis/*.py', 'tracelib/index.py', 'tracelib/binary.py']
+
+_trace_hashes = {}
+
+def file_hash(path):
+    """Returns the SHA-1 of the contents of the file at PATH.
+
+    Hashes are memoized on (path, size, mtime), so a trace
+    shared by many cells is only read once.
+    """
+    path = os.path.expanduser(path)
+    st = os.stat(path)
+    memo_key = (path, st.st_size, st.st_mtime)
+    if memo_key not in _trace_hashes:
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        _trace_hashes[memo_key] = h.hexdigest()
+    return _trace_hashes[memo_key]
+
+def analyzer_version(root=REPRODUCTION_DIR):
+    """Returns the version of the analysis results come from:
+    ANALYZER_VERSION and a hash of the ANALYZER_SOURCES under
+    ROOT.
+    """
+    h = hashlib.sha1(str(ANALYZER_VERSION).encode('utf-8'))
+    for pattern in ANALYZER_SOURCES:
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            h.update(os.path.relpath(path, root).encode('utf-8'))
+            h.update(file_hash(path).encode('utf-8'))
+    return h.hexdigest()
+
+def cell_inputs(config, mm_delay, uplink_trace, downlink_trace, experiment, iteration=1,
+        run_options=None):
+    """Returns the dict of inputs that identify a cell.
+
+    RUN_OPTIONS is a dict of the options that change how long
+    the cell runs or which part of the run is analyzed.
+    """
+    return {
+        'config': config,
+        'mm_delay': mm_delay,
+        'uplink_trace': file_hash(uplink_trace),
+        'downlink_trace': file_hash(downlink_trace),
+        'experiment': experiment,
+        'iteration': iteration,
+        'run_options': run_options or {},
+        'analyzer': analyzer_version(),
+    }
+
+def cell_key(inputs):
+    """Returns the cache key for the cell INPUTS."""
+    encoded = json.dumps(inputs, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+class ResultCache:
+
+    def __init__(self, root='cache'):
+        """Opens (or creates) the result cache stored under ROOT."""
+        self.root = root
+        self.index_path = os.path.join(root, INDEX_FILE)
+        if not os.path.exists(root): os.makedirs(root)
+
+        self.index = {}
+        if os.path.isfile(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+
+    def _results_copy(self, key):
+        return os.path.join(self.root, key[:2], key + '.json')
+
+    def restore(self, key, results_file_path):
+        """Copies the cached results for KEY to RESULTS_FILE_PATH.
+
+        Returns:
+            True on a cache hit, False if the cell must be run.
+        """
+        entry = self.index.get(key)
+        if entry is None or not os.path.isfile(self._results_copy(key)):
+            return False
+
+        shutil.copyfile(self._results_copy(key), results_file_path)
+        entry['last_used'] = time.time()
+        return True
+
+    def store(self, key, inputs, results_file_path, log_file_path):
+        """Caches the results of a cell that was just run.
+
+        Returns:
+            True if the results were cached, False if the run
+            produced no results file.
+        """
+        if not os.path.isfile(results_file_path):
+            return False
+
+        copy = self._results_copy(key)
+        if not os.path.exists(os.path.dirname(copy)):
+            os.makedirs(os.path.dirname(copy))
+        shutil.copyfile(results_file_path, copy)
+
+        log_bytes = 0
+        if os.path.isfile(log_file_path):
+            log_bytes = os.path.getsize(log_file_path)
+
+        # The log path is named after the cell, so a re-run
+        # overwrites the log of any older entry for it.
+        for e in self.index.values():
+            if e['log_file'] == log_file_path:
+                e['log_file'] = None
+                e['log_bytes'] = 0
+
+        now = time.time()
+        self.index[key] = {
+            'inputs': inputs,
+            'results_file': results_file_path,
+            'log_file': log_file_path if log_bytes else None,
+            'log_bytes': log_bytes,
+            'created': now,
+            'last_used': now,
+        }
+        return True
+
+    def log_bytes(self):
+        """Returns the total size of the logs the cache tracks."""
+        return sum(e['log_bytes'] for e in self.index.values() if e['log_file'])
+
+    def evict_logs(self, max_bytes):
+        """Deletes least recently used logs until the logs tracked
+        by the cache take at most MAX_BYTES.
+
+        Returns:
+            list of deleted log paths.
+        """
+        total = self.log_bytes()
+        deleted = []
+        for e in sorted(self.index.values(), key=lambda e: e['last_used']):
+            if total <= max_bytes:
+                break
+            if not e['log_file']:
+                continue
+            if os.path.isfile(e['log_file']):
+                os.remove(e['log_file'])
+                deleted.append(e['log_file'])
+            total -= e['log_bytes']
+            e['log_file'] = None
+            e['log_bytes'] = 0
+        return deleted
+
+    def forget_logs(self, paths):
+        """Stops tracking the logs at PATHS, deleted by someone
+        else (see storage/retention.py).
+        """
+        paths = set(paths)
+        for e in self.index.values():
+            if e['log_file'] in paths:
+                e['log_file'] = None
+                e['log_bytes'] = 0
+
+    def save(self):
+        """Writes the cache index to disk."""
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        os.rename(tmp_path, self.index_path)
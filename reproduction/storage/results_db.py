@@ -0,0 +1,205 @@
+#
+# SQLite store of experiment results.
+#
+# Every run of a cell appends one row, with named and
+# typed columns, to the runs table. Plots and aggregation
+# scripts query it by experiment, scheme and traces instead
+# of parsing positional CSV lines or walking results/.
+#
+# The database uses SQLite's write-ahead log and a busy
+# timeout, so several experiment.py processes can append
+# to the same file at once.
+#
+
+from collections import namedtuple
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from analysis.sketch import DelaySketch
+
+DEFAULT_DB = 'results/results.db'
+
+# (name, SQL type) of each column, in order.
+COLUMNS = [
+    ('id', 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    ('run_id', 'TEXT'),
+    ('experiment', 'TEXT NOT NULL'),
+    ('scheme', 'TEXT NOT NULL'),
+    ('uplink_trace', 'TEXT'),
+    ('downlink_trace', 'TEXT'),
+    ('mm_delay', 'INTEGER'),
+    ('queue', 'TEXT'),
+    ('queue_args', 'TEXT'),
+    ('iteration', 'INTEGER'),
+    ('util', 'REAL'),
+    ('delay', 'REAL'),
+    ('throughput', 'REAL'),
+    ('power', 'REAL'),
+    ('queuing_delay', 'REAL'),
+    ('per_packet_delay', 'REAL'),
+    ('capacity', 'REAL'),
+    ('results_file', 'TEXT'),
+    ('results_sha1', 'TEXT'),
+    ('created', 'REAL'),
+    ('placement', 'TEXT'),
+    ('suspect', 'INTEGER'),
+    ('monitor', 'TEXT'),
+    ('delay_sketch', 'TEXT'),
+    ('cutoff', 'REAL'),
+    ('steady', 'INTEGER'),
+]
+
+Run = namedtuple('Run', [name for name, _ in COLUMNS])
+
+# Columns that identify a cell; the latest row of each cell
+# is its current result.
+CELL_COLUMNS = ['experiment', 'scheme', 'uplink_trace', 'downlink_trace',
+        'mm_delay', 'queue', 'queue_args', 'iteration']
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS runs (%s, UNIQUE (results_file, results_sha1))"
+            % ', '.join('%s %s' % c for c in COLUMNS),
+    "CREATE INDEX IF NOT EXISTS runs_scheme ON runs (scheme)",
+    "CREATE INDEX IF NOT EXISTS runs_traces ON runs (uplink_trace, downlink_trace)",
+    "CREATE INDEX IF NOT EXISTS runs_experiment ON runs (experiment, scheme)",
+]
+
+def run_sketch(run):
+    """Returns the DelaySketch of RUN's queueing delays, or None."""
+    if not run.delay_sketch:
+        return None
+    return DelaySketch.from_dict(json.loads(run.delay_sketch))
+
+def new_run_id():
+    """Returns an id for the runs of one experiment.py invocation."""
+    return '%s-%d' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid())
+
+def file_sha1(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+class ResultsDB:
+
+    def __init__(self, path=DEFAULT_DB, timeout=60):
+        """Opens (or creates) the results database at PATH.
+
+        Args:
+            timeout: (s) how long to wait for another process
+                     that is writing to the database
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory): os.makedirs(directory)
+
+        self.conn = sqlite3.connect(path, timeout=timeout)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+            self._add_missing_columns()
+
+    def _add_missing_columns(self):
+        # Databases created by older versions lack newer columns.
+        existing = set(row[1] for row in self.conn.execute("PRAGMA table_info(runs)"))
+        for name, sql_type in COLUMNS:
+            if name not in existing:
+                self.conn.execute("ALTER TABLE runs ADD COLUMN %s %s" % (name, sql_type))
+
+    def append(self, **fields):
+        """Appends a run with the given column values.
+
+        A results file is only recorded once: appending the same
+        results_file with unchanged contents (results reused from
+        an earlier run) does nothing.
+
+        Returns:
+            True if a row was added.
+        """
+        unknown = set(fields) - set(Run._fields)
+        if unknown:
+            raise ValueError("Unknown columns: %s" % ', '.join(sorted(unknown)))
+        fields.setdefault('created', time.time())
+        if fields.get('results_file') and 'results_sha1' not in fields:
+            fields['results_sha1'] = file_sha1(fields['results_file'])
+
+        names = sorted(fields)
+        with self.conn:
+            cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO runs (%s) VALUES (%s)" % (
+                    ', '.join(names), ', '.join('?' * len(names))),
+                    [fields[n] for n in names])
+        return cursor.rowcount > 0
+
+    def query(self, latest=False, **filters):
+        """Returns the Runs matching FILTERS, oldest first.
+
+        Args:
+            latest: only return the most recent run of each cell
+            filters: column=value, or column=[values]
+        """
+        clauses = []
+        params = []
+        for name, value in sorted(filters.items()):
+            if name not in Run._fields:
+                raise ValueError("Unknown column: %s" % name)
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                clauses.append("%s IN (%s)" % (name, ', '.join('?' * len(value))))
+                params.extend(value)
+            else:
+                clauses.append("%s = ?" % name)
+                params.append(value)
+        if latest:
+            clauses.append("id IN (SELECT MAX(id) FROM runs GROUP BY %s)"
+                    % ', '.join(CELL_COLUMNS))
+
+        sql = "SELECT %s FROM runs" % ', '.join(Run._fields)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id"
+        return [Run(*row) for row in self.conn.execute(sql, params)]
+
+    def close(self):
+        self.conn.close()
+
+def read_csv(path, experiment=None):
+    """Reads the positional CSV written by experiment.py --csv-out
+    and gather_multiple_results.py into Runs.
+    """
+    runs = []
+    with open(path) as f:
+        for line in f:
+            split = [x.strip() for x in line.split(', ')]
+            if len(split) < 7: continue # blank line
+            traces = [t if t != '_' else None for t in split[7:9]]
+            traces += [None] * (2 - len(traces))
+            values = dict((n, None) for n in Run._fields)
+            values.update(experiment=experiment, scheme=split[0],
+                    util=float(split[1]), delay=float(split[2]),
+                    throughput=float(split[3]), power=float(split[4]),
+                    queuing_delay=float(split[5]), per_packet_delay=float(split[6]),
+                    uplink_trace=traces[0], downlink_trace=traces[1])
+            runs.append(Run(**values))
+    return runs
+
+def is_database(path):
+    """Returns True if PATH is an SQLite database."""
+    with open(path, 'rb') as f:
+        return f.read(16) == b'SQLite format 3\x00'
+
+def load_runs(path, latest=True, **filters):
+    """Returns the Runs in PATH, either a results database or a
+    CSV file, matching FILTERS (applied to databases only).
+    """
+    if not is_database(path):
+        return read_csv(path, filters.get('experiment'))
+    db = ResultsDB(path)
+    try:
+        return db.query(latest=latest, **filters)
+    finally:
+        db.close()
@@ -0,0 +1,86 @@
+#!/usr/bin/python
+
+#
+# Retention policy for mm-link logs.
+#
+# Logs are by far the largest output of an experiment, but
+# once a run is analyzed its summary (the results JSON,
+# with its delay sketch, and its row in the results
+# database) answers everything but a redrawn throughput
+# graph. prune_logs() deletes the logs of old runs, oldest
+# first, and only those whose summary exists.
+#
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from analysis.logfiles import log_paths, strip_compression
+
+DAY_SECONDS = 24 * 60 * 60
+
+def results_path_for(log_path, log_root='logs', results_root='results'):
+    """Returns the results file of the run that wrote the log
+    at LOG_PATH, a path under LOG_ROOT.
+    """
+    relative = strip_compression(os.path.relpath(log_path, log_root))
+    return os.path.join(results_root, os.path.splitext(relative)[0] + '.json')
+
+def prune_logs(log_root='logs', results_root='results', max_age_days=None,
+        max_bytes=None, dry_run=False):
+    """Deletes the logs under LOG_ROOT whose results are saved
+    under RESULTS_ROOT: those older than MAX_AGE_DAYS, then the
+    oldest until the logs left take at most MAX_BYTES.
+
+    Logs without results are never deleted, nor counted.
+
+    Returns:
+        list of (path, size) of the deleted logs, oldest first.
+    """
+    logs = []
+    for path in log_paths(log_root):
+        if os.path.isfile(results_path_for(path, log_root, results_root)):
+            st = os.stat(path)
+            logs.append((st.st_mtime, path, st.st_size))
+    logs.sort()
+
+    now = time.time()
+    total = sum(size for _, _, size in logs)
+    deleted = []
+    for mtime, path, size in logs:
+        too_old = max_age_days is not None and now - mtime > max_age_days * DAY_SECONDS
+        too_big = max_bytes is not None and total > max_bytes
+        if not (too_old or too_big):
+            continue
+        if not dry_run:
+            os.remove(path)
+        deleted.append((path, size))
+        total -= size
+    return deleted
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--log-dir', default='logs', type=str,
+        help='directory of the mm-link logs')
+    parser.add_argument('--results-dir', default='results', type=str,
+        help='directory of the results the logs were summarized into')
+    parser.add_argument('--older-than', default=None, type=float,
+        help='(days) delete logs older than this')
+    parser.add_argument('--budget', default=None, type=float,
+        help='(MB) delete the oldest logs beyond this size')
+    parser.add_argument('--dry-run', action='store_true',
+        help='only list the logs that would be deleted')
+    args = parser.parse_args()
+
+    if args.older_than is None and args.budget is None:
+        parser.error("give --older-than, --budget or both")
+
+    deleted = prune_logs(args.log_dir, args.results_dir, args.older_than,
+            args.budget * 1000000 if args.budget is not None else None, args.dry_run)
+    for path, size in deleted:
+        print("%s %s (%.1f MB)" % ('would delete' if args.dry_run else 'deleted',
+                path, size / 1000000.0))
+    print("%s %.1f MB of logs" % ('would free' if args.dry_run else 'freed',
+            sum(size for _, size in deleted) / 1000000.0))
@@ -0,0 +1,12 @@
+#
+# Tests import modules relative to reproduction/, as the
+# scripts do, and the ABC client and server from abc/.
+#
+
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'plotting'))
+sys.path.insert(0, os.path.join(ROOT, '..', 'abc'))
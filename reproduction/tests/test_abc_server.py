@@ -0,0 +1,60 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from server import EchoServer, Flow
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'abc', 'server.py')
+
+def children(pid):
+    path = '/proc/%d/task/%d/children' % (pid, pid)
+    with open(path) as f:
+        return [int(c) for c in f.read().split()]
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    # A zombie is gone as far as the port is concerned.
+    with open('/proc/%d/stat' % pid) as f:
+        return f.read().split(')')[-1].split()[0] != 'Z'
+
+def start_workers(port):
+    server = subprocess.Popen([sys.executable, SERVER, str(port), '--workers', '2'])
+    deadline = time.time() + 5
+    while time.time() < deadline and len(children(server.pid)) < 2:
+        time.sleep(0.05)
+    workers = children(server.pid)
+    assert len(workers) == 2
+    return server, workers
+
+def wait_gone(pids, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline and any(alive(p) for p in pids):
+        time.sleep(0.05)
+    return not any(alive(p) for p in pids)
+
+def test_workers_die_when_the_server_is_killed():
+    server, workers = start_workers(23461)
+    server.kill()
+    server.wait()
+    assert wait_gone(workers)
+
+def test_workers_are_reaped_when_the_server_is_terminated():
+    server, workers = start_workers(23462)
+    server.send_signal(signal.SIGTERM)
+    assert server.wait() == 0
+    assert wait_gone(workers)
+
+def test_idle_flows_expire():
+    server = EchoServer(23463)
+    try:
+        server.flows[('10.0.0.1', 1)] = Flow(0.0)
+        server.flows[('10.0.0.2', 2)] = Flow(9.0)
+        server.expire(10.0, 5.0)
+        assert list(server.flows) == [('10.0.0.2', 2)]
+    finally:
+        server.s.close()
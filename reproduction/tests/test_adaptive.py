@@ -0,0 +1,53 @@
+from collections import namedtuple
+
+import pytest
+
+from runner.adaptive import AdaptiveRuns
+from runner.scheduler import Cell, run_cells
+
+Result = namedtuple('Result', ['util', 'queuing_delay', 'per_packet_delay'])
+
+def sweep(adaptive, results, jobs):
+    """Runs ADAPTIVE's cells through run_cells() as experiment.py
+    does, each run returning the next of RESULTS[key] (an
+    exception is raised).
+    """
+    def make_cell(key, i):
+        def run(slot):
+            result = results[key].pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return Cell('%s:%d' % (key, i), run)
+
+    key_of = lambda cell: cell.name.split(':')[0]
+    on_done = lambda cell, result: adaptive.record(key_of(cell), result)
+    on_error = lambda cell, error: adaptive.record(key_of(cell), None)
+    more = lambda n: [make_cell(k, i) for k, i in adaptive.next(n)]
+    return run_cells([], jobs, on_done, more, on_error=on_error)
+
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_failed_runs_count_and_the_cell_finishes(jobs):
+    adaptive = AdaptiveRuns(['good', 'flaky', 'broken'], 2, 4, 0.05)
+    steady = Result(0.9, 10.0, 110.0)
+    results = {'good': [steady] * 4,
+               'flaky': [RuntimeError('crashed'), steady, steady, steady],
+               'broken': [RuntimeError('crashed')] * 4}
+
+    timings = sweep(adaptive, results, jobs)
+
+    assert adaptive.finished == adaptive.launched
+    assert adaptive.finished == {'good': 2, 'flaky': 3, 'broken': 4}
+    assert adaptive.failed == {'good': 0, 'flaky': 1, 'broken': 4}
+    assert len([t for t in timings if t.error]) == 5
+    assert all(adaptive.done(k) for k in adaptive.keys)
+    rows = dict((k, failures) for k, _, failures, _ in adaptive.summary())
+    assert rows == adaptive.failed
+
+def test_precision_is_judged_on_queueing_delay():
+    # The same queueing delays on a base RTT of 100 ms: the
+    # per-packet delays would look precise enough after 2 runs.
+    adaptive = AdaptiveRuns(['cell'], 2, 10, 0.05)
+    for delay in (10.0, 12.0):
+        adaptive.record('cell', Result(0.9, delay, 100.0 + delay))
+    assert not adaptive.done('cell')
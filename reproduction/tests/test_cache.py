@@ -0,0 +1,96 @@
+import os
+import shutil
+
+import pytest
+
+import storage.cache
+from storage.cache import (REPRODUCTION_DIR, ResultCache, analyzer_version, cell_inputs,
+        cell_key)
+
+CONFIG = {'name': 'abc', 'uplink_queue': 'cellular'}
+
+def write(path, text):
+    with open(str(path), 'w') as f:
+        f.write(text)
+    return str(path)
+
+def traces(tmpdir):
+    return (write(tmpdir.join('up'), '1\n2\n3\n'),
+            write(tmpdir.join('down'), '1\n2\n'))
+
+def key(tmpdir, **kwargs):
+    up, down = traces(tmpdir)
+    return cell_key(cell_inputs(CONFIG, 50, up, down, 'figure2a', **kwargs))
+
+def test_key_is_stable(tmpdir):
+    assert key(tmpdir) == key(tmpdir)
+
+def test_key_changes_with_trace_contents(tmpdir):
+    before = key(tmpdir)
+    up, down = traces(tmpdir)
+    write(up, '1\n2\n4\n')
+    assert cell_key(cell_inputs(CONFIG, 50, up, down, 'figure2a')) != before
+
+def test_key_changes_with_run_options(tmpdir):
+    full = key(tmpdir, run_options={'steady_state': False, 'analysis_start': None})
+    steady = key(tmpdir, run_options={'steady_state': True, 'analysis_start': None,
+            'steady_window': 10.0, 'steady_tolerance': 0.05, 'max_duration': None})
+    other_window = key(tmpdir, run_options={'steady_state': True, 'analysis_start': None,
+            'steady_window': 5.0, 'steady_tolerance': 0.05, 'max_duration': None})
+    trimmed = key(tmpdir, run_options={'steady_state': False, 'analysis_start': 10000})
+    assert len(set([full, steady, other_window, trimmed])) == 4
+
+def test_key_changes_with_analyzer_version(tmpdir, monkeypatch):
+    before = key(tmpdir)
+    monkeypatch.setattr(storage.cache, 'ANALYZER_VERSION',
+            storage.cache.ANALYZER_VERSION + 1)
+    assert key(tmpdir) != before
+
+def copy_analyzer(tmpdir):
+    root = tmpdir.join('reproduction')
+    shutil.copytree(os.path.join(REPRODUCTION_DIR, 'analysis'), str(root.join('analysis')))
+    shutil.copytree(os.path.join(REPRODUCTION_DIR, 'tracelib'), str(root.join('tracelib')))
+    return root
+
+@pytest.mark.parametrize('module', ['analysis/stats.py', 'tracelib/index.py',
+                                    'tracelib/binary.py'])
+def test_analyzer_version_follows_the_analyzer_sources(tmpdir, module):
+    root = copy_analyzer(tmpdir)
+    assert analyzer_version(str(root)) == analyzer_version()
+    with open(str(root.join(module)), 'a') as f:
+        f.write('\n# changed\n')
+    assert analyzer_version(str(root)) != analyzer_version()
+
+def test_analyzer_version_ignores_other_trace_modules(tmpdir):
+    root = copy_analyzer(tmpdir)
+    with open(str(root.join('tracelib', 'generate.py')), 'a') as f:
+        f.write('\n# changed\n')
+    assert analyzer_version(str(root)) == analyzer_version()
+
+def test_restore_only_what_was_stored(tmpdir):
+    cache = ResultCache(str(tmpdir.join('cache')))
+    results = write(tmpdir.join('results.json'), '{"duration": 1}')
+    k = key(tmpdir)
+    assert not cache.restore(k, str(tmpdir.join('restored.json')))
+    assert cache.store(k, {}, results, str(tmpdir.join('no.log')))
+    assert cache.restore(k, str(tmpdir.join('restored.json')))
+    assert tmpdir.join('restored.json').read() == '{"duration": 1}'
+
+def test_run_options_tell_steady_runs_apart():
+    import argparse
+    from experiment import run_options
+
+    class Protocol:
+        analysis_start = None
+
+    def options(**kwargs):
+        values = dict(live_analysis=False, steady_state=False, steady_window=10.0,
+                steady_tolerance=0.05, max_duration=None, segments=None,
+                segment_overlap=10.0)
+        values.update(kwargs)
+        return run_options(argparse.Namespace(**values), Protocol())
+
+    assert options() != options(steady_state=True, live_analysis=True)
+    assert options(steady_state=True) != options(steady_state=True, steady_window=5.0)
+    assert options(steady_state=True) != options(steady_state=True, max_duration=60.0)
+    assert options() != options(segments=4)
@@ -0,0 +1,23 @@
+from collections import OrderedDict
+
+import os
+
+import pytest
+
+from runner.commands import run_cmds
+
+def session_of(tmpdir, **kwargs):
+    # The shell writes the session it runs in.
+    out = str(tmpdir.join('sid'))
+    cmds = OrderedDict([('mahimahi', ['python3 -c "import os; print(os.getsid(0))" > %s'
+                                      % out])])
+    run_cmds(cmds, **kwargs)
+    with open(out) as f:
+        return int(f.read())
+
+@pytest.mark.parametrize('kwargs', [{'isolated': True}, {'stop': lambda: False}])
+def test_isolated_and_stoppable_commands_lead_their_own_session(tmpdir, kwargs):
+    assert session_of(tmpdir, **kwargs) != os.getsid(0)
+
+def test_other_commands_stay_in_our_session(tmpdir):
+    assert session_of(tmpdir) == os.getsid(0)
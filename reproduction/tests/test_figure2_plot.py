@@ -0,0 +1,31 @@
+import numpy as np
+
+from figure2_plot import distinct_points, pareto_frontier
+
+def old_distinct_points(points):
+    # The loop plot_cloud used to run.
+    kept = []
+    for p in points:
+        if not p[0] in [x[0] for x in kept] and \
+            not p[1] in [x[1] for x in kept]:
+            kept.append(p)
+    return kept
+
+def test_distinct_points_keeps_points_unseen_among_kept():
+    points = [(1, 1), (2, 1), (2, 3), (3, 0.5)]
+    assert distinct_points(points).tolist() == [[1, 1], [2, 3], [3, 0.5]]
+
+def test_distinct_points_matches_old_loop():
+    rng = np.random.RandomState(0)
+    for _ in range(200):
+        points = [tuple(p) for p in rng.randint(0, 20, size=(rng.randint(1, 30), 2))]
+        expected = [list(map(float, p)) for p in old_distinct_points(points)]
+        assert distinct_points(points).tolist() == expected
+
+def test_distinct_points_empty():
+    assert distinct_points([]).shape == (0, 2)
+
+def test_pareto_frontier():
+    xs, ys = pareto_frontier([3, 1, 2, 4], [0.5, 0.2, 0.6, 0.9])
+    assert xs.tolist() == [1, 2, 4]
+    assert ys.tolist() == [0.2, 0.6, 0.9]
@@ -0,0 +1,61 @@
+import os
+import time
+
+import numpy as np
+
+from tracelib.generate import (constant_profile, markov_profile, piecewise_profile,
+        profile_timestamps, sidecar_path, trace_chunks, trace_text, write_trace)
+
+def old_trace(length, bw):
+    # What make_bw_file wrote for multiples of 12 Mbits/s.
+    return ''.join('%d\n' % i for i in range(1, length + 1) for _ in range(bw // 12))
+
+def test_multiples_of_12_match_the_old_traces():
+    assert trace_text(profile_timestamps(constant_profile(1000, 48))) == old_trace(1000, 48)
+
+def test_fractional_rates_accumulate():
+    # 6 Mbits/s is one opportunity every other ms.
+    assert profile_timestamps(constant_profile(6, 6)).tolist() == [2, 4, 6]
+    # 18 Mbits/s alternates one and two per ms.
+    assert profile_timestamps(constant_profile(4, 18)).tolist() == [1, 2, 2, 3, 4, 4]
+    # Over a long trace, no opportunity is lost to rounding.
+    rate = 30.3
+    timestamps = profile_timestamps(constant_profile(100000, rate))
+    assert len(timestamps) == int(100000 * rate / 12.0 + 1e-9)
+
+def test_chunks_join_into_the_whole_trace():
+    profile = np.r_[markov_profile(10000, [5.5, 24, 47.9], 100, seed=3),
+            piecewise_profile(3001, [(0, 0.7), (1000, 13)])]
+    whole = trace_text(profile_timestamps(profile))
+    for chunk_ms in (1, 7, 1000, 20000):
+        assert ''.join(trace_chunks(profile, chunk_ms)) == whole
+
+def test_write_trace_reuses_an_unchanged_trace(tmpdir):
+    path = str(tmpdir.join('bw.mahi'))
+    profile = constant_profile(5000, 30)
+    assert write_trace(profile, path)
+    assert os.path.isfile(sidecar_path(path))
+    with open(path) as f:
+        assert f.read() == trace_text(profile_timestamps(profile))
+    assert not write_trace(profile, path)
+    # A different profile of the same length is written.
+    assert write_trace(constant_profile(5000, 36), path)
+
+def test_write_trace_rewrites_an_edited_trace(tmpdir):
+    path = str(tmpdir.join('bw.mahi'))
+    profile = constant_profile(100, 12)
+    write_trace(profile, path)
+    with open(path, 'a') as f:
+        f.write('101\n')
+    assert write_trace(profile, path)
+    with open(path) as f:
+        assert f.read() == old_trace(100, 12)
+
+def test_write_trace_reuses_a_matching_trace_without_sidecar(tmpdir):
+    path = str(tmpdir.join('bw.mahi'))
+    with open(path, 'w') as f:
+        f.write(old_trace(100, 24))
+    mtime = os.path.getmtime(path)
+    assert not write_trace(constant_profile(100, 24), path)
+    assert os.path.getmtime(path) == mtime
+    assert os.path.isfile(sidecar_path(path))
@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+from analysis.live import LiveAnalysis
+from analysis.mm_log import analyze_run, load_results
+
+def make_log(ms=4000):
+    lines = ['# base timestamp: 1000']
+    for t in range(1000, 1000 + ms):
+        lines.append('%d # 1500' % t)
+        if t % 2 == 0:
+            lines.append('%d + 1500' % t)
+            delay = 3 + (t // 500) % 7
+            lines.append('%d - 1500 %d' % (t + delay, delay))
+    return '\n'.join(lines) + '\n'
+
+def run_mm_link(path, text):
+    # Stands in for mm-link, logging into the named pipe.
+    with open(path, 'w') as f:
+        f.write(text)
+
+@pytest.mark.parametrize('analysis_start', [None, 1000])
+def test_live_analysis_over_a_fifo_matches_the_log_file(tmpdir, analysis_start):
+    text = make_log()
+    log = str(tmpdir.join('uplink.log'))
+    results = str(tmpdir.join('results.json'))
+    live = LiveAnalysis(log + '.fifo', log, analysis_start=analysis_start)
+
+    # As run_cmds() runs it: a step before mm-link starts.
+    assert callable(live.start)
+    live.start()
+    writer = threading.Thread(target=run_mm_link, args=(live.fifo_path, text))
+    writer.start()
+    live.write_results(results)
+    writer.join()
+
+    with open(log) as f:
+        assert f.read() == text
+    assert load_results(results) == analyze_run(log, start=analysis_start)
@@ -0,0 +1,52 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from runner.monitor import ProcessMonitor, classify, process_table
+
+def test_classify_by_command_line():
+    assert classify(['/bin/sh', '-c', 'mm-delay 50 mm-link'], 'sender', False) is None
+    assert classify(['bash', '-c', 'python abc/client.py'], 'sender', True) is None
+    assert classify(['mm-delay', '50', 'mm-link'], 'sender', False) == 'emulator'
+    assert classify(['/usr/bin/mm-link', 'up', 'down'], 'sender', True) == 'emulator'
+    assert classify(['python', 'abc/client.py', '12345'], 'sender', True) == 'sender'
+    assert classify(['gzip', '-c'], 'sender', False) == 'helper'
+    assert classify(['python', 'abc/server.py'], 'server', False) == 'server'
+
+def sample(monitor, cpus):
+    # One sample in which each process of the emulator used CPUS.
+    monitor._last = (0.0, (0.0, 1.0), dict(
+            (pid, ('emulator', 0.0, (0, 0), 0.0)) for pid in range(len(cpus))))
+    monitor._snapshot = lambda: (1.0, (1.0, 2.0), dict(
+            (pid, ('emulator', cpu, (0, 0), 0.0)) for pid, cpu in enumerate(cpus)))
+    monitor._sample()
+
+def test_threshold_applies_to_each_process():
+    monitor = ProcessMonitor(threshold=0.9)
+    # Two emulator processes at 0.6 cores each are not saturated...
+    sample(monitor, [0.6, 0.6])
+    assert monitor.suspect_roles() == []
+    assert monitor.peak_cpu('emulator') == pytest.approx(0.6)
+    assert monitor.peak_cpu('emulator', 'cpu') == pytest.approx(1.2)
+    # ...but one at 0.95 is.
+    sample(monitor, [0.95, 0.1])
+    assert monitor.suspect_roles() == ['emulator']
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self'), reason='needs /proc')
+def test_shell_wrappers_are_skipped():
+    proc = subprocess.Popen('%s -c "import time; time.sleep(2)"; true' % sys.executable,
+            shell=True, preexec_fn=os.setsid)
+    try:
+        monitor = ProcessMonitor()
+        monitor.add(proc.pid, 'sender')
+        time.sleep(0.3)
+        roles = monitor._roles(process_table())
+        assert proc.pid not in roles
+        assert list(roles.values()) == ['helper']
+    finally:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
@@ -0,0 +1,35 @@
+import os
+import subprocess
+
+import pytest
+
+from runner.placement import command_prefix, resolve_placement
+
+PROFILE = {'name': 'test', 'cores_per_cell': 1,
+           'roles': {'emulator': [0], 'sender': [0], 'server': [0]},
+           'emulator_nice': 5}
+
+def test_resolve_records_the_nice_value_of_each_role():
+    placement = resolve_placement(PROFILE)
+    base = os.nice(0)
+    assert placement['nice'] == {'emulator': min(base + 5, 19), 'sender': base,
+                                 'server': base}
+
+def test_without_emulator_nice_every_role_keeps_the_experiments_nice():
+    profile = dict(PROFILE)
+    del profile['emulator_nice']
+    placement = resolve_placement(profile)
+    assert set(placement['nice'].values()) == set([os.nice(0)])
+    assert 'nice' not in command_prefix(placement, 'sender')
+
+@pytest.mark.skipif(not os.path.exists('/bin/bash'), reason='needs bash')
+def test_sender_does_not_inherit_the_emulators_nice():
+    placement = resolve_placement(PROFILE)
+    # As cc_protocol runs it: the sender inside the emulator's shell.
+    command = "%sbash -c '%snice'" % (command_prefix(placement, 'emulator'),
+            command_prefix(placement, 'sender'))
+    out = subprocess.check_output(command, shell=True)
+    assert int(out) == placement['nice']['sender']
+    out = subprocess.check_output("%snice" % command_prefix(placement, 'emulator'),
+            shell=True)
+    assert int(out) == placement['nice']['emulator']
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from analysis.sketch import DelaySketch, SUB_BITS
+
+def sketch_of(values):
+    sketch = DelaySketch()
+    sketch.add(values)
+    return sketch
+
+def test_cdf_is_exact_below_the_first_wide_bucket():
+    values = np.random.RandomState(1).randint(0, 1 << SUB_BITS, 10000)
+    sketch = sketch_of(values)
+    for x in (0, 1, 17, 64, (1 << SUB_BITS) - 1):
+        assert sketch.cdf(x) == np.mean(values <= x)
+
+@pytest.mark.parametrize('high', [1 << 10, 1 << 30])
+def test_cdf_does_not_count_delays_above_x(high):
+    values = np.random.RandomState(2).randint(0, high, 200000)
+    sketch = sketch_of(values)
+    for x in np.linspace(1 << SUB_BITS, high - 1, 25).astype(np.int64):
+        true = np.mean(values <= x)
+        assert abs(sketch.cdf(x) - true) < 0.005
+        assert abs(sketch.tail(x) - (1 - true)) < 0.005
+
+def test_cdf_counts_a_whole_bucket_only_at_its_end():
+    sketch = sketch_of([1000] * 10)
+    low = 1000 - 1000 % 8
+    assert sketch.cdf(low - 1) == 0.0
+    assert 0.0 < sketch.cdf(1000) < 1.0
+    assert sketch.cdf(low + 7) == 1.0
+    assert sketch.cdf(-1) == 0.0
+    assert sketch.cdf(1 << 50) == 1.0
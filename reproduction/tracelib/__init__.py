@@ -0,0 +1,4 @@
+#
+# Reading, writing and summarizing mahimahi
+# bandwidth traces.
+#
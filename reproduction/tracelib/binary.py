@@ -0,0 +1,162 @@
+#!/usr/bin/python
+
+#
+# Compact binary format for mahimahi traces.
+#
+# A text trace has one line per delivery opportunity, so
+# a ms with four opportunities is four identical lines.
+# The binary format run-length encodes it instead: one
+# (ms timestamp, opportunity count) record per distinct
+# ms, after a fixed-size header. Records have a fixed
+# width, so the file can be memory-mapped straight into a
+# NumPy array without parsing any text.
+#
+# Layout (little endian):
+#   8 bytes   magic, "MMTRACE1"
+#   8 bytes   number of records
+#   8 bytes   number of opportunities
+#   8 bytes   last timestamp (ms)
+#   records   uint32 ms, uint16 count
+#
+
+import os
+import struct
+import numpy as np
+
+MAGIC = b'MMTRACE1'
+HEADER = struct.Struct('<8sQQQ')
+RUN_DTYPE = np.dtype([('ms', '<u4'), ('count', '<u2')])
+
+# Bytes per delivery opportunity, as mm-link logs them.
+OPPORTUNITY_BYTES = 1504
+
+# Largest count a single record can hold.
+MAX_COUNT = np.iinfo(np.uint16).max
+
+def is_binary_trace(path):
+    """Returns True if the file at PATH is a binary trace."""
+    with open(os.path.expanduser(path), 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def read_text_trace(path):
+    """Returns the opportunity timestamps (ms) of a text trace."""
+    with open(os.path.expanduser(path)) as f:
+        timestamps = np.fromstring(f.read(), dtype=np.int64, sep=' ')
+    if not len(timestamps):
+        raise ValueError("Empty trace: %s" % path)
+    return timestamps
+
+def encode_runs(timestamps):
+    """Run-length encodes opportunity TIMESTAMPS into records."""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if len(timestamps) and (timestamps[0] < 0 or np.any(np.diff(timestamps) < 0)):
+        raise ValueError("Trace timestamps must be non-negative and non-decreasing")
+
+    starts = np.flatnonzero(np.r_[True, timestamps[1:] != timestamps[:-1]])
+    counts = np.diff(np.r_[starts, len(timestamps)])
+
+    # Split runs too long for one record.
+    pieces = (counts + MAX_COUNT - 1) // MAX_COUNT
+    runs = np.zeros(int(pieces.sum()), dtype=RUN_DTYPE)
+    runs['ms'] = np.repeat(timestamps[starts], pieces)
+    run_counts = np.repeat(counts, pieces)
+    first_piece = np.r_[0, np.cumsum(pieces)[:-1]]
+    offsets = np.arange(len(runs)) - np.repeat(first_piece, pieces)
+    runs['count'] = np.minimum(run_counts - offsets * MAX_COUNT, MAX_COUNT)
+    return runs
+
+def write_binary_trace(timestamps, path):
+    """Writes opportunity TIMESTAMPS to PATH as a binary trace."""
+    runs = encode_runs(timestamps)
+    last = int(runs['ms'][-1]) if len(runs) else 0
+    with open(os.path.expanduser(path), 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(runs), int(runs['count'].sum()), last))
+        f.write(runs.tobytes())
+
+def write_text_trace(timestamps, path):
+    """Writes opportunity TIMESTAMPS to PATH as a text trace."""
+    with open(os.path.expanduser(path), 'w') as f:
+        f.write('\n'.join(map(str, np.asarray(timestamps).tolist())))
+        f.write('\n')
+
+class BinaryTrace:
+
+    def __init__(self, path):
+        """Memory-maps the binary trace at PATH."""
+        self.path = os.path.expanduser(path)
+        with open(self.path, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a binary trace: %s" % path)
+
+        _, num_runs, self.num_opportunities, self.last_timestamp = HEADER.unpack(header)
+        if num_runs:
+            self.runs = np.memmap(self.path, dtype=RUN_DTYPE, mode='r',
+                    offset=HEADER.size, shape=(num_runs,))
+        else:
+            self.runs = np.zeros(0, dtype=RUN_DTYPE)
+
+    def __len__(self):
+        return self.num_opportunities
+
+    @property
+    def duration(self):
+        """Length of the trace (ms), as mm-link repeats it."""
+        return self.last_timestamp
+
+    def timestamps(self):
+        """Returns every opportunity timestamp (ms), like the text trace."""
+        return np.repeat(self.runs['ms'].astype(np.int64),
+                self.runs['count'].astype(np.int64))
+
+    def opportunities_per_ms(self):
+        """Returns the number of opportunities in each ms of the trace."""
+        per_ms = np.zeros(self.last_timestamp + 1, dtype=np.int64)
+        np.add.at(per_ms, self.runs['ms'].astype(np.int64),
+                self.runs['count'].astype(np.int64))
+        return per_ms
+
+    def capacity_series(self, window_ms):
+        """Returns the link capacity (Mbps) of each WINDOW_MS window."""
+        return capacity_series(self.runs['ms'], self.runs['count'], window_ms)
+
+def capacity_series(ms, counts, window_ms):
+    """Returns the capacity (Mbps) of each WINDOW_MS window given
+    opportunity timestamps MS with multiplicities COUNTS.
+    """
+    bins = np.asarray(ms, dtype=np.int64) // window_ms
+    opportunities = np.bincount(bins, weights=np.asarray(counts, dtype=np.float64))
+    return opportunities * OPPORTUNITY_BYTES * 8 / (window_ms * 1000.0)
+
+def load_timestamps(path):
+    """Returns the opportunity timestamps (ms) of the trace at PATH,
+    in either the text or the binary format.
+    """
+    if is_binary_trace(path):
+        return BinaryTrace(path).timestamps()
+    return read_text_trace(path)
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument(dest='command', choices=['to-binary', 'to-text', 'info'],
+        help='conversion to run, or info to describe a trace')
+    parser.add_argument(dest='trace', help='trace to read', type=str)
+    parser.add_argument(dest='output', nargs='?', default=None,
+        help='trace to write', type=str)
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        timestamps = load_timestamps(args.trace)
+        runs = encode_runs(timestamps)
+        print("opportunities: %d" % len(timestamps))
+        print("duration: %.3f s" % (timestamps[-1] / 1000.0))
+        print("distinct ms: %d" % len(runs))
+        print("average capacity: %.2f Mbits/s" % (
+            len(timestamps) * OPPORTUNITY_BYTES * 8 / (timestamps[-1] * 1000.0)))
+    elif not args.output:
+        parser.error("%s needs an output trace" % args.command)
+    elif args.command == 'to-binary':
+        write_binary_trace(read_text_trace(args.trace), args.output)
+    else:
+        write_text_trace(BinaryTrace(args.trace).timestamps(), args.output)
@@ -0,0 +1,251 @@
+#!/usr/bin/python
+
+#
+# Synthesizes mahimahi traces from rate profiles.
+#
+# A profile gives the link rate (Mbits/s) of every ms of
+# the trace. Each opportunity carries one 1500-byte packet,
+# so 1 opportunity per ms is 12 Mbits/s. Rates that are not
+# multiples of 12 accumulate fractional opportunities from
+# ms to ms, and an opportunity is emitted whenever the
+# accumulated credit crosses a whole number.
+#
+# Traces are generated and written in chunks of CHUNK_MS, so
+# writing one takes little memory however long it is. Next
+# to a written trace, <trace>.profile.json records the hash
+# of its profile along with the trace's size and mtime, so
+# that an unchanged trace is reused without being read.
+#
+
+import hashlib
+import json
+import os
+import numpy as np
+
+MBPS_PER_OPPORTUNITY = 1500 * 8 / 1000.0
+
+# Credit is accumulated in integer millionths of an
+# opportunity, so that summing it over a long trace loses
+# nothing to floating point error, and e.g. 36 Mbits/s gives
+# exactly 3 opportunities/ms.
+CREDIT_UNITS = 1000000
+
+# (ms) of profile generated and written at a time.
+CHUNK_MS = 1 << 16
+
+SIDECAR_SUFFIX = '.profile.json'
+
+def constant_profile(length, rate):
+    """Returns a profile of LENGTH ms at a fixed RATE."""
+    return np.full(length, float(rate))
+
+def piecewise_profile(length, steps):
+    """Returns a profile of LENGTH ms made of step changes.
+
+    Args:
+        steps: list of (start_ms, rate) pairs; each rate holds
+               from its start until the next step's start
+    """
+    steps = sorted(steps)
+    if not steps or steps[0][0] > 0:
+        raise ValueError("The first step must start at 0 ms")
+
+    starts = np.array([s for s, _ in steps], dtype=np.int64)
+    rates = np.array([r for _, r in steps], dtype=np.float64)
+    return rates[np.searchsorted(starts, np.arange(length), side='right') - 1]
+
+def on_off_profile(length, rate, on_ms, off_ms, off_rate=0.0):
+    """Returns a profile of LENGTH ms that alternates between
+    ON_MS at RATE and OFF_MS at OFF_RATE.
+    """
+    on = np.arange(length) % (on_ms + off_ms) < on_ms
+    return np.where(on, float(rate), float(off_rate))
+
+def markov_profile(length, rates, dwell_ms, transitions=None, stay=0.9, seed=0):
+    """Returns a profile of LENGTH ms whose rate follows a Markov
+    chain over RATES, taking one step every DWELL_MS.
+
+    Args:
+        transitions: (n x n) matrix of transition probabilities
+                     between the rates; by default a state is kept
+                     with probability STAY, and otherwise left for
+                     one of the others at random
+        seed: (int) seed of the chain, so profiles are repeatable
+    """
+    n = len(rates)
+    if transitions is None:
+        transitions = np.full((n, n), (1.0 - stay) / max(n - 1, 1))
+        np.fill_diagonal(transitions, stay if n > 1 else 1.0)
+    transitions = np.asarray(transitions, dtype=np.float64)
+    if transitions.shape != (n, n) or not np.allclose(transitions.sum(axis=1), 1.0):
+        raise ValueError("Transitions must be a %dx%d stochastic matrix" % (n, n))
+
+    periods = (length + dwell_ms - 1) // dwell_ms
+    cumulative = np.cumsum(transitions, axis=1)
+    draws = np.random.RandomState(seed).random_sample(periods)
+    states = np.zeros(periods, dtype=np.int64)
+    for i in range(1, periods):
+        states[i] = min(np.searchsorted(cumulative[states[i - 1]], draws[i], side='right'), n - 1)
+
+    return np.repeat(np.asarray(rates, dtype=np.float64)[states], dwell_ms)[:length]
+
+def credit_per_ms(profile):
+    """Returns the credit (in CREDIT_UNITS of an opportunity)
+    each ms of PROFILE earns.
+    """
+    profile = np.asarray(profile, dtype=np.float64)
+    if np.any(profile < 0):
+        raise ValueError("Rates must be non-negative")
+    return np.round(profile * (CREDIT_UNITS / MBPS_PER_OPPORTUNITY)).astype(np.int64)
+
+def opportunities_per_ms(profile, earned=0):
+    """Returns how many opportunities each ms of PROFILE gets,
+    after EARNED units of credit from the ms before it.
+    """
+    credit = (earned + np.cumsum(credit_per_ms(profile))) // CREDIT_UNITS
+    return np.diff(np.r_[earned // CREDIT_UNITS, credit])
+
+def profile_timestamps(profile):
+    """Returns the opportunity timestamps (ms) of PROFILE.
+
+    Like the traces shipped with mahimahi, the first ms of the
+    profile is timestamp 1.
+    """
+    counts = opportunities_per_ms(profile)
+    return np.repeat(np.arange(1, len(counts) + 1), counts)
+
+def trace_text(timestamps):
+    """Returns the contents of a text trace of TIMESTAMPS."""
+    timestamps = np.asarray(timestamps)
+    if not len(timestamps):
+        return ''
+    return '\n'.join(map(str, timestamps.tolist())) + '\n'
+
+def trace_chunks(profile, chunk_ms=CHUNK_MS):
+    """Yields the text trace of PROFILE in pieces, each covering
+    CHUNK_MS of the profile. Joined, they are the trace
+    trace_text(profile_timestamps(PROFILE)) returns.
+    """
+    profile = np.asarray(profile, dtype=np.float64)
+    earned = 0
+    for start in range(0, len(profile), chunk_ms):
+        chunk = profile[start:start + chunk_ms]
+        counts = opportunities_per_ms(chunk, earned)
+        earned += int(credit_per_ms(chunk).sum())
+        yield trace_text(np.repeat(np.arange(start + 1, start + len(counts) + 1), counts))
+
+def profile_hash(profile):
+    """Returns the SHA-1 of the rates of PROFILE."""
+    return hashlib.sha1(np.ascontiguousarray(profile, dtype=np.float64).tobytes()).hexdigest()
+
+def sidecar_path(path):
+    """Returns where what the trace at PATH was written from is recorded."""
+    return path + SIDECAR_SUFFIX
+
+def _sidecar_matches(path, digest):
+    try:
+        with open(sidecar_path(path)) as f:
+            recorded = json.load(f)
+        st = os.stat(path)
+    except (IOError, OSError, ValueError):
+        return False
+    return (recorded.get('profile_sha1') == digest and recorded.get('size') == st.st_size
+            and recorded.get('mtime') == st.st_mtime)
+
+def _contents_match(path, profile):
+    # Compares the file with the trace chunk by chunk.
+    with open(path) as f:
+        for chunk in trace_chunks(profile):
+            if f.read(len(chunk)) != chunk:
+                return False
+        return f.read(1) == ''
+
+def _write_sidecar(path, profile, digest):
+    st = os.stat(path)
+    with open(sidecar_path(path), 'w') as f:
+        json.dump({'profile_sha1': digest, 'length': len(profile),
+                   'mean_rate': float(np.mean(profile)) if len(profile) else 0.0,
+                   'size': st.st_size, 'mtime': st.st_mtime}, f)
+
+def write_trace(profile, path):
+    """Writes the trace of PROFILE to PATH, unless PATH already
+    holds exactly that trace.
+
+    Returns:
+        True if the file was (re)written, False if it was reused.
+    """
+    path = os.path.expanduser(path)
+    digest = profile_hash(profile)
+    if _sidecar_matches(path, digest):
+        return False
+    if os.path.isfile(path) and _contents_match(path, profile):
+        _write_sidecar(path, profile, digest)
+        return False
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory): os.makedirs(directory)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        for chunk in trace_chunks(profile):
+            f.write(chunk)
+    os.rename(tmp_path, path)
+    _write_sidecar(path, profile, digest)
+    return True
+
+def parse_steps(spec):
+    """Parses "start_ms:rate,..." into a list of (start_ms, rate)."""
+    steps = []
+    for step in spec.split(','):
+        start, rate = step.split(':')
+        steps.append((int(start), float(rate)))
+    return steps
+
+def parse_floats(spec):
+    """Parses "a,b,..." into a list of floats."""
+    return [float(x) for x in spec.split(',')]
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--length', type=int, required=True,
+        help='(ms) length of trace')
+    parser.add_argument('--out', type=str, default=None,
+        help='trace to write (default: standard output)')
+
+    profile = parser.add_mutually_exclusive_group(required=True)
+    profile.add_argument('--rate', type=float,
+        help='(Mbits/s) fixed rate')
+    profile.add_argument('--steps', type=str,
+        help='step changes, as start_ms:rate,... e.g. 0:12,30000:48')
+    profile.add_argument('--on-off', type=str,
+        help='on/off link, as rate,on_ms,off_ms')
+    profile.add_argument('--markov', type=str,
+        help='Markov-modulated rate over the given rates, e.g. 6,24,48')
+
+    parser.add_argument('--dwell', type=int, default=1000,
+        help='(ms) time between Markov steps')
+    parser.add_argument('--stay', type=float, default=0.9,
+        help='probability of keeping the current Markov rate')
+    parser.add_argument('--seed', type=int, default=0,
+        help='seed of the Markov chain')
+    args = parser.parse_args()
+
+    if args.rate is not None:
+        rates = constant_profile(args.length, args.rate)
+    elif args.steps:
+        rates = piecewise_profile(args.length, parse_steps(args.steps))
+    elif args.on_off:
+        rate, on_ms, off_ms = parse_floats(args.on_off)
+        rates = on_off_profile(args.length, rate, int(on_ms), int(off_ms))
+    else:
+        rates = markov_profile(args.length, parse_floats(args.markov), args.dwell,
+            stay=args.stay, seed=args.seed)
+
+    if args.out:
+        if not write_trace(rates, args.out):
+            print("%s is up to date" % args.out)
+    else:
+        for chunk in trace_chunks(rates):
+            sys.stdout.write(chunk)
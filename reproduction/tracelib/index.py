@@ -0,0 +1,173 @@
+#!/usr/bin/python
+
+#
+# Persistent per-trace index of link capacity.
+#
+# The index of a trace is stored next to it, in
+# <trace>.index.npz, and holds the trace's duration,
+# opportunity count and opportunities per 10, 100 and
+# 500 ms window. It is built once, and rebuilt only when
+# the trace changes: an index whose recorded size and
+# mtime match the trace is used as is, and one whose
+# contents hash still matches has only its mtime updated.
+#
+
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from storage.cache import file_hash
+from tracelib.binary import OPPORTUNITY_BYTES, load_timestamps
+from tracelib.generate import SIDECAR_SUFFIX
+
+INDEX_SUFFIX = '.index.npz'
+WINDOWS_MS = (10, 100, 500)
+
+TRACE_DIRS = ['~/ABC-1/mahimahi/traces/', '~/ABC-1/reproduction/traces/']
+
+# Files in the trace directories that are not traces.
+NOT_TRACES = ['README', 'Makefile.am']
+
+def index_path(trace_path):
+    """Returns the path of the index of the trace at TRACE_PATH."""
+    return os.path.expanduser(trace_path) + INDEX_SUFFIX
+
+class TraceIndex:
+
+    def __init__(self, duration, packets, windows, mtime, size, sha1):
+        """Summary of a trace.
+
+        Args:
+            duration: (int) last timestamp (ms); mm-link repeats
+                      the trace with this period
+            packets: (int) number of delivery opportunities
+            windows: dict of window (ms) to an array holding the
+                     number of opportunities in each window
+            mtime, size, sha1: identify the trace's contents
+        """
+        self.duration = duration
+        self.packets = packets
+        self.windows = windows
+        self.mtime = mtime
+        self.size = size
+        self.sha1 = sha1
+
+    @classmethod
+    def build(cls, trace_path):
+        """Indexes the trace at TRACE_PATH."""
+        path = os.path.expanduser(trace_path)
+        st = os.stat(path)
+        timestamps = load_timestamps(path)
+        windows = {}
+        for w in WINDOWS_MS:
+            windows[w] = np.bincount(timestamps // w).astype(np.int32)
+        return cls(int(timestamps[-1]), len(timestamps), windows,
+                st.st_mtime, st.st_size, file_hash(path))
+
+    @classmethod
+    def load(cls, path):
+        """Reads the index file at PATH."""
+        data = np.load(path)
+        windows = dict((w, data['opportunities_%d' % w]) for w in WINDOWS_MS)
+        return cls(int(data['duration']), int(data['packets']), windows,
+                float(data['mtime']), int(data['size']), str(data['sha1']))
+
+    def save(self, path):
+        """Writes the index to PATH."""
+        arrays = dict(('opportunities_%d' % w, self.windows[w]) for w in WINDOWS_MS)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, duration=self.duration, packets=self.packets,
+                    mtime=self.mtime, size=self.size, sha1=self.sha1, **arrays)
+        os.rename(tmp_path, path)
+
+    def capacity(self, window_ms):
+        """Returns the capacity (Mbits/s) of each WINDOW_MS window."""
+        if window_ms not in self.windows:
+            raise ValueError("No %d ms windows in the index; have %s"
+                    % (window_ms, ', '.join(map(str, WINDOWS_MS))))
+        return self.windows[window_ms] * OPPORTUNITY_BYTES * 8 / (window_ms * 1000.0)
+
+    def average_capacity(self, start_ms=0, end_ms=None):
+        """Returns the average capacity (Mbits/s) that mm-link gives
+        between START_MS and END_MS after it starts, repeating the
+        trace as needed.
+
+        Times are resolved to the finest window, and opportunities
+        are spread evenly within a window.
+        """
+        if end_ms is None:
+            end_ms = self.duration
+        if end_ms <= start_ms:
+            raise ValueError("Empty interval: %s to %s ms" % (start_ms, end_ms))
+
+        window = WINDOWS_MS[0]
+        cumulative = np.r_[0, np.cumsum(self.windows[window])]
+
+        def opportunities_before(t):
+            repeats, offset = divmod(t, self.duration)
+            position = np.interp(offset / float(window),
+                    np.arange(len(cumulative)), cumulative)
+            return repeats * self.packets + position
+
+        opportunities = opportunities_before(end_ms) - opportunities_before(start_ms)
+        return opportunities * OPPORTUNITY_BYTES * 8 / ((end_ms - start_ms) * 1000.0)
+
+def load_index(trace_path, rebuild=False):
+    """Returns the TraceIndex of the trace at TRACE_PATH, building
+    (and saving) it if it is missing or stale.
+    """
+    trace_path = os.path.expanduser(trace_path)
+    path = index_path(trace_path)
+    st = os.stat(trace_path)
+
+    if not rebuild and os.path.isfile(path):
+        try:
+            index = TraceIndex.load(path)
+        except (IOError, ValueError, KeyError):
+            index = None
+        if index is not None and index.size == st.st_size:
+            if index.mtime == st.st_mtime:
+                return index
+            if index.sha1 == file_hash(trace_path):
+                index.mtime = st.st_mtime
+                _try_save(index, path)
+                return index
+
+    index = TraceIndex.build(trace_path)
+    _try_save(index, path)
+    return index
+
+def _try_save(index, path):
+    # A read-only trace directory only costs the cache.
+    try:
+        index.save(path)
+    except (IOError, OSError) as e:
+        sys.stderr.write("Could not save trace index %s: %s\n" % (path, e))
+
+def trace_files(directory):
+    """Returns the paths of the traces in DIRECTORY."""
+    directory = os.path.expanduser(directory)
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name not in NOT_TRACES and not name.startswith('.')
+            and not name.endswith(INDEX_SUFFIX) and not name.endswith(SIDECAR_SUFFIX)
+            and not name.endswith('.tmp')
+            and os.path.isfile(os.path.join(directory, name))]
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument(dest='paths', nargs='*', default=TRACE_DIRS,
+        help='traces, or directories of traces, to index')
+    parser.add_argument('--rebuild', action='store_true',
+        help='rebuild indexes even if they are up to date')
+    args = parser.parse_args()
+
+    for p in args.paths:
+        traces = trace_files(p) if os.path.isdir(os.path.expanduser(p)) else [p]
+        for trace in traces:
+            index = load_index(trace, args.rebuild)
+            print("%-40s %8.1f s %9d packets %6.2f Mbits/s" % (
+                    os.path.basename(trace), index.duration / 1000.0,
+                    index.packets, index.average_capacity()))
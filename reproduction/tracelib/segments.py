@@ -0,0 +1,88 @@
+#!/usr/bin/python
+
+#
+# Splits a long trace into segments that can run in parallel.
+#
+# A trace of length L split K ways gives segments covering
+# (i L/K, (i+1) L/K]. Each segment but the first also starts
+# OVERLAP ms early, so that the scheme has warmed up by the
+# time the part it is measured on begins; the warm-up is
+# left out when the results of the segments are stitched
+# together (see analysis/stitch.py). Segment traces are
+# shifted to start at 0, like any other trace.
+#
+
+from collections import namedtuple
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tracelib.binary import load_timestamps, write_text_trace
+
+Segment = namedtuple('Segment', [
+        'index',      # from 0
+        'path',       # of the segment's trace
+        'offset',     # (ms) time of the original trace the segment starts at
+        'warmup',     # (ms) of the segment left out of its results
+        'length'      # (ms) of the segment, warm-up included
+])
+
+def plan_segments(length, k, overlap):
+    """Returns the (offset, start, end) in ms of each of the K
+    segments of a LENGTH ms trace: the segment runs the trace
+    from OFFSET and is measured on (start, end].
+    """
+    if k < 1:
+        raise ValueError("Need at least one segment")
+    bounds = [int(round(i * length / float(k))) for i in range(k + 1)]
+    return [(max(0, bounds[i] - overlap) if i else 0, bounds[i], bounds[i + 1])
+            for i in range(k)]
+
+def segment_name(trace_path, i, k):
+    """Returns the file name of segment I of K of TRACE_PATH."""
+    return '%s.seg%dof%d' % (os.path.basename(trace_path), i, k)
+
+def segment_dir(trace_path, k, overlap, directory):
+    """Returns where the segments of TRACE_PATH are written."""
+    return os.path.join(directory, '%s.%dx%d' % (os.path.basename(trace_path), k, overlap))
+
+def split_trace(trace_path, k, overlap, directory):
+    """Splits the trace at TRACE_PATH into K segments overlapping
+    by OVERLAP ms, written as text traces under DIRECTORY.
+
+    Returns:
+        list of Segment.
+    """
+    timestamps = load_timestamps(trace_path)
+    out_dir = os.path.expanduser(segment_dir(trace_path, k, overlap, directory))
+    if not os.path.exists(out_dir): os.makedirs(out_dir)
+
+    segments = []
+    for i, (offset, start, end) in enumerate(plan_segments(int(timestamps[-1]), k, overlap)):
+        # Shifted timestamps start after 0: an opportunity at the
+        # offset itself, in the warm-up, is dropped. The first
+        # segment is not shifted and keeps everything.
+        lo = offset if i else -1
+        part = timestamps[(timestamps > lo) & (timestamps <= end)] - offset
+        if not len(part):
+            raise ValueError("Segment %d of %s has no opportunities" % (i, trace_path))
+        path = os.path.join(out_dir, segment_name(trace_path, i, k))
+        write_text_trace(part, path)
+        segments.append(Segment(i, path, offset, start - offset, end - offset))
+    return segments
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument(dest='trace', help='trace to split', type=str)
+    parser.add_argument(dest='directory', help='where to write the segments', type=str)
+    parser.add_argument('-k', '--segments', default=4, type=int,
+        help='number of segments')
+    parser.add_argument('--overlap', default=10.0, type=float,
+        help='(s) warm-up each segment but the first starts with')
+    args = parser.parse_args()
+
+    for s in split_trace(args.trace, args.segments, int(args.overlap * 1000), args.directory):
+        print("%s: from %.3f s, warm-up %.3f s, %.3f s long" % (
+                s.path, s.offset / 1000.0, s.warmup / 1000.0, s.length / 1000.0))
@@ -7,18 +7,90 @@
 #
 # Assumes that all protocols were run the same number of
 # times.
+#
+# With --results-db, reads the runs from the results
+# database instead of the results files.
+#
+# With --percentiles, also merges the queueing delay
+# sketches of each scheme's runs and prints percentiles
+# of the delay over all of its packets.
 
 import argparse
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from analysis.mm_log import load_results
+from analysis.sketch import merge_all
+from storage.results_db import ResultsDB, run_sketch
+
+RESULTS_FILE_PREFIX = 'UPLINK_'
+RESULTS_FILE_SEPARATOR = '-DOWNLINK_'
+
+def print_row(scheme, utilization, signal_delay, avg_throughput, power_score,
+        queuing_delay, per_packet_delay, uplink_trace, downlink_trace):
+    print("{}, {}, {}, {}, {}, {}, {}, {}, {}".format(
+        scheme, str(utilization), str(signal_delay),
+        str(avg_throughput), str(power_score), str(queuing_delay),
+        str(per_packet_delay), uplink_trace or '_', downlink_trace or '_'
+        )
+    )
+
+def traces_of(results_file):
+    """Returns the (uplink, downlink) trace names in a results file name."""
+    name = os.path.splitext(results_file)[0]
+    if not name.startswith(RESULTS_FILE_PREFIX) or RESULTS_FILE_SEPARATOR not in name:
+        return None, None
+    return tuple(name[len(RESULTS_FILE_PREFIX):].split(RESULTS_FILE_SEPARATOR, 1))
+
+def print_percentiles(sketches, percentiles, delay):
+    """Prints PERCENTILES of the per-packet delay of each scheme,
+    merging the queueing delay sketches of its runs.
+
+    Args:
+        sketches: list of (scheme, sketch) pairs
+        delay: (ms) one-way delay of the link
+    """
+    schemes = []
+    for scheme, _ in sketches:
+        if scheme not in schemes: schemes.append(scheme)
+
+    print("")
+    for scheme in schemes:
+        merged = merge_all(k for s, k in sketches if s == scheme)
+        if merged is None:
+            print("{}: no delay sketches".format(scheme))
+            continue
+        print("{}: {} packets, {}".format(scheme, merged.count, ', '.join(
+            "p{:g} {:.0f} ms".format(p, 2 * delay + merged.percentile(p))
+            for p in percentiles)))
+
+def gather_db_results(db_path, schemes, num_runs, experiment, percentiles=None):
+    db = ResultsDB(db_path)
+    runs = db.query(latest=True, experiment=experiment, scheme=schemes,
+            iteration=list(range(1, num_runs + 1)))
+    db.close()
 
-def gather_results(schemes, num_runs, experiment):
+    order = dict((s, i) for i, s in enumerate(schemes))
+    runs = sorted(runs, key=lambda r: (order[r.scheme], r.iteration))
+    for run in runs:
+        print_row(run.scheme, run.util, run.delay, run.throughput, run.power,
+            run.queuing_delay, run.per_packet_delay, run.uplink_trace,
+            run.downlink_trace)
+
+    if percentiles and runs:
+        print_percentiles([(r.scheme, run_sketch(r)) for r in runs], percentiles,
+            runs[0].mm_delay)
+
+def gather_results(schemes, num_runs, experiment, percentiles=None):
 
     results_dir_fmt = 'results/%s/%s/multiple/%d/'
 
     delay = 50 # For essentially all experiments we do, delay is 50
     if experiment == 'pa1':
         delay = 20
-    
+
+    sketches = []
     for scheme in schemes:
         for i in range(1, num_runs + 1):
             results_dir = results_dir_fmt % (experiment, scheme, i)
@@ -29,23 +101,24 @@ def gather_results(schemes, num_runs, experiment):
                 )
             results_file = os.listdir(results_dir)[0]
             results_path = os.path.join(results_dir, results_file)
-            with open(results_path) as f:
-                lines = f.readlines()
-                avg_capacity = float(lines[0].split(' ')[2])
-                avg_throughput = float(lines[1].split(' ')[2])
-                queuing_delay = float(lines[2].split(' ')[5])
-                signal_delay = float(lines[3].split(' ')[4])
-
-                per_packet_delay = 2 * delay + queuing_delay
-                utilization = avg_throughput / avg_capacity
-                power_score = 1000 * avg_throughput / float(signal_delay)
-
-                print("{}, {}, {}, {}, {}, {}, {}, _, _".format(
-                    scheme, str(utilization), str(signal_delay), 
-                    str(avg_throughput), str(power_score), str(queuing_delay), 
-                    str(per_packet_delay)
-                    )
-                )
+            link_stats = load_results(results_path)
+            sketches.append((scheme, link_stats.delay_sketch))
+            avg_capacity = link_stats.avg_capacity
+            avg_throughput = link_stats.avg_throughput
+            queuing_delay = link_stats.queuing_delay
+            signal_delay = link_stats.signal_delay
+
+            per_packet_delay = 2 * delay + queuing_delay
+            utilization = avg_throughput / avg_capacity
+            power_score = 1000 * avg_throughput / float(signal_delay)
+
+            uplink_trace, downlink_trace = traces_of(results_file)
+            print_row(scheme, utilization, signal_delay, avg_throughput,
+                power_score, queuing_delay, per_packet_delay, uplink_trace,
+                downlink_trace)
+
+    if percentiles:
+        print_percentiles(sketches, percentiles, delay)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -58,12 +131,23 @@ if __name__ == '__main__':
     parser.add_argument('--experiment', default=None, type=str,
             help='what experiment to gather results for')
 
+    parser.add_argument('--results-db', default=None, type=str,
+            help='read runs from this results database')
+
+    parser.add_argument('--percentiles', default=None, nargs='+', type=float,
+            help='also print these percentiles of each scheme\'s per-packet '
+                 'delay over all of its runs')
+
     args = parser.parse_args()
 
     if not args.schemes or not args.num_runs or not args.experiment:
         raise valueError("Must specify both --schemes and --num-runs and --experiment")
 
-    gather_results(args.schemes, args.num_runs, args.experiment)
+    if args.results_db:
+        gather_db_results(args.results_db, args.schemes, args.num_runs,
+                args.experiment, args.percentiles)
+    else:
+        gather_results(args.schemes, args.num_runs, args.experiment, args.percentiles)
 
     
 
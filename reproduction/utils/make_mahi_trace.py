@@ -4,11 +4,15 @@
 #
 
 import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tracelib.generate import constant_profile, trace_chunks
 
 def print_mahi_trace(length, bw):
-    for i in range(1, length+1):
-        for _ in range(bw / 12):
-            print(i)
+    for chunk in trace_chunks(constant_profile(length, bw)):
+        sys.stdout.write(chunk)
 
 if __name__ == '__main__':
 
@@ -19,12 +23,12 @@ if __name__ == '__main__':
             required=True,
             help="(ms) length of trace")
 
-    # TODO: if needed, extend to
-    #       arbitrary bandwidths.
+    # See tracelib/generate.py for
+    # variable-rate traces.
     parser.add_argument('--bw',
-            type=int,
+            type=float,
             required=True,
-            help="can be 12, 24, 36, 48")
+            help="(Mbits/s) any rate, e.g. 12, 30, 48")
 
     args = parser.parse_args()
 